@@ -0,0 +1,67 @@
+"""
+Broadcast benchmark against the local Twilio stand-in.
+
+Sends one message to N fake recipients through WhatsAppSender.broadcast_full_report
+machinery (Broadcaster) and checks that the achieved send rate stays under
+the configured token-bucket rate while concurrency hides the API latency.
+
+Usage:
+    python benchmarks/bench_broadcast.py [--recipients 200] [--rate 20] [--concurrency 16] [--latency 0.2] [--burst 1]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_twilio import start_fake_twilio  # noqa: E402
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark de difusión con limitación de tasa")
+    parser.add_argument('--recipients', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=20.0, help="Mensajes por segundo")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.2, help="Latencia simulada de Twilio (s)")
+    parser.add_argument('--burst', type=float, default=1.0, help="Envíos seguidos permitidos (WHATSAPP_BURST)")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_twilio(latency=args.latency)
+    workdir = tempfile.mkdtemp(prefix='bench_broadcast_')
+    os.environ.update({
+        'TWILIO_API_BASE_URL': base_url,
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'test-token',
+        'TWILIO_WHATSAPP_FROM': '+10000000000',
+        'DELIVERY_DB_PATH': os.path.join(workdir, 'delivery.db'),
+        'TWILIO_QUOTA_DB_PATH': os.path.join(workdir, 'quota.db'),
+    })
+
+    from utils.broadcast import Broadcaster
+    from utils.whatsapp_sender import WhatsAppSender
+
+    recipients = [f"+1555{i:07d}" for i in range(args.recipients)]
+    sender = WhatsAppSender()
+    report = Broadcaster(sender, rate=args.rate, concurrency=args.concurrency, burst=args.burst).send("Reporte de prueba", recipients)
+    summary = report['summary']
+
+    # the first `burst` sends need no token refill; the rest are paced at `rate`
+    paced = max(0.0, summary['recipients'] - max(1.0, args.burst))
+    achieved = paced / summary['seconds'] if summary['seconds'] else 0.0
+    print(f"Destinatarios: {summary['recipients']}  enviados: {summary.get('sent', 0)}  fallidos: {summary.get('failed', 0)}")
+    print(f"Tiempo: {summary['seconds']:.2f} s  tasa lograda: {achieved:.1f} msg/s (límite {args.rate:g})")
+    print(f"Peticiones recibidas por el servidor: {server.stats['requests']}")
+    sequential = args.recipients * args.latency
+    print(f"Estimado secuencial (solo latencia): {sequential:.2f} s")
+
+    # token timing is exact; 2% covers clock reads around the run
+    if achieved > args.rate * 1.02:
+        print("ERROR: se superó la tasa configurada")
+        sys.exit(1)
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
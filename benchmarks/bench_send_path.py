@@ -0,0 +1,160 @@
+"""
+Send-path load test against the local Twilio stand-in.
+
+Drives the real WhatsAppSender (real twilio client, real HTTP) against
+benchmarks/fake_twilio.py with configurable latency, injected errors and
+quotas, and reports throughput, per-message latency percentiles and retry
+amplification (HTTP create requests per logical message).
+
+Modes:
+    sequential  send_message() per recipient (in-memory retries, wait_time sleep)
+    broadcast   Broadcaster: thread pool + token bucket + per-recipient retries
+    queue       durable outbound queue drained by --workers processes
+
+Usage:
+    python benchmarks/bench_send_path.py --mode broadcast --messages 300 --rate 50 --concurrency 16 \
+        --latency 0.1 --jitter 0.05 --rate-429 0.05 --per-second 40
+"""
+
+import argparse
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_twilio import start_fake_twilio  # noqa: E402
+
+# nearest-rank percentile of an already sorted list
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_sequential(recipients: List[str], body: str) -> List[Dict[str, Any]]:
+
+    from utils.whatsapp_sender import TwilioDailyLimitExceeded, get_whatsapp_sender
+
+    sender = get_whatsapp_sender()
+    outcomes = []
+    for index, recipient in enumerate(recipients):
+        start = time.perf_counter()
+        try:
+            ok = sender.send_message(body, recipient)
+            status = 'sent' if ok else 'failed'
+        except TwilioDailyLimitExceeded:
+            # the sequential path stops at the first daily-limit error
+            outcomes.append({'ok': False, 'status': 'daily_limit', 'seconds': time.perf_counter() - start})
+            outcomes.extend({'ok': False, 'status': 'aborted', 'seconds': 0.0} for _ in recipients[index + 1:])
+            break
+        outcomes.append({'ok': ok, 'status': status, 'seconds': time.perf_counter() - start})
+    return outcomes
+
+def run_broadcast(recipients: List[str], body: str, rate: float, concurrency: int) -> List[Dict[str, Any]]:
+
+    from utils.broadcast import Broadcaster
+    from utils.whatsapp_sender import get_whatsapp_sender
+
+    return Broadcaster(get_whatsapp_sender(), rate=rate, concurrency=concurrency).send(body, recipients)['outcomes']
+
+def run_queue(recipients: List[str], body: str, workers: int) -> List[Dict[str, Any]]:
+
+    from utils.outbound_queue import OutboundQueue, SENT, drain_queue
+
+    queue = OutboundQueue()
+    keys = [queue.enqueue(recipient, body) for recipient in recipients]
+    drain_queue(workers, path=queue.path, max_wait=120)
+
+    outcomes = []
+    for key in keys:
+        item = queue.get(key)
+        # enqueue -> final state, as recorded by the queue
+        seconds = (datetime.fromisoformat(item['updated_at']) - datetime.fromisoformat(item['created_at'])).total_seconds()
+        outcomes.append({'ok': item['status'] == SENT, 'status': item['status'], 'seconds': seconds})
+    return outcomes
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Prueba de carga del envío contra un Twilio local")
+    parser.add_argument('--mode', choices=['sequential', 'broadcast', 'queue'], default='broadcast')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=50.0, help="Mensajes por segundo (broadcast)")
+    parser.add_argument('--concurrency', type=int, default=16, help="Hilos (broadcast)")
+    parser.add_argument('--workers', type=int, default=4, help="Procesos (queue)")
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--wait-time', type=int, default=0, help="WHATSAPP_WAIT_TIME (s)")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-500', type=float, default=0.0)
+    parser.add_argument('--rate-63038', type=float, default=0.0)
+    parser.add_argument('--per-second', type=int, default=0)
+    parser.add_argument('--daily-limit', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help="Muestra los logs del sender")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    server, base_url = start_fake_twilio(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+                                         rate_500=args.rate_500, rate_63038=args.rate_63038,
+                                         per_second=args.per_second, daily_limit=args.daily_limit)
+    workdir = tempfile.mkdtemp(prefix='bench_send_')
+    os.environ.update({
+        'TWILIO_API_BASE_URL': base_url,
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'test-token',
+        'TWILIO_WHATSAPP_FROM': '+10000000000',
+        'WHATSAPP_MAX_RETRIES': str(args.retries),
+        'WHATSAPP_WAIT_TIME': str(args.wait_time),
+        'DELIVERY_DB_PATH': os.path.join(workdir, 'delivery.db'),
+        'OUTBOUND_QUEUE_PATH': os.path.join(workdir, 'queue.db'),
+        'TWILIO_QUOTA_DB_PATH': os.path.join(workdir, 'quota.db'),
+    })
+
+    recipients = [f"+1555{i:07d}" for i in range(args.messages)]
+    body = "Reporte de ventas (prueba de carga)"
+
+    start = time.perf_counter()
+    if args.mode == 'sequential':
+        outcomes = run_sequential(recipients, body)
+    elif args.mode == 'broadcast':
+        outcomes = run_broadcast(recipients, body, args.rate, args.concurrency)
+    else:
+        outcomes = run_queue(recipients, body, args.workers)
+    elapsed = time.perf_counter() - start
+
+    sent = sum(1 for o in outcomes if o['ok'])
+    statuses: Dict[str, int] = {}
+    for outcome in outcomes:
+        statuses[outcome['status']] = statuses.get(outcome['status'], 0) + 1
+    latencies = sorted(o['seconds'] for o in outcomes if o['ok'])
+    requests = server.stats['requests']
+
+    print(f"Modo: {args.mode}  mensajes: {len(outcomes)}  estados: {statuses}")
+    print(f"Tiempo total: {elapsed:.2f} s  throughput: {sent / elapsed if elapsed else 0:.1f} msg/s enviados")
+    print(f"Latencia por mensaje (s): p50={percentile(latencies, 50):.3f}  p90={percentile(latencies, 90):.3f}  "
+          f"p99={percentile(latencies, 99):.3f}  max={latencies[-1] if latencies else 0:.3f}")
+    print(f"Peticiones de envío: {requests}  aceptadas: {server.stats['created']}  errores: {server.stats['errors']}")
+    print(f"Amplificación por reintentos: {requests / len(outcomes) if outcomes else 0:.2f} peticiones/mensaje")
+    print(f"Conexiones TCP distintas: {len(server.stats['connections'])}")
+    if args.mode != 'queue':
+        # queue workers run in other processes, their pools are not visible here
+        from utils.twilio_pool import pool_stats
+
+        stats = pool_stats()
+        print(f"Conexiones abiertas por el cliente: {stats['connections']:.0f}  "
+              f"establecimiento promedio: {stats['avg_connect_ms']:.2f} ms  "
+              f"({stats['connections'] / len(outcomes) if outcomes else 0:.3f} por mensaje)")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
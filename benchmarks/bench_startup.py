@@ -0,0 +1,88 @@
+"""
+Startup-time benchmark for main.py based on `python -X importtime`.
+
+Fails (exit code 1) when importing `main` takes longer than the threshold or
+when a heavy dependency is imported at module load again.
+
+Usage:
+    python benchmarks/bench_startup.py [--max-ms 150] [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must only be imported by the stage that uses them
+HEAVY_MODULES = ['pandas', 'numpy', 'matplotlib', 'twilio', 'requests', 'openpyxl', 'fpdf']
+
+# run `import <module>` with -X importtime and return {module: cumulative_us}
+
+def import_times(module: str = 'main') -> Tuple[int, Dict[str, int]]:
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+
+    total_us = 0
+    modules: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        # format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+        # top-level imports have no indentation in the name column
+        if not name[1:].startswith(' '):
+            total_us += int(cumulative)
+    return total_us, modules
+
+# wall time of a full CLI invocation (e.g. --check-config)
+
+def cli_wall_ms(args: List[str]) -> float:
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', *args], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    return (time.perf_counter() - start) * 1000
+
+def main(argv=None) -> int:
+
+    parser = argparse.ArgumentParser(description="Benchmark de tiempo de arranque de main.py")
+    parser.add_argument('--max-ms', type=float, default=float(os.getenv('STARTUP_MAX_MS', '150')),
+                        help="Máximo permitido (ms) para 'import main' (mediana)")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    samples: List[float] = []
+    modules: Dict[str, int] = {}
+    for _ in range(args.runs):
+        total_us, modules = import_times('main')
+        samples.append(total_us / 1000)
+    median_ms = statistics.median(samples)
+
+    heavy = sorted(m for m in modules if m.split('.')[0] in HEAVY_MODULES)
+    check_ms = cli_wall_ms(['--check-config'])
+
+    print(f"import main (mediana de {args.runs}): {median_ms:.1f} ms (máximo {args.max_ms:.0f} ms)")
+    print(f"main.py --check-config (tiempo total): {check_ms:.1f} ms")
+
+    failed = False
+    if median_ms > args.max_ms:
+        print("REGRESIÓN: el import de main supera el umbral.")
+        failed = True
+    if heavy:
+        print(f"REGRESIÓN: dependencias pesadas importadas al arrancar: {', '.join(sorted({m.split('.')[0] for m in heavy}))}")
+        failed = True
+
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Pipeline benchmark suite across data sizes, with regression thresholds.
+
+For each size a synthetic sales dataset (same columns and value domains as
+create_sample_data.py) is generated, and these stages are timed (best of
+--repeat) and memory-profiled (tracemalloc peak, separate pass):
+
+    load       load_and_validate_data on a cached workbook (see --data-dir)
+    analyze    DataAnalyzer.full_analysis
+    visualize  DataVisualizer.generate_all_graphs (what generate_visualizations runs)
+    format     WhatsAppSender.format_summary
+    send       send_full_report (text only) against benchmarks/fake_twilio.py
+
+An .xlsx sheet holds at most 1,048,576 rows, so `load` is skipped above
+that and the 1e7 size measures the in-memory stages only. Workbooks are
+cached between runs (writing 1e6 rows takes minutes) outside the repository,
+in <tmp>/whatsapp_rpa_bench_data (BENCH_DATA_DIR or --data-dir to move it).
+
+Results are compared with a JSON baseline. A stage regresses when it is
+slower (or uses more memory) than the baseline by more than --tolerance AND
+by more than --min-seconds / --min-mb, so tiny stages do not flap. Exit code
+1 on regression. Baselines are machine specific: record one with
+--save-baseline on the machine that runs the comparison. Without a baseline
+the run only reports its numbers; with --require-baseline a missing baseline
+(file, size or stage) is an error, so a guard job cannot pass silently.
+
+Usage:
+    python benchmarks/bench_suite.py                              # 1e3,1e5,1e6,1e7
+    python benchmarks/bench_suite.py --sizes 1e3,1e5 --save-baseline
+    python benchmarks/bench_suite.py --sizes 1e3,1e5 --tolerance 0.2 --require-baseline
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'bench_suite.json')
+DATA_DIR = os.getenv('BENCH_DATA_DIR', '').strip() or os.path.join(tempfile.gettempdir(), 'whatsapp_rpa_bench_data')
+
+# rows per sheet in .xlsx, header included
+EXCEL_MAX_ROWS = 1_048_576 - 1
+
+STAGES = ['load', 'analyze', 'visualize', 'format', 'send']
+
+HEADQUARTERS = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix']
+MODELS = ['Toyota Corolla', 'Honda Civic', 'Nissan Sentra', 'Hyundai Tucson', 'Kia Sportage', 'Mazda CX-5',
+          'Volkswagen Vento', 'Suzuki Swift', 'Ford Escape', 'Chevrolet Onix']
+CHANNELS = ['Web', 'Ventas Directas', 'Concesionario', 'Telemarketing', 'Referido']
+SEGMENTS = ['Individual', 'Corporativo', 'Empresarial', 'Gobierno']
+
+# synthetic sales (vectorized version of create_sample_data.py)
+
+def make_sales_frame(rows: int, seed: int = 42):
+
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    clients = np.array([f'CLI_{i:07d}' for i in range(1, max(100, rows // 20) + 1)], dtype=object)
+    start = np.datetime64('2025-01-01T00:00:00')
+    price = np.round(rng.uniform(20000, 50000, rows), 2)
+    igv = np.round(price * 0.18, 2)
+    return pd.DataFrame({
+        'Sell_Date': start + rng.integers(0, 365 * 24 * 3600, rows).astype('timedelta64[s]'),
+        'Headquarter': rng.choice(np.array(HEADQUARTERS, dtype=object), rows),
+        'Model': rng.choice(np.array(MODELS, dtype=object), rows),
+        'Channel': rng.choice(np.array(CHANNELS, dtype=object), rows),
+        'Segment': rng.choice(np.array(SEGMENTS, dtype=object), rows),
+        'Client_ID': rng.choice(clients, rows),
+        'Price_Without_IGV': price,
+        'IGV': igv,
+        'Price_With_IGV': np.round(price + igv, 2),
+    })
+
+# cached workbook for a size (None when it does not fit in one sheet)
+
+def workbook_for(rows: int, df, seed: int, data_dir: str = DATA_DIR) -> Optional[str]:
+
+    if rows > EXCEL_MAX_ROWS:
+        return None
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'ventas_{rows}_{seed}.xlsx')
+    if not os.path.exists(path):
+        print(f"  escribiendo {path} ...", flush=True)
+        start = time.perf_counter()
+        df.to_excel(path + '.tmp.xlsx', index=False)
+        os.replace(path + '.tmp.xlsx', path)
+        print(f"  escrito en {time.perf_counter() - start:.1f} s", flush=True)
+    return path
+
+# best wall time of `repeat` runs, then one tracemalloc pass for the allocation peak
+
+def measure(func: Callable[[], Any], repeat: int, memory: bool) -> Dict[str, Any]:
+
+    times: List[float] = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    stats: Dict[str, Any] = {'seconds': min(times), 'median_seconds': sorted(times)[len(times) // 2], 'runs': len(times)}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            stats['peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    stats['result'] = result
+    return stats
+
+def run_size(rows: int, args, destiny: str, graphs_dir: str) -> Dict[str, Any]:
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from utils.analyzer import DataAnalyzer
+    from utils.data_loader import load_and_validate_data
+    from utils.visualizer import DataVisualizer
+    from utils.whatsapp_sender import WhatsAppSender
+
+    repeat = args.repeat if args.repeat else (3 if rows <= 100_000 else 1)
+    print(f"\n== {rows:,} filas (repeticiones: {repeat}) ==", flush=True)
+    start = time.perf_counter()
+    df = make_sales_frame(rows, args.seed)
+    print(f"  datos sintéticos: {time.perf_counter() - start:.2f} s", flush=True)
+
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    def record(name: str, func: Callable[[], Any], repeat_override: Optional[int] = None):
+        if name not in args.stages:
+            return None
+        stats = measure(func, repeat_override or repeat, args.memory)
+        result = stats.pop('result')
+        stages[name] = stats
+        memory = f"  pico {stats['peak_mb']:.1f} MB" if 'peak_mb' in stats else ''
+        print(f"  {name:<10} {stats['seconds']:9.3f} s{memory}", flush=True)
+        return result
+
+    path = workbook_for(rows, df, args.seed, args.data_dir) if 'load' in args.stages else None
+    if 'load' in args.stages and path is None:
+        stages['load'] = {'skipped': f'más de {EXCEL_MAX_ROWS:,} filas no caben en una hoja de Excel'}
+        print(f"  load       omitido ({stages['load']['skipped']})", flush=True)
+    elif path is not None:
+        loaded, validation = record('load', lambda: load_and_validate_data(path))
+        if not validation.get('is_valid'):
+            raise RuntimeError(f"Datos inválidos: {validation}")
+
+    results = record('analyze', lambda: DataAnalyzer(df).full_analysis())
+    if results is None:
+        results = DataAnalyzer(df).full_analysis()
+    record('visualize', lambda: DataVisualizer(results, output_dir=graphs_dir).generate_all_graphs())
+
+    sender = WhatsAppSender()
+    record('format', lambda: sender.format_summary(results), repeat_override=max(repeat, 5))
+
+    if 'send' in args.stages:
+        ok = record('send', lambda: sender.send_full_report(results, destiny, include_graphs=False))
+        if not ok:
+            raise RuntimeError("El envío contra Twilio local falló")
+
+    del df
+    gc.collect()
+    return stages
+
+# measured (size, stage) pairs the baseline has no numbers for
+
+def missing_from_baseline(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[tuple]:
+
+    missing = []
+    for size, stages in current['sizes'].items():
+        for stage, stats in stages.items():
+            if 'skipped' not in stats and not baseline.get('sizes', {}).get(size, {}).get(stage):
+                missing.append((size, stage))
+    return missing
+
+# regressions of `current` against `baseline`: [(size, stage, metric, base, now)]
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_seconds: float,
+            min_mb: float) -> List[tuple]:
+
+    regressions = []
+    for size, stages in current['sizes'].items():
+        for stage, stats in stages.items():
+            base = baseline.get('sizes', {}).get(size, {}).get(stage)
+            if not base or 'skipped' in stats or 'skipped' in base:
+                continue
+            for metric, floor in (('seconds', min_seconds), ('peak_mb', min_mb)):
+                if metric not in stats or metric not in base:
+                    continue
+                if stats[metric] > base[metric] * (1 + tolerance) and stats[metric] - base[metric] > floor:
+                    regressions.append((size, stage, metric, base[metric], stats[metric]))
+    return regressions
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline por tamaño de datos con umbrales de regresión")
+    parser.add_argument('--sizes', default='1e3,1e5,1e6,1e7', help="Filas por dataset, separadas por comas")
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"Subconjunto de {', '.join(STAGES)}")
+    parser.add_argument('--repeat', type=int, default=0, help="Repeticiones por etapa (default 3 hasta 1e5 filas, 1 arriba)")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="Omite la pasada con tracemalloc")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Guarda los resultados como nueva línea base")
+    parser.add_argument('--require-baseline', action='store_true',
+                        help="Falla (código 1) si falta la línea base o no cubre algún tamaño / etapa medidos")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Cache de libros de Excel generados (default BENCH_DATA_DIR o el temporal del sistema)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Regresión relativa permitida (0.25 = +25%%)")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="Diferencia absoluta mínima para marcar regresión de tiempo")
+    parser.add_argument('--min-mb', type=float, default=5.0, help="Diferencia absoluta mínima para marcar regresión de memoria")
+    parser.add_argument('--output', default=os.path.join('outputs', 'bench_suite.json'))
+    args = parser.parse_args()
+    args.stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    sizes = [int(float(s)) for s in args.sizes.split(',') if s.strip()]
+
+    # keep per-row logging out of the timings
+    import logging
+    logging.disable(logging.WARNING)
+
+    from benchmarks.fake_twilio import start_fake_twilio
+
+    server, base_url = start_fake_twilio(0)
+    tmp = tempfile.mkdtemp(prefix='bench_suite_')
+    send_env = {
+        'TWILIO_API_BASE_URL': base_url,
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'test-token',
+        'TWILIO_WHATSAPP_FROM': '+10000000000',
+        'WHATSAPP_DESTINY': '+10000000001',
+        'WHATSAPP_SIMULATE': 'false',
+        'WHATSAPP_OUTBOUND_QUEUE': 'false',
+        'TWILIO_DELIVERY_TRACKING': 'false',
+        'WHATSAPP_WAIT_TIME': '0',
+        'DELIVERY_DB_PATH': os.path.join(tmp, 'delivery.db'),
+        'TWILIO_QUOTA_DB_PATH': os.path.join(tmp, 'quota.db'),
+    }
+    os.environ.update(send_env)
+    current: Dict[str, Any] = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()},
+        'sizes': {},
+    }
+    try:
+        for rows in sizes:
+            current['sizes'][str(rows)] = run_size(rows, args, send_env['WHATSAPP_DESTINY'], os.path.join(tmp, 'graphs'))
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResultados: {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"Línea base guardada: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"Sin línea base ({args.baseline}); use --save-baseline para crearla.")
+        if args.require_baseline:
+            sys.exit(1)
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    missing = missing_from_baseline(current, baseline)
+    if missing:
+        print("Sin línea base para: " + ', '.join(f"{int(size):,} filas/{stage}" for size, stage in missing))
+        if args.require_baseline:
+            sys.exit(1)
+    regressions = compare(current, baseline, args.tolerance, args.min_seconds, args.min_mb)
+    if regressions:
+        print(f"\nREGRESIONES (tolerancia {args.tolerance:.0%}):")
+        for size, stage, metric, base, now in regressions:
+            unit = 's' if metric == 'seconds' else 'MB'
+            print(f"  {int(size):>10,} filas  {stage:<10} {metric:<8} {base:.3f} {unit} -> {now:.3f} {unit} ({now / base - 1:+.0%})")
+        sys.exit(1)
+    print(f"Sin regresiones respecto de {args.baseline} (tolerancia {args.tolerance:.0%}).")
+
+if __name__ == "__main__":
+    main()
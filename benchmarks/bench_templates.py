@@ -0,0 +1,100 @@
+"""
+Personalized message rendering benchmark.
+
+Renders N personalized report bodies (greeting + own headquarter
+highlighted, split at the WhatsApp limit) with the compiled ReportTemplate
+and with the per-recipient rebuild it replaces, and checks the split parts
+(length limit, determinism, no lost content).
+
+Usage:
+    python benchmarks/bench_templates.py [--recipients 10000] [--headquarters 40] [--max-seconds 1.0]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from utils.message_templates import MAX_BODY_LENGTH, ReportTemplate, message_length, split_message  # noqa: E402
+
+# synthetic analysis results with the keys the report uses
+
+def make_results(headquarters: int):
+
+    hq_sales = pd.Series([1_000_000.0 / (i + 1) for i in range(headquarters)],
+                         index=[f"Sede {i:02d}" for i in range(headquarters)])
+    return {
+        'summary_metrics': {'unique_clients': 12345, 'total_sales': 67890, 'total_sales_without_igv': 9.87e6,
+                            'total_sales_with_igv': 1.16e7, 'total_igv_collected': 1.78e6,
+                            'average_sales_without_igv': 145.3},
+        'top_models': pd.Series([900.0, 800.0, 700.0, 600.0, 500.0, 400.0], index=list('ABCDEF')),
+        'sales_by_headquarter': hq_sales,
+        'sales_by_channel': pd.Series([1.0], index=['Web']),
+    }
+
+# previous approach: rebuild the whole summary for every recipient
+
+def render_naive(results, recipient, generated_at: str):
+
+    from utils.whatsapp_sender import WhatsAppSender
+
+    sender = WhatsAppSender.__new__(WhatsAppSender)
+    sender._get_today_date = lambda: generated_at
+    text = sender.format_summary(results)
+    row = f"• 🏢 {recipient['headquarter']}:"
+    text = text.replace(row, f"👉 🏢 {recipient['headquarter']}:", 1)
+    return split_message(f"👋 Hola {recipient['name']}\n" + text)
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark de renderizado de mensajes personalizados")
+    parser.add_argument('--recipients', type=int, default=10000)
+    parser.add_argument('--headquarters', type=int, default=40)
+    parser.add_argument('--naive-sample', type=int, default=500, help="Destinatarios medidos con el método anterior")
+    parser.add_argument('--max-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+
+    results = make_results(args.headquarters)
+    headquarters = list(results['sales_by_headquarter'].index)
+    recipients = [{'number': f"+1555{i:07d}", 'name': f"Gerente {i}", 'headquarter': headquarters[i % len(headquarters)]}
+                  for i in range(args.recipients)]
+
+    start = time.perf_counter()
+    template = ReportTemplate(results, '2026-01-01 08:00:00')
+    compile_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bodies = template.render_many(recipients)
+    render_seconds = time.perf_counter() - start
+
+    sample = recipients[:args.naive_sample]
+    start = time.perf_counter()
+    for recipient in sample:
+        render_naive(results, recipient, '2026-01-01 08:00:00')
+    naive_seconds = (time.perf_counter() - start) * len(recipients) / max(1, len(sample))
+
+    parts = [p for body in bodies for p in body]
+    longest = max(message_length(p) for p in parts)
+    print(f"Destinatarios: {len(recipients)}  sedes: {len(headquarters)}  partes por mensaje: {len(bodies[0])}")
+    print(f"Compilación: {compile_seconds * 1000:.1f} ms  render: {render_seconds:.3f} s "
+          f"({render_seconds / len(recipients) * 1e6:.1f} µs/mensaje)")
+    print(f"Método anterior (estimado con {len(sample)}): {naive_seconds:.3f} s  -> {naive_seconds / render_seconds:.1f}x")
+    print(f"Parte más larga: {longest} (límite {MAX_BODY_LENGTH})")
+
+    # checks: limit, determinism, content preserved
+    assert longest <= MAX_BODY_LENGTH
+    assert template.render_many(recipients[:50]) == bodies[:50]
+    body = template.render_for(recipients[0])
+    joined = "\n".join(p.rsplit("\n", 1)[0] for p in bodies[0]) if len(bodies[0]) > 1 else bodies[0][0]
+    assert joined.replace("\n", "") == body.replace("\n", ""), "contenido perdido al dividir"
+
+    if render_seconds > args.max_seconds:
+        print(f"ERROR: el render superó {args.max_seconds} s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Upload benchmark against the local imgbb stand-in.
+
+Compares a sequential upload loop with the concurrent pooled uploader,
+checks that results come back in input order, and measures peak memory and
+throughput of the streaming multipart upload against the previous
+base64 form-encoded body on one large image.
+
+Usage:
+    python benchmarks/bench_upload.py [--images 12] [--size-kb 300] [--latency 0.2] [--fail-rate 0.1] [--large-mb 20]
+"""
+
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_imgbb import start_fake_imgbb  # noqa: E402
+
+# write n fake PNG files of the given size
+
+def make_images(folder: str, count: int, size_kb: int):
+
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"graph_{i:02d}.png")
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + os.urandom(size_kb * 1024))
+        paths.append(path)
+    return paths
+
+# previous implementation: whole file in memory, base64 encoded, form-encoded body
+
+def legacy_upload(path: str, url: str, session) -> bool:
+
+    with open(path, 'rb') as f:
+        payload = {'key': 'bench-key', 'image': base64.b64encode(f.read()).decode('utf-8')}
+    return session.post(url, data=payload, timeout=60).status_code == 200
+
+# run fn once under tracemalloc, returns (seconds, peak_bytes)
+
+def measure(fn):
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main(argv=None) -> int:
+
+    parser = argparse.ArgumentParser(description="Benchmark de subida de imágenes (servidor local)")
+    parser.add_argument('--images', type=int, default=12)
+    parser.add_argument('--size-kb', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--large-mb', type=int, default=20, help="Tamaño de la imagen para la prueba de memoria")
+    args = parser.parse_args(argv)
+
+    server, url = start_fake_imgbb(latency=args.latency, fail_rate=args.fail_rate)
+    os.environ['IMGBB_UPLOAD_URL'] = url
+
+    from utils import image_uploader
+    from utils.upload_cache import UploadCache
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_images(folder, args.images, args.size_kb)
+
+        # sequential baseline: one bare request per image (no retries)
+        start = time.perf_counter()
+        for path in paths:
+            image_uploader.upload_image_to_imgbb(path, 'bench-key')
+        sequential = time.perf_counter() - start
+
+        server.stats['connections'].clear()
+        cache = UploadCache(os.path.join(folder, 'upload_cache.json'))
+        start = time.perf_counter()
+        urls = image_uploader.upload_images_to_imgbb_ordered(paths, 'bench-key', max_count=len(paths),
+                                                             concurrency=args.concurrency, backoff=0.05, cache=cache)
+        concurrent = time.perf_counter() - start
+
+        # second run with unchanged bytes: served from the content-hash cache
+        requests_before = server.stats['requests']
+        start = time.perf_counter()
+        cached_urls = image_uploader.upload_images_to_imgbb_ordered(paths, 'bench-key', max_count=len(paths), cache=cache)
+        cached = time.perf_counter() - start
+        cached_requests = server.stats['requests'] - requests_before
+
+        # memory: one large image, previous base64 body vs streaming multipart
+        server.latency = 0
+        large = os.path.join(folder, 'large.png')
+        with open(large, 'wb') as f:
+            for _ in range(args.large_mb):
+                f.write(os.urandom(1024 * 1024))
+        session = image_uploader.get_session()
+        legacy_s, legacy_peak = measure(lambda: legacy_upload(large, url, session))
+        stream_s, stream_peak = measure(lambda: image_uploader.upload_image_to_imgbb(large, 'bench-key', session=session))
+
+    ids = [int(u.rsplit('/', 1)[1].split('.')[0]) for u in urls if u]
+    total_mb = args.images * args.size_kb / 1024
+    print(f"Imágenes: {args.images} x {args.size_kb} KB, latencia {args.latency}s, fallos {args.fail_rate:.0%}")
+    print(f"Secuencial: {sequential:.2f} s ({total_mb / sequential:.1f} MB/s)")
+    print(f"Concurrente (x{args.concurrency}): {concurrent:.2f} s ({total_mb / concurrent:.1f} MB/s), "
+          f"{len(server.stats['connections'])} conexiones TCP")
+    print(f"Repetición con cache: {cached:.3f} s, {cached_requests} peticiones HTTP, "
+          f"mismas URLs: {cached_urls == urls}")
+    print(f"Subidas exitosas: {len(ids)}/{len(urls)}; fallos inyectados (total): {server.stats['failures']}")
+    print(f"Resultados alineados con la entrada: {len(urls) == len(paths)}")
+    print(f"Imagen de {args.large_mb} MB — base64 en memoria: pico {legacy_peak / 2**20:.1f} MB, "
+          f"{args.large_mb / legacy_s:.0f} MB/s")
+    print(f"Imagen de {args.large_mb} MB — multipart en streaming: pico {stream_peak / 2**20:.2f} MB, "
+          f"{args.large_mb / stream_s:.0f} MB/s")
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Local stand-in for the imgbb upload API (POST /1/upload).
+
+Accepts the same form fields as imgbb (`key`, `image`, `name`), answers with an
+imgbb-like JSON body and can inject latency and transient failures. Point the
+uploader at it with IMGBB_UPLOAD_URL=http://127.0.0.1:<port>/1/upload.
+
+Usage:
+    python benchmarks/fake_imgbb.py --port 8765 --latency 0.2 --fail-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+class FakeImgbbHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # keep benchmark output clean
+        pass
+
+    def _reply(self, status: int, body: dict):
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # read the request body in chunks and discard it, returns the byte count
+
+    def _drain_body(self) -> int:
+
+        remaining = int(self.headers.get('Content-Length') or 0)
+        total = 0
+        while remaining > 0:
+            chunk = self.rfile.read(min(65536, remaining))
+            if not chunk:
+                break
+            total += len(chunk)
+            remaining -= len(chunk)
+        return total
+
+    def do_POST(self):
+
+        server = self.server
+        received = self._drain_body()
+
+        with server.lock:
+            server.stats['requests'] += 1
+            server.stats['bytes'] += received
+            server.stats['connections'].add(self.client_address)
+            upload_id = server.stats['requests']
+
+        if self.path.split('?')[0] != '/1/upload':
+            self._reply(404, {'success': False, 'error': {'message': 'Not found'}})
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_rate and random.random() < server.fail_rate:
+            with server.lock:
+                server.stats['failures'] += 1
+            self._reply(503, {'success': False, 'error': {'message': 'Service unavailable (injected)'}})
+            return
+
+        host = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+        url = f"{host}/i/{upload_id}.png"
+        self._reply(200, {'success': True, 'status': 200,
+                          'data': {'id': str(upload_id), 'url': url, 'display_url': url,
+                                   'image': {'url': url}, 'size': received}})
+
+# start the stand-in in a background thread, returns (server, upload_url)
+
+def start_fake_imgbb(port: int = 0, latency: float = 0.0, fail_rate: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeImgbbHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.lock = threading.Lock()
+    server.stats = {'requests': 0, 'failures': 0, 'bytes': 0, 'connections': set()}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/1/upload"
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de subida de imgbb")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Latencia por petición (s)")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Fracción de respuestas 503")
+    args = parser.parse_args()
+
+    server, url = start_fake_imgbb(args.port, args.latency, args.fail_rate)
+    print(f"Fake imgbb escuchando en {url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
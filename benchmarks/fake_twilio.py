@@ -0,0 +1,221 @@
+"""
+Local stand-in for the Twilio Messages API.
+
+Implements the three endpoints the sender and the delivery poller use:
+
+    POST /2010-04-01/Accounts/{sid}/Messages.json        create (201, status "queued")
+    GET  /2010-04-01/Accounts/{sid}/Messages.json        list (single page)
+    GET  /2010-04-01/Accounts/{sid}/Messages/{msid}.json fetch
+
+Creates can be slowed down (fixed latency + uniform jitter) and can fail with
+injected errors: 429/20429 (throttling), 500, and 63038 (daily messages
+limit). Quotas are enforced too: over `per_second` creates in the current
+second answer 429/20429, and after `daily_limit` accepted messages every
+create answers 63038.
+
+Point the sender at it with TWILIO_API_BASE_URL=http://127.0.0.1:<port> and any
+dummy TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN / TWILIO_WHATSAPP_FROM.
+
+Usage:
+    python benchmarks/fake_twilio.py --port 8766 --latency 0.1 --jitter 0.05 --rate-429 0.05 --per-second 20 --daily-limit 1000
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+_MESSAGES_RE = re.compile(r'^/2010-04-01/Accounts/(?P<account>[^/]+)/Messages(?:/(?P<sid>[^/]+))?\.json$')
+
+
+class FakeTwilioHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes: without TCP_NODELAY keep-alive requests stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # keep benchmark output clean
+        pass
+
+    def _reply(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, code: int, message: str, headers: Optional[Dict[str, str]] = None):
+
+        self._reply(status, {'code': code, 'message': message, 'more_info': f"https://www.twilio.com/docs/errors/{code}",
+                             'status': status}, headers)
+
+    def _message_body(self, account: str, message: Dict[str, Any]) -> Dict[str, Any]:
+
+        return dict(message, account_sid=account, api_version='2010-04-01',
+                    uri=f"/2010-04-01/Accounts/{account}/Messages/{message['sid']}.json")
+
+    def do_POST(self):
+
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+
+        match = _MESSAGES_RE.match(urlsplit(self.path).path)
+        if not match or match.group('sid'):
+            self._error(404, 20404, 'The requested resource was not found')
+            return
+
+        with server.lock:
+            server.stats['requests'] += 1
+            server.stats['connections'].add(self.client_address)
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        error = self._injected_error()
+        if error:
+            status, code, text, retry_after = error
+            with server.lock:
+                server.stats['errors'][code] = server.stats['errors'].get(code, 0) + 1
+            self._error(status, code, text, {'Retry-After': retry_after} if retry_after else None)
+            return
+
+        now = format_datetime(datetime.now(timezone.utc))
+        message = {
+            'sid': 'SM' + uuid.uuid4().hex,
+            'status': 'queued',
+            'to': form.get('To'),
+            'from': form.get('From'),
+            'body': form.get('Body'),
+            'num_media': str(len(form['MediaUrl']) if isinstance(form.get('MediaUrl'), list) else int('MediaUrl' in form)),
+            'error_code': None,
+            'error_message': None,
+            'date_created': now,
+            'date_sent': now,
+            'date_updated': now,
+            'direction': 'outbound-api',
+        }
+        with server.lock:
+            server.messages[message['sid']] = message
+            server.stats['created'] += 1
+        self._reply(201, self._message_body(match.group('account'), message))
+
+    # quota and injected failures for a create request, as (http_status, twilio_code, message, retry_after) or None
+    # (the per-second quota answers with the seconds until its window reopens, as Retry-After)
+
+    def _injected_error(self) -> Optional[Tuple[int, int, str, Optional[str]]]:
+
+        server = self.server
+        with server.lock:
+            if server.daily_limit is not None and server.stats['created'] >= server.daily_limit:
+                return 429, 63038, 'Account exceeded the daily messages limit', None
+            if server.per_second:
+                second = int(time.time())
+                if second != server.window_second:
+                    server.window_second, server.window_count = second, 0
+                if server.window_count >= server.per_second:
+                    return 429, 20429, 'Too Many Requests', f"{second + 1 - time.time():.3f}"
+                server.window_count += 1
+
+        roll = random.random()
+        if roll < server.rate_63038:
+            return 429, 63038, 'Account exceeded the daily messages limit (injected)', None
+        roll -= server.rate_63038
+        if roll < server.rate_429:
+            return 429, 20429, 'Too Many Requests (injected)', None
+        roll -= server.rate_429
+        if roll < server.rate_500:
+            return 500, 20500, 'Internal Server Error (injected)', None
+        return None
+
+    def do_GET(self):
+
+        server = self.server
+        parts = urlsplit(self.path)
+        match = _MESSAGES_RE.match(parts.path)
+        if not match:
+            self._error(404, 20404, 'The requested resource was not found')
+            return
+        account = match.group('account')
+
+        if match.group('sid'):
+            with server.lock:
+                message = server.messages.get(match.group('sid'))
+            if message is None:
+                self._error(404, 20404, 'The requested resource was not found')
+                return
+            self._reply(200, self._message_body(account, message))
+            return
+
+        # the whole list in a single page (next_page_uri = None ends the client's paging)
+        query = parse_qs(parts.query)
+        page_size = int(query.get('PageSize', ['50'])[0])
+        with server.lock:
+            messages = [self._message_body(account, m) for m in server.messages.values()]
+        self._reply(200, {'messages': messages, 'page': 0, 'page_size': page_size, 'first_page_uri': parts.path,
+                          'previous_page_uri': None, 'next_page_uri': None, 'uri': self.path, 'start': 0,
+                          'end': max(0, len(messages) - 1)})
+
+class FakeTwilioServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    # load tests open many connections at once
+    request_queue_size = 128
+
+# start the stand-in in a background thread, returns (server, base_url)
+
+def start_fake_twilio(port: int = 0, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0,
+                      rate_500: float = 0.0, rate_63038: float = 0.0, per_second: int = 0,
+                      daily_limit: Optional[int] = None) -> Tuple[ThreadingHTTPServer, str]:
+
+    server = FakeTwilioServer(('127.0.0.1', port), FakeTwilioHandler)
+    server.latency = latency
+    server.jitter = jitter
+    server.rate_429 = rate_429
+    server.rate_500 = rate_500
+    server.rate_63038 = rate_63038
+    server.per_second = per_second
+    server.daily_limit = daily_limit
+    server.window_second, server.window_count = 0, 0
+    server.lock = threading.Lock()
+    server.messages = {}
+    server.stats = {'requests': 0, 'created': 0, 'errors': {}, 'connections': set()}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de mensajes de Twilio")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.0, help="Latencia por petición (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Latencia extra aleatoria (s)")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Fracción de respuestas 429 (20429)")
+    parser.add_argument('--rate-500', type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument('--rate-63038', type=float, default=0.0, help="Fracción de respuestas 63038 (límite diario)")
+    parser.add_argument('--per-second', type=int, default=0, help="Máximo de mensajes por segundo (0 = sin límite)")
+    parser.add_argument('--daily-limit', type=int, default=None, help="Mensajes aceptados antes de responder 63038")
+    args = parser.parse_args()
+
+    server, url = start_fake_twilio(args.port, args.latency, args.jitter, args.rate_429, args.rate_500,
+                                    args.rate_63038, args.per_second, args.daily_limit)
+    print(f"Fake Twilio escuchando en {url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
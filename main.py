@@ -1,10 +1,49 @@
 from datetime import datetime
+import argparse
 import os
 import sys
-from utils.data_loader import load_and_validate_data    
-from utils.analyzer import DataAnalyzer, analyze_data
-from utils.visualizer import generate_visualizations
-from utils.whatsapp_sender import WhatsAppSender, send_whatsapp_report, send_whatsapp_report_simulated
+import time
+from typing import Any, Dict, Optional
+
+# heavy dependencies (pandas, matplotlib, twilio) are imported inside each stage,
+# so a config check or a text-only run does not pay for them at startup
+
+TRUE_VALUES = {'1','true','yes','y'}
+
+# English names accepted by --from-stage
+STAGE_ALIASES = {'load': 'carga', 'analyze': 'analisis', 'analysis': 'analisis', 'message': 'mensaje',
+                 'graphs': 'graficas', 'uploads': 'subidas', 'send': 'envio', 'partitions': 'particiones',
+                 'routing': 'enrutamiento'}
+
+# parse command line options
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="RPA de análisis de ventas y reporte por WhatsApp")
+    parser.add_argument('--simulate', action='store_true', help="No usa Twilio; escribe el mensaje en outputs/")
+    parser.add_argument('--no-graphs', action='store_true', help="Omite la generación y subida de gráficas")
+    parser.add_argument('--pdf', action='store_true', help="Genera el reporte PDF en outputs/reporte_ventas.pdf")
+    parser.add_argument('--check-config', action='store_true', help="Verifica la configuración y termina")
+    parser.add_argument('--broadcast', action='store_true',
+                        help="Envía el reporte a todos los destinatarios de WHATSAPP_RECIPIENTS / WHATSAPP_RECIPIENTS_FILE")
+    parser.add_argument('--fanout', nargs='?', const='', default=None, metavar='COLUMNA',
+                        help="Un reporte por partición (p. ej. Headquarter, Segment; default REPORT_FANOUT_KEY) "
+                             "enviado a sus destinatarios de REPORT_ROUTING_FILE")
+    parser.add_argument('--profile', action='store_true',
+                        help="Agrega tracemalloc y volcados de cProfile por etapa (outputs/profile/) al reporte de ejecución")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Queda residente y ejecuta el reporte según REPORT_SCHEDULE / --schedule")
+    parser.add_argument('--checkpoint', action='store_true',
+                        help="Guarda checkpoints de etapa (outputs/checkpoints/) para reanudar con --resume / --from-stage")
+    parser.add_argument('--resume', action='store_true',
+                        help="Restaura las etapas con checkpoint válido (outputs/checkpoints/) y ejecuta sólo el resto")
+    parser.add_argument('--from-stage', default=None, metavar='ETAPA',
+                        help="Ejecuta desde ETAPA (p. ej. envio/send, graficas/graphs) restaurando las anteriores desde checkpoint")
+    parser.add_argument('--watch', action='store_true',
+                        help="Queda residente y vuelve a generar el reporte cuando cambia el Excel de data/ (o la tabla de enrutamiento)")
+    parser.add_argument('--schedule', default=None,
+                        help="Horarios del modo residente, p. ej. '08:00;lunes@09:30;every 30m'")
+    return parser.parse_args(argv)
 
 # create directories if not exist
 
@@ -32,114 +71,576 @@ def load_env_variables():
     except ImportError:
         print("python-dotenv no está instalado. Asegúrese de que las variables de entorno estén configuradas manualmente.")
 
-def main():
-    print("Iniciando RPA")
-    print("="*50)
-    print(f"Iniciado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 60)
+# verify configuration without loading data or sending anything
 
-    # setup directories and load env variables
-    setup_directories()
-    load_env_variables()
+def check_config() -> bool:
 
-    # verify if file exists
-    data_file = 'data/Ventas_Fundamentos.xlsx'
+    from utils.whatsapp_sender import load_config
 
-    if not os.path.exists(data_file):
-        print(f"Archivo de datos no encontrado: {data_file}")
-        print("Por favor, ejecute 'create_sample_data.py' para generar el archivo de datos de muestra.")
-        sys.exit(1)
+    config = load_config()
+    checks = [
+        ('WHATSAPP_DESTINY', bool(config['destination_whatsapp'])),
+        ('TWILIO_ACCOUNT_SID', bool(config['twilio_account_sid'])),
+        ('TWILIO_AUTH_TOKEN', bool(config['twilio_auth_token'])),
+        ('TWILIO_WHATSAPP_FROM', bool(config['twilio_whatsapp_from'])),
+        ('IMGBB_API_KEY (opcional)', bool(os.getenv('IMGBB_API_KEY', '').strip())),
+    ]
+    for name, ok in checks:
+        print(f"{'OK ' if ok else 'FALTA'} {name}")
 
-    print("="*50)
-    # load and validate data
-    print("Cargando y validando datos...")
-    print("="*50)
+    ok = config['simulate'] or all(ok for name, ok in checks[:4])
+    print("Configuración válida." if ok else "Configuración incompleta para envío por Twilio.")
+    return ok
+
+# build the report pipeline: each stage starts as soon as its inputs exist
+#
+#   carga -> analisis -> graficas (cada gráfica se sube al guardarse) -> subidas -+
+#                     -> mensaje (resumen compilado) --------------------------+-> pdf -> envio
+#   preparar_envio (configuración, cliente de Twilio) ----------------------------------^
+#
+# fan-out (one report per partition, loaded and aggregated once):
+#
+#   carga -> particiones -> graficas_particiones -> envio_particiones
+#   enrutamiento (tabla de destinatarios) -----^----------^
+#   preparar_envio ---------------------------------------^
+
+#
+# with `warm` (daemon / watch modes) parsed data, aggregates and rendered graphs are reused while
+# their inputs are unchanged; `incremental` (watch mode) also skips reports already delivered
+
+def build_pipeline(args, data_file: str, include_graphs: bool, make_pdf: bool, simulate: bool,
+                   warm: Optional[Dict[str, Any]] = None, fanout_key: Optional[str] = None, incremental: bool = False,
+                   checkpoint: bool = False):
+
+    from utils.pipeline import Pipeline, Stage
+
+    # checkpoints are opt-in; they are only valid for the same workbook (and routing table) and the same output options
+    checkpoints = None
+    if checkpoint:
+        from utils.checkpoints import CheckpointStore, input_fingerprint
 
-    df, validation = load_and_validate_data(data_file)
+        inputs = [data_file] + ([os.getenv('REPORT_ROUTING_FILE', '').strip()] if fanout_key and os.getenv('REPORT_ROUTING_FILE', '').strip() else [])
+        checkpoints = CheckpointStore(input_fingerprint(inputs, include_graphs=include_graphs, make_pdf=make_pdf, fanout_key=fanout_key,
+                                                        image_backend=os.getenv('IMAGE_HOST_BACKEND', '')))
 
-    if df is not None and validation['is_valid']:
+    # load and validate data (daemon mode reuses the previous load while the workbook is unchanged)
+    def load():
+        if warm is not None:
+            stat = os.stat(data_file)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if warm.get('data_key') == key:
+                print("Datos sin cambios desde la ejecución anterior: se reutiliza la carga.")
+                return warm['df']
+        print("Cargando y validando datos...")
+
+        from utils.memory_budget import MemoryBudget
+        from utils.profiling import annotate
+
+        # with MEMORY_BUDGET_MB, a workbook that would not fit is read and aggregated in chunks
+        plan = MemoryBudget().plan_load(data_file)
+        if plan['stream'] and fanout_key:
+            print("El fan-out necesita los datos completos en memoria: se ignora el presupuesto de memoria.")
+            plan['stream'] = False
+        if len(plan) > 1:
+            annotate('memory_budget', plan)
+        if plan['stream']:
+            from utils.analyzer import ChunkedAnalyzer
+            from utils.data_loader import load_and_validate_chunks
+
+            estimate = f"{plan['estimate_mb']:,.0f} MB estimados" if plan['estimate_mb'] is not None else "tamaño desconocido"
+            print(f"Presupuesto de memoria {plan['limit_mb']:,.0f} MB ({estimate}, RSS {plan['rss_mb']:,.0f} MB): "
+                  f"procesamiento por bloques de {plan['chunk_rows']:,} filas.")
+            aggregator = ChunkedAnalyzer()
+            df, validation = load_and_validate_chunks(data_file, plan['chunk_rows'], on_chunk=aggregator.add)
+            if df is not None:
+                df.aggregates = aggregator
+        else:
+            from utils.data_loader import load_and_validate_data
+
+            df, validation = load_and_validate_data(data_file)
+
+        if df is None or not validation['is_valid']:
+            print("Error en la carga de datos")
+            raise ValueError(validation.get('error', 'datos inválidos'))
         print("Datos cargados y validados exitosamente.")
         print(f"Total registros: {len(df)}")
-        print(f"Sedes: {df['Headquarter'].nunique()}")
-        print(f"Modelos: {df['Model'].nunique()}")
-        print(f'Clientes Únicos: {df["Client_ID"].nunique()}')
-    else:
-        print("Error en la carga de datos")
-        if 'error' in validation:
-            print(f"Error: {validation['error']}")
-        sys.exit(1)
+        if not plan['stream']:
+            print(f"Sedes: {df['Headquarter'].nunique()}")
+            print(f"Modelos: {df['Model'].nunique()}")
+            print(f'Clientes Únicos: {df["Client_ID"].nunique()}')
+        if warm is not None:
+            warm.update(data_key=key, df=df, results=None, partitions=None)
+        return df
 
     # analyze data
-    print("="*50)
-    print("Iniciando análisis de datos...")
-    print("="*50)
-    try:
-        analyzer = DataAnalyzer(df)
-        results = analyzer.full_analysis()
-        
-        # show summary
+    def analyze(df):
+        if warm is not None and warm.get('results') is not None:
+            print("Análisis reutilizado de la ejecución anterior.")
+            return warm['results']
+        print("Iniciando análisis de datos...")
 
+        from utils.analyzer import DataAnalyzer, analyze_in_chunks
+        from utils.data_loader import ExcelChunks
+        from utils.memory_budget import MemoryBudget
+
+        budget = MemoryBudget()
+        if isinstance(df, ExcelChunks):
+            # aggregated while the chunks were read; a handle without aggregates reads the sheet again
+            results = df.aggregates.results() if df.aggregates is not None else analyze_in_chunks(df)
+        elif budget.over_budget():
+            # over budget after loading: aggregate slices instead of copying the whole frame
+            sample = df.head(1000)
+            rows = budget.chunk_rows(sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1))
+            print(f"Memoria sobre el presupuesto ({budget.limit_mb:,.0f} MB): análisis por bloques de {rows:,} filas.")
+            results = analyze_in_chunks(df.iloc[start:start + rows] for start in range(0, len(df), rows))
+        else:
+            results = DataAnalyzer(df).full_analysis()
+        if warm is not None:
+            warm['results'] = results
+
+        # show summary
+        metrics = results['summary_metrics']
         print("\n" + "="*50)
         print("Resumen del Análisis:")
         print("="*50)
-        metrics = results['summary_metrics']
         print(f"Clientes Únicos: {metrics['unique_clients']:,}")
         print(f"Total de Ventas: {metrics['total_sales']:,}")
         print(f"Ventas Totales sin IGV: ${metrics['total_sales_without_igv']:,.2f}")
         print(f"Ventas Totales con IGV: ${metrics['total_sales_with_igv']:,.2f}")
         print(f"Ventas Promedio: ${metrics['average_sales_without_igv']:,.2f}")
-
         print(f"Modelo Más Vendido: {results['top_models'].index[0]}")
         print(f"Sede con Más Ventas: {results['sales_by_headquarter'].index[0]}")
         print(f"Canal con Más Ventas: {results['sales_by_channel'].index[0]}")
-    except Exception as e:
-        print(f"Error durante el análisis de datos: {str(e)}")
-        sys.exit(1)
+        return results
 
-    # generate graphs
-    print("Generando visualizaciones...")
-    try:
-        generate_visualizations(results)
+    # config and Twilio client are ready before the report is
+    def prepare_sender():
+
+        from utils.whatsapp_sender import get_whatsapp_sender
+
+        sender = get_whatsapp_sender()
+        sender.warm_up(simulate)
+        return sender
+
+    # summary text compiled while the graphs render; graph links are appended at send time
+    def compile_message(results, sender):
+        return sender.compile_summary(results)
+
+    # generate graphs (only when requested); each one starts uploading as soon as it is saved
+    def render_graphs(results):
+        if not include_graphs:
+            print("Generación de visualizaciones omitida.")
+            return None, None
+
+        from utils.visualizer import GRAPHS_DIR
+
+        fingerprint = None
+        if warm is not None:
+            from utils.analyzer import results_fingerprint
+
+            fingerprint = results_fingerprint(results)
+            if warm.get('graphs_fingerprint') == fingerprint and os.path.isfile(os.path.join(GRAPHS_DIR, 'dashboard_summary.png')):
+                print("Resultados sin cambios: se reutilizan las gráficas y sus enlaces.")
+                return GRAPHS_DIR, None
+        print("Generando visualizaciones...")
+
+        # graphs are only written to files; Agg also renders safely outside the main thread
+        import matplotlib
+        matplotlib.use('Agg')
+
+        from utils.image_hosting import GraphPublisher, get_image_backend
+        from utils.visualizer import generate_visualizations
+
+        backend = get_image_backend()
+        publisher = GraphPublisher(backend) if backend else None
+        generate_visualizations(results, on_saved=publisher.submit if publisher else None)
         print("Visualizaciones generadas exitosamente en 'outputs/graphs'.")
-    except Exception as e:
-        print(f"Error durante la generación de visualizaciones: {str(e)}")
-        sys.exit(1)
+        if warm is not None:
+            warm.update(graphs_fingerprint=fingerprint, graph_urls=None)
+        return GRAPHS_DIR, publisher
+
+    def collect_uploads(publisher):
+        if publisher is None:
+            # graphs reused from the previous run keep their links
+            return warm.get('graph_urls') if warm is not None else None
+        graph_urls = publisher.results()
+        if warm is not None:
+            warm['graph_urls'] = graph_urls
+        return graph_urls
+
+    # build PDF report (summary + KPI table + graphs in a single document)
+    def build_pdf(results, graphs_dir, template):
+        if not make_pdf:
+            return None
+        print("Generando reporte PDF...")
+
+        from utils.pdf_report import build_pdf_report
 
+        stats = build_pdf_report(results, graphs_dir=graphs_dir, summary=template.render())
+        print(f"Reporte PDF generado: {stats['path']} ({stats['pages']} páginas, "
+              f"{stats['size_bytes'] / 1024:,.1f} KB, {stats['build_seconds']:.2f} s)")
+        return stats['path']
 
     # send whatsapp report
+    def send(results, sender, template, graph_urls, pdf_path):
+        fingerprint = None
+        if incremental:
+            from utils.analyzer import results_fingerprint
+
+            fingerprint = results_fingerprint(results)
+            if warm.get('sent_fingerprint') == fingerprint:
+                print("El reporte no cambió desde el último envío: no se reenvía.")
+                return True
+        print("Enviando reporte por WhatsApp (Simulado)" if simulate else "Enviando reporte por WhatsApp (Twilio)...")
+        try:
+            # get whatsapp destiny
+            destiny = os.getenv("WHATSAPP_DESTINY")
+
+            print("Metodo de envío: SIMULADO" if simulate else "Metodo de envío: TWILIO")
+            if destiny:
+                print(f"Número de destino: {destiny}")
+            else:
+                print("Número de destino no encontrado.")
+
+            # normalize destiny (strip whitespace) before using
+            if destiny:
+                destiny = destiny.strip()
+
+            # send report
+            from utils.whatsapp_sender import send_whatsapp_report, send_whatsapp_report_simulated
+
+            options = {'include_graphs': include_graphs, 'pdf_path': pdf_path, 'graph_urls': graph_urls, 'template': template}
+            if args.broadcast:
+                from utils.whatsapp_sender import broadcast_whatsapp_report
+
+                report = broadcast_whatsapp_report(results, simulate=simulate, **options)
+                summary = report['summary']
+                print(f"Difusión: {summary}")
+                for outcome in report['outcomes']:
+                    if not outcome['ok']:
+                        print(f"  {outcome['recipient']}: {outcome['status']} ({outcome['error']})")
+                ok = summary['recipients'] > 0 and all(o['ok'] for o in report['outcomes'])
+            elif simulate:
+                ok = send_whatsapp_report_simulated(results, destiny, **options)
+            else:
+                input_key = None
+                if sender.config['outbound_queue']:
+                    from utils.checkpoints import input_fingerprint
+
+                    # queued messages are keyed by the report identity, so a rerun after a crash resumes them
+                    input_key = input_fingerprint([data_file])
+                ok = send_whatsapp_report(results, destiny, input_key=input_key, **options)
+
+            if ok:
+                print("Reporte enviado exitosamente por WhatsApp.")
+                if incremental:
+                    warm['sent_fingerprint'] = fingerprint
+
+            else:
+                print("Error al enviar el reporte por WhatsApp.")
+            return ok
+        except Exception as e:
+            print(f"Error durante el envío del reporte por WhatsApp: {e}")
+            return False
+
+    # every partition aggregated in one pass over the loaded data
+    def partition(df):
+        if warm is not None and warm.get('partitions') is not None and warm.get('partitions_key') == fanout_key:
+            print("Particiones reutilizadas de la ejecución anterior.")
+            return warm['partitions']
+
+        from utils.analyzer import analyze_partitions
+
+        partitions = analyze_partitions(df, fanout_key)
+        print(f"Particiones por '{fanout_key}': {len(partitions)}")
+        if warm is not None:
+            warm.update(partitions=partitions, partitions_key=fanout_key)
+        return partitions
+
+    # {partition: fingerprint}, computed once per partitions dict
+    def partition_fingerprints(partitions):
+        cached = warm.get('partition_fingerprints') if warm is not None else None
+        if cached is not None and cached[0] is partitions:
+            return cached[1]
+
+        from utils.analyzer import results_fingerprint
+
+        fingerprints = {str(p): results_fingerprint(r) for p, r in partitions.items()}
+        if warm is not None:
+            warm['partition_fingerprints'] = (partitions, fingerprints)
+        return fingerprints
+
+    def load_routes():
+
+        from utils.fanout import load_routing_table
+
+        return load_routing_table(fanout_key)
+
+    # one chart set per routed partition (outputs/graphs/<partición>/)
+    def render_partition_graphs(partitions, routing):
+        if not include_graphs:
+            print("Generación de visualizaciones omitida.")
+            return None
+
+        from utils.fanout import route_partitions
+        from utils.visualizer import generate_partitioned_visualizations
+
+        routed, _unrouted = route_partitions(partitions, routing)
+        if not routed:
+            return None
+        # partitions whose results did not change keep the charts of the previous run
+        reuse: Dict[str, Dict[str, Any]] = {}
+        rendered = warm.setdefault('partition_graphs', {}) if warm is not None else {}
+        if warm is not None:
+            fingerprints = partition_fingerprints(partitions)
+            for p, _r in routed:
+                previous = rendered.get(str(p))
+                if previous and previous[0] == fingerprints[str(p)] and os.path.isdir(previous[1]['dir']):
+                    reuse[str(p)] = previous[1]
+        pending = {p: partitions[p] for p, _r in routed if str(p) not in reuse}
+        if not pending:
+            print(f"Gráficas reutilizadas para las {len(reuse)} particiones.")
+            return reuse
+        print(f"Generando visualizaciones para {len(pending)} particiones ({len(reuse)} reutilizadas)...")
+        manifest = generate_partitioned_visualizations(pending, reuse=reuse)['partitions']
+        if warm is not None:
+            fingerprints = partition_fingerprints(partitions)
+            for p in pending:
+                if str(p) in manifest:
+                    rendered[str(p)] = (fingerprints[str(p)], manifest[str(p)])
+        return manifest
+
+    def send_partitions(partitions, routing, sender, manifest):
+        print("Enviando reportes por partición (Simulado)" if simulate else "Enviando reportes por partición (Twilio)...")
+
+        from utils.fanout import ReportFanout
+
+        delivered = warm.setdefault('delivered', {}) if incremental else {}
+        if incremental:
+            # only recipients that have not received the current report of their partition
+            fingerprints = partition_fingerprints(partitions)
+            current = {str(p).casefold(): fingerprints[str(p)] for p in partitions}
+            pending_routing = {}
+            for name, recipients in routing.items():
+                pending = [r for r in recipients if name in current and delivered.get((name, r['number'])) != current[name]]
+                if pending:
+                    pending_routing[name] = pending
+            unchanged = [name for name in routing if name in current and name not in pending_routing]
+            if unchanged:
+                print(f"Particiones sin cambios desde el último envío (no se reenvían): {', '.join(unchanged)}")
+            if not pending_routing:
+                return True
+            partitions = {p: r for p, r in partitions.items() if str(p).casefold() in pending_routing}
+            routing = pending_routing
+
+        report = ReportFanout(sender, routing, fanout_key).send(partitions, manifest, simulate=simulate,
+                                                                include_graphs=include_graphs)
+        if incremental:
+            for tenant, tenant_report in report['tenants'].items():
+                for outcome in tenant_report['outcomes']:
+                    if outcome['ok']:
+                        delivered[(tenant.casefold(), outcome['recipient'])] = fingerprints[tenant]
+        summary = report['summary']
+        print(f"Fan-out: {summary}")
+        for tenant, tenant_report in report['tenants'].items():
+            failed = [o for o in tenant_report['outcomes'] if not o['ok']]
+            print(f"  {tenant}: {len(tenant_report['outcomes']) - len(failed)}/{len(tenant_report['outcomes'])} enviados")
+            for outcome in failed:
+                print(f"    {outcome['recipient']}: {outcome['status']} ({outcome['error']})")
+        if summary['tenants'] == 0:
+            print("Ninguna partición tiene destinatarios (REPORT_ROUTING_FILE).")
+        return summary['tenants'] > 0 and summary['failed_tenants'] == 0
+
+    if fanout_key:
+        if make_pdf:
+            print("El PDF no se genera en modo fan-out.")
+        return Pipeline([
+            Stage('carga', load, outputs=['df'], checkpoint=True),
+            Stage('preparar_envio', prepare_sender, outputs=['sender']),
+            Stage('enrutamiento', load_routes, outputs=['routing']),
+            Stage('particiones', partition, inputs=['df'], outputs=['partitions'], checkpoint=True),
+            Stage('graficas_particiones', render_partition_graphs, inputs=['partitions', 'routing'], outputs=['manifest'],
+                  checkpoint=True),
+            Stage('envio_particiones', send_partitions, inputs=['partitions', 'routing', 'sender', 'manifest'], outputs=['sent']),
+        ], checkpoints=checkpoints)
+
+    # the send is never checkpointed: a resumed run always sends
+    return Pipeline([
+        Stage('carga', load, outputs=['df'], checkpoint=True),
+        Stage('preparar_envio', prepare_sender, outputs=['sender']),
+        Stage('analisis', analyze, inputs=['df'], outputs=['results'], checkpoint=True),
+        Stage('mensaje', compile_message, inputs=['results', 'sender'], outputs=['template'], checkpoint=True),
+        # the upload pool is live state: a restored run reuses the links saved by 'subidas'
+        Stage('graficas', render_graphs, inputs=['results'], outputs=['graphs_dir', 'publisher'], checkpoint=True,
+              transient=['publisher']),
+        Stage('subidas', collect_uploads, inputs=['publisher'], outputs=['graph_urls'], checkpoint=True),
+        # a failed PDF does not stop the report
+        Stage('pdf', build_pdf, inputs=['results', 'graphs_dir', 'template'], outputs=['pdf_path'], required=False,
+              checkpoint=True),
+        Stage('envio', send, inputs=['results', 'sender', 'template', 'graph_urls', 'pdf_path'], outputs=['sent']),
+    ], checkpoints=checkpoints)
+
+# run the report pipeline once; returns whether the report was sent (None if a stage failed)
+# `trigger` ({'at': time.time() of the first file event, 'files': [...]}) reports trigger-to-message latency
+
+def run_report(args, data_file: str, warm: Optional[Dict[str, Any]] = None, incremental: bool = False,
+               trigger: Optional[Dict[str, Any]] = None, resume: bool = False, from_stage: Optional[str] = None) -> Optional[bool]:
+
+    include_graphs = not args.no_graphs and os.getenv('REPORT_GRAPHS', 'true').strip().lower() in TRUE_VALUES
+    make_pdf = args.pdf or os.getenv('REPORT_PDF', 'false').strip().lower() in TRUE_VALUES
     # detect simulate mode from CLI or env
-    simulate = ('--simulate' in sys.argv) or (os.getenv('WHATSAPP_SIMULATE', 'false').strip().lower() in {'1','true','yes','y'})
-    print("Enviando reporte por WhatsApp (Simulado)" if simulate else "Enviando reporte por WhatsApp (Twilio)...")
+    simulate = args.simulate or (os.getenv('WHATSAPP_SIMULATE', 'false').strip().lower() in TRUE_VALUES)
+
+    from utils.pipeline import PipelineError
+    from utils.profiling import finish_run, start_run
+
+    # wall/CPU/peak RSS per stage and sub-step, written to outputs/run_report.json
+    start_run(profile=args.profile)
+    fanout_key = None
+    if args.fanout is not None:
+        from utils.fanout import fanout_key as resolve_fanout_key
+
+        fanout_key = resolve_fanout_key(args.fanout)
+    from utils.checkpoints import checkpoints_requested
+
+    # resumable runs keep their checkpoints current for the next --resume
+    checkpoint = args.checkpoint or resume or from_stage is not None or checkpoints_requested()
+    pipeline = build_pipeline(args, data_file, include_graphs, make_pdf, simulate, warm=warm, fanout_key=fanout_key,
+                              incremental=incremental, checkpoint=checkpoint)
+    if from_stage is not None:
+        names = [stage.name for stage in pipeline.stages]
+        alias = STAGE_ALIASES.get(from_stage, from_stage)
+        # fan-out stage names carry a suffix (envio_particiones)
+        from_stage = next((name for name in (from_stage, alias, f"{alias}_particiones") if name in names), None)
+        if from_stage is None:
+            print(f"Etapa desconocida: {alias} (etapas: {', '.join(names)})")
+            finish_run(sent=None)
+            return None
+    sent = None
+    extra: Dict[str, Any] = {}
     try:
-        # get whatsapp destiny
-        destiny = os.getenv("WHATSAPP_DESTINY")
-        
-        print("Metodo de envío: SIMULADO" if simulate else "Metodo de envío: TWILIO")
-        if destiny:
-            print(f"Número de destino: {destiny}")
-        else:
-            print("Número de destino no encontrado.")
+        sent = bool(pipeline.run(resume=resume, from_stage=from_stage).get('sent'))
+    except PipelineError as e:
+        print(f"Error en la etapa '{e.stage}': {e.error}")
+    finally:
+        seconds, chain = pipeline.critical_path()
+        if trigger is not None:
+            extra['trigger'] = {'files': trigger['files'], 'latency_seconds': round(time.time() - trigger['at'], 4)}
+        report_path = finish_run(sent=sent, critical_path={'seconds': round(seconds, 4), 'stages': chain}, **extra)
 
-        # normalize destiny (strip whitespace) before using
-        if destiny:
-            destiny = destiny.strip()
+    print("="*50)
+    print("Etapas:")
+    print(pipeline.summary())
+    if trigger is not None:
+        print(f"Latencia del cambio al mensaje: {extra['trigger']['latency_seconds']:.2f} s")
+    print(f"Reporte de ejecución: {report_path}")
+    return sent
 
-        # send report
-        if simulate:
-            ok = send_whatsapp_report_simulated(results, destiny)
-        else:
-            ok = send_whatsapp_report(results, destiny)
+# resident modes reconcile delivery statuses in the background (a single run leaves it to
+# `python -m utils.delivery_tracker poll`, from cron or as a separate process)
 
-        if ok:
-            print("Reporte enviado exitosamente por WhatsApp.")
-        
-        else:
-            print("Error al enviar el reporte por WhatsApp.")
-    except Exception as e:
-        print(f"Error durante el envío del reporte por WhatsApp: {e}")
-        # exit program
+def start_background_poller(args):
+
+    from utils.delivery_tracker import start_delivery_poller
+    from utils.whatsapp_sender import get_whatsapp_sender
+
+    simulate = args.simulate or (os.getenv('WHATSAPP_SIMULATE', 'false').strip().lower() in TRUE_VALUES)
+    return start_delivery_poller(get_whatsapp_sender(), simulate)
+
+# resident mode: imports, sender/Twilio client, upload cache and parsed data stay warm between runs
+
+def run_daemon(args, data_file: str):
 
+    from utils.scheduler import ReportDaemon, parse_schedule
+
+    specs = parse_schedule(args.schedule or os.getenv('REPORT_SCHEDULE', '08:00'))
+    warm: Dict[str, Any] = {}
+
+    def job():
+        print(f"Ejecución programada: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        return bool(run_report(args, data_file, warm=warm))
+
+    poller = start_background_poller(args)
+    ReportDaemon(job, specs).run_forever()
+    if poller is not None:
+        poller.stop()
+
+# watch mode: re-run as soon as an input changes; unchanged data, aggregates, graphs and
+# already delivered reports are reused from the previous run
+
+def run_watch(args, data_file: str):
+
+    import signal
+    from utils.file_watcher import FileWatcher
+
+    inputs = [data_file] + [path for path in (os.getenv('REPORT_ROUTING_FILE', '').strip(),
+                                              os.getenv('WHATSAPP_RECIPIENTS_FILE', '').strip()) if path]
+    warm: Dict[str, Any] = {}
+
+    def on_change(files, event_at):
+        print(f"Cambios detectados: {', '.join(os.path.relpath(f) for f in files)}")
+        if not os.path.exists(data_file):
+            print(f"Archivo de datos no encontrado: {data_file}; se espera el siguiente cambio.")
+            return
+        try:
+            run_report(args, data_file, warm=warm, incremental=True,
+                       trigger={'at': event_at, 'files': [os.path.relpath(f) for f in files]})
+        except Exception as e:
+            print(f"Error en la ejecución disparada por el cambio: {e}")
+
+    # first run with the current inputs (fills the caches), then one run per batch of changes
+    run_report(args, data_file, warm=warm, incremental=True)
+
+    poller = start_background_poller(args)
+    watcher = FileWatcher(inputs, on_change)
+    signal.signal(signal.SIGINT, watcher.stop)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    print(f"Observando cambios en: {', '.join(inputs)} (Ctrl+C para salir)")
+    watcher.run_forever()
+    if poller is not None:
+        poller.stop()
+    print("Observador detenido.")
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.check_config:
+        load_env_variables()
+        sys.exit(0 if check_config() else 1)
+
+    print("Iniciando RPA")
+    print("="*50)
+    print(f"Iniciado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    # setup directories and load env variables
+    setup_directories()
+    load_env_variables()
+
+    # log records are written by a background thread (LOG_LEVEL / LOG_LEVELS / LOG_DIAGNOSTICS)
+    from utils.log_setup import configure_logging
+    configure_logging()
+
+    # verify if file exists
+    data_file = 'data/Ventas_Fundamentos.xlsx'
+
+    if not os.path.exists(data_file):
+        print(f"Archivo de datos no encontrado: {data_file}")
+        print("Por favor, ejecute 'create_sample_data.py' para generar el archivo de datos de muestra.")
+        sys.exit(1)
+
+    if (args.resume or args.from_stage) and (args.daemon or args.watch):
+        print("--resume / --from-stage sólo aplican a una ejecución única; se ignoran.")
+    if args.daemon:
+        run_daemon(args, data_file)
+        return
+    if args.watch:
+        run_watch(args, data_file)
+        return
+
+    if run_report(args, data_file, resume=args.resume, from_stage=args.from_stage) is None:
+        sys.exit(1)
     print("PROCESO COMPLETADO")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
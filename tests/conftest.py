@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# tests import the project modules (utils.*) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# small sales frame with the workbook columns (same shape as create_sample_data.py)
+
+@pytest.fixture
+def sales_frame():
+
+    import pandas as pd
+
+    rows = 60
+    headquarters = ['Lima', 'Cusco', 'Arequipa']
+    models = ['Toyota Corolla', 'Honda Civic', 'Kia Sportage', 'Mazda CX-5']
+    channels = ['Web', 'Concesionario', 'Referido']
+    segments = ['Individual', 'Corporativo']
+    price = [20000.0 + 450.0 * i for i in range(rows)]
+    return pd.DataFrame({
+        'Sell_Date': pd.date_range('2025-01-01', periods=rows, freq='5D'),
+        'Headquarter': [headquarters[i % len(headquarters)] for i in range(rows)],
+        'Model': [models[i % len(models)] for i in range(rows)],
+        'Channel': [channels[i % len(channels)] for i in range(rows)],
+        'Segment': [segments[i % len(segments)] for i in range(rows)],
+        'Client_ID': [f'CLI_{i % 25:04d}' for i in range(rows)],
+        'Price_Without_IGV': price,
+        'IGV': [round(p * 0.18, 2) for p in price],
+        'Price_With_IGV': [round(p * 1.18, 2) for p in price],
+    })
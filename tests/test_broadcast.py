@@ -0,0 +1,41 @@
+import threading
+import time
+
+from utils.broadcast import Broadcaster
+
+
+class _InstantSender:
+
+    # accepts every message at once and records when it was submitted
+
+    config = {'max_retries': 1, 'wait_time': 0}
+
+    def __init__(self):
+        self.sent_at = []
+        self._lock = threading.Lock()
+
+    def submit_twilio_message(self, message, recipient, media_urls=None):
+        with self._lock:
+            self.sent_at.append(time.monotonic())
+        return True, f"SM{recipient}", None, False
+
+
+def test_broadcast_stays_under_the_configured_rate():
+
+    sender = _InstantSender()
+    rate = 50.0
+
+    summary = Broadcaster(sender, rate=rate, concurrency=16, burst=1).send("hola", [f"+1555{i:07d}" for i in range(51)])['summary']
+
+    assert summary['sent'] == 51
+    sent_at = sorted(sender.sent_at)
+    # one send may go immediately, the other 50 wait for tokens at 50/s: no second carries more than 50
+    assert (len(sent_at) - 1) / (sent_at[-1] - sent_at[0]) <= rate * 1.02
+    assert max(sum(1 for t in sent_at if start <= t < start + 1.0) for start in sent_at) <= rate
+
+
+def test_burst_defaults_to_one(monkeypatch):
+
+    monkeypatch.delenv('WHATSAPP_BURST', raising=False)
+
+    assert Broadcaster(_InstantSender(), rate=20).bucket.capacity == 1.0
@@ -0,0 +1,68 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from utils.delivery_tracker import DeliveryPoller, DeliveryStore
+
+
+class _NoMessages:
+
+    # Messages list API that never reports the pending SIDs
+
+    def __init__(self):
+        self.calls = 0
+
+    def stream(self, **kwargs):
+        self.calls += 1
+        return iter(())
+
+
+def test_messages_never_reported_expire_and_stop_being_polled(tmp_path):
+
+    store = DeliveryStore(str(tmp_path / 'delivery.db'))
+    store.record_sent('SM1', '+15550000001', 'queued')
+    old = (datetime.now(timezone.utc) - timedelta(hours=25)).isoformat()
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE deliveries SET sent_at = ? WHERE sid = 'SM1'", (old,))
+    messages = _NoMessages()
+    poller = DeliveryPoller(SimpleNamespace(messages=messages), store)
+
+    poller.run_once()
+
+    assert store.get('SM1')['status'] == 'expired'
+    assert store.get('SM1')['final']
+    assert store.pending() == []
+    poller.run_once()
+    # rows past the tracking window are closed without listing messages at all
+    assert messages.calls == 0
+
+
+class _StuckMessages:
+
+    # Messages list API that keeps reporting every SID as still 'sent'; records the listing window
+
+    def __init__(self, sids):
+        self.sids = sids
+        self.windows = []
+
+    def stream(self, date_sent_after=None, **kwargs):
+        self.windows.append(date_sent_after)
+        return iter([SimpleNamespace(sid=sid, status='sent', error_code=None) for sid in self.sids])
+
+
+def test_messages_stuck_in_a_non_final_state_expire_too(tmp_path):
+
+    store = DeliveryStore(str(tmp_path / 'delivery.db'))
+    store.record_sent('SM_OLD', '+15550000001', 'sent')
+    store.record_sent('SM_NEW', '+15550000002', 'sent')
+    old = (datetime.now(timezone.utc) - timedelta(hours=25)).isoformat()
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE deliveries SET sent_at = ? WHERE sid = 'SM_OLD'", (old,))
+    messages = _StuckMessages(['SM_OLD', 'SM_NEW'])
+
+    DeliveryPoller(SimpleNamespace(messages=messages), store).run_once()
+
+    assert store.get('SM_OLD')['status'] == 'expired'
+    assert [p['sid'] for p in store.pending()] == ['SM_NEW']
+    # the listing window starts at the messages still being tracked, not at the expired one
+    assert messages.windows[0] > datetime.now(timezone.utc) - timedelta(hours=1)
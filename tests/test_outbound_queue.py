@@ -0,0 +1,132 @@
+import time
+
+import pandas as pd
+
+from utils.analyzer import results_fingerprint
+from utils.message_templates import ReportTemplate, split_message
+from utils.outbound_queue import OutboundQueue, QueueWorker, report_identity
+
+
+def _results():
+
+    return {
+        'sales_by_headquarter': pd.Series({'Lima': 300.0, 'Cusco': 120.0}),
+        'top_models': pd.Series({'Model A': 3, 'Model B': 1}),
+        'sales_by_channel': pd.Series({'Online': 3, 'Tienda': 1}),
+        'sales_by_segment': pd.Series({'Corporativo': 250.0, 'Retail': 170.0}),
+        'summary_metrics': {'unique_clients': 3, 'total_sales': 4, 'total_sales_without_igv': 420.0,
+                            'total_sales_with_igv': 495.6, 'total_igv_collected': 75.6,
+                            'average_sales_without_igv': 105.0, 'max_sale_without_igv': 200.0,
+                            'min_sale_without_igv': 20.0},
+        'monthly_sales_trend': pd.Series({'2024-01': 420.0}),
+    }
+
+
+def test_same_report_with_different_clock_is_enqueued_once(tmp_path):
+
+    queue = OutboundQueue(path=str(tmp_path / 'queue.db'))
+    results = _results()
+    report_id = report_identity(results_fingerprint(results), 'input-sha')
+    first = ReportTemplate(results, generated_at='2024-05-01 08:00:00', extra='x' * 1700).render()
+    rerun = ReportTemplate(results, generated_at='2024-05-01 08:07:31', extra='x' * 1700).render()
+    assert first != rerun
+
+    keys = queue.enqueue_report('+51999000111', split_message(first), report_id)
+    again = queue.enqueue_report('+51999000111', split_message(rerun), report_id)
+
+    assert len(keys) > 1
+    assert again == keys
+    assert queue.summary().get('pending') == len(keys)
+
+
+def test_report_identity_depends_on_inputs_and_recipient(tmp_path):
+
+    queue = OutboundQueue(path=str(tmp_path / 'queue.db'))
+    results = _results()
+    body = ReportTemplate(results, generated_at='2024-05-01 08:00:00').render()
+
+    a = queue.enqueue_report('+51999000111', [body], report_identity(results_fingerprint(results), 'input-a'))
+    b = queue.enqueue_report('+51999000111', [body], report_identity(results_fingerprint(results), 'input-b'))
+    c = queue.enqueue_report('+51999000222', [body], report_identity(results_fingerprint(results), 'input-a'))
+
+    assert len({a[0], b[0], c[0]}) == 3
+
+
+def test_failed_report_is_queued_again_on_the_next_run(tmp_path):
+
+    queue = OutboundQueue(path=str(tmp_path / 'queue.db'))
+    report_id = report_identity(results_fingerprint(_results()), 'input-sha')
+    key, = queue.enqueue_report('+51999000111', ['Reporte'], report_id, max_attempts=1)
+    item, = queue.claim('worker-1')
+    queue.mark_submitting(item)
+    queue.mark_retry(item, 'HTTP 500', retriable=True)
+    assert queue.get(key)['status'] == 'failed'
+
+    assert queue.enqueue_report('+51999000111', ['Reporte'], report_id) == [key]
+
+    again = queue.get(key)
+    assert (again['status'], again['attempts'], again['last_error']) == ('pending', 0, None)
+    assert [i['idempotency_key'] for i in queue.claim('worker-2')] == [key]
+
+
+def test_sent_report_is_not_queued_again(tmp_path):
+
+    queue = OutboundQueue(path=str(tmp_path / 'queue.db'))
+    key, = queue.enqueue_report('+51999000111', ['Reporte'], 'report')
+    item, = queue.claim('worker-1')
+    queue.mark_sent(item, 'SM1')
+
+    queue.enqueue_report('+51999000111', ['Reporte'], 'report')
+
+    assert queue.get(key)['status'] == 'sent'
+    assert queue.claim('worker-2') == []
+
+
+
+class _SlowSender:
+
+    # each submit takes `seconds`; another worker looks for work during every send
+
+    def __init__(self, queue, seconds=0.0):
+        self.queue = queue
+        self.seconds = seconds
+        self.sent = 0
+        self.reclaimed = []
+
+    def max_submit_seconds(self):
+        return 300.0
+
+    def submit_twilio_message(self, body, recipient, media_urls=None):
+        time.sleep(self.seconds)
+        self.reclaimed += self.queue.claim('worker-2', limit=10)
+        self.sent += 1
+        return True, f"SM{self.sent}", None, False
+
+
+def _queue_with_rows(tmp_path, count):
+
+    queue = OutboundQueue(path=str(tmp_path / 'queue.db'))
+    for index in range(count):
+        queue.enqueue('+51999000111', f"parte {index}")
+    return queue
+
+
+def test_lease_outlasts_the_slowest_submit(tmp_path):
+
+    queue = _queue_with_rows(tmp_path, 1)
+    sender = _SlowSender(queue)
+
+    assert QueueWorker(sender, queue).lease_seconds > sender.max_submit_seconds()
+
+
+def test_rows_waiting_in_a_batch_are_not_reclaimed_by_another_worker(tmp_path):
+
+    # three 0.2 s sends under a 0.3 s lease: without the heartbeat the last row expires mid-batch
+    queue = _queue_with_rows(tmp_path, 3)
+    sender = _SlowSender(queue, seconds=0.2)
+
+    QueueWorker(sender, queue, worker_id='worker-1', lease_seconds=0.3).run_once()
+
+    assert sender.reclaimed == []
+    assert sender.sent == 3
+    assert queue.summary() == {'sent': 3}
@@ -0,0 +1,17 @@
+import os
+
+from utils.simulation_sink import SimulationSink, iter_records
+
+
+def test_rotation_limit_is_measured_in_utf8_bytes(tmp_path):
+
+    # 'é' and '📈' take 2 and 4 bytes: a character count would let the file grow well past the limit
+    sink = SimulationSink(str(tmp_path / 'simulation_log.jsonl'), max_bytes=2_000, backups=3, compress=False)
+    for index in range(40):
+        sink.write({'index': index, 'body': 'Análisis de ventas 📈 ' * 5})
+    sink.close()
+
+    sizes = [os.path.getsize(path) for path in sink.files()]
+    assert len(sizes) > 1
+    assert max(sizes) <= 2_000
+    assert [r['index'] for r in iter_records(sink)][-1] == 39
@@ -0,0 +1,41 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils.static_server import serve_static
+
+
+@pytest.fixture
+def server(tmp_path):
+
+    graphs = tmp_path / 'graphs'
+    graphs.mkdir()
+    (graphs / 'chart.png').write_bytes(b'\x89PNG fake')
+    (graphs / 'manifest.json').write_text('{}')
+    (tmp_path / 'simulation_log.jsonl').write_text('{"recipient": "+51999000111"}')
+    srv = serve_static(str(graphs), port=0)
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _status(server, path):
+
+    try:
+        return urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}{path}").status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_binds_to_loopback_by_default(server):
+
+    assert server.server_address[0] == '127.0.0.1'
+
+
+def test_serves_only_images_under_root(server):
+
+    assert _status(server, '/chart.png') == 200
+    assert _status(server, '/manifest.json') == 404
+    assert _status(server, '/../simulation_log.jsonl') == 404
+    assert _status(server, '/%2e%2e/simulation_log.jsonl') == 404
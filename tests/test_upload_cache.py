@@ -0,0 +1,28 @@
+from utils.image_uploader import upload_images_to_imgbb_ordered
+from utils.upload_cache import UploadCache, file_sha256, upload_key
+
+
+def test_cached_urls_are_scoped_to_the_upload_endpoint(tmp_path, monkeypatch):
+
+    image = tmp_path / 'chart.png'
+    image.write_bytes(b'\x89PNG fake')
+    cache = UploadCache(str(tmp_path / 'upload_cache.json'))
+    cache.put(upload_key('imgbb', 'http://127.0.0.1:9/upload', file_sha256(str(image))), 'http://stand-in/chart.png')
+
+    monkeypatch.setenv('IMGBB_UPLOAD_URL', 'http://127.0.0.1:9/upload')
+    assert upload_images_to_imgbb_ordered([str(image)], 'key', cache=cache) == ['http://stand-in/chart.png']
+
+    # another endpoint (here: unreachable) must upload again instead of reusing the stand-in URL
+    monkeypatch.setenv('IMGBB_UPLOAD_URL', 'http://127.0.0.1:9/other')
+    assert upload_images_to_imgbb_ordered([str(image)], 'key', cache=cache, retries=0, deadline=2) == [None]
+
+
+def test_prune_drops_entries_without_a_namespace(tmp_path):
+
+    cache = UploadCache(str(tmp_path / 'upload_cache.json'))
+    cache.put('0' * 64, 'http://old/chart.png')
+    cache.put(upload_key('s3', 'bucket', '0' * 64), 'http://bucket/chart.png')
+
+    assert cache.prune() == 1
+    assert cache.get('0' * 64) is None
+    assert cache.get(upload_key('s3', 'bucket', '0' * 64)) == 'http://bucket/chart.png'
@@ -0,0 +1,35 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+from utils.analyzer import DataAnalyzer
+from utils.visualizer import _render_partition
+
+
+def test_partition_manifest_lists_only_the_charts_of_this_render(tmp_path, sales_frame):
+
+    output_dir = tmp_path / 'Lima'
+    output_dir.mkdir()
+    (output_dir / 'stale_chart.png').write_bytes(b'\x89PNG old')
+    results = DataAnalyzer(sales_frame).full_analysis()
+
+    _key, _dir, files = _render_partition('Lima', results, str(output_dir), {})
+
+    assert 'stale_chart.png' not in files
+    assert 'dashboard_summary.png' in files
+    assert all((output_dir / name).is_file() for name in files)
+
+
+def test_partition_keys_that_sanitize_alike_get_their_own_folders(tmp_path, sales_frame):
+
+    from utils.visualizer import generate_partitioned_visualizations, partition_dirname
+
+    keys = ['Lima Norte', 'Lima_Norte', 'Lima/Norte']
+    assert len({partition_dirname(key) for key in keys}) == len(keys)
+
+    partitions = {key: DataAnalyzer(sales_frame.iloc[index::3]).full_analysis() for index, key in enumerate(keys)}
+    manifest = generate_partitioned_visualizations(partitions, output_root=str(tmp_path), workers=2)
+
+    dirs = [manifest['partitions'][key]['dir'] for key in keys]
+    assert len(set(dirs)) == len(keys)
+    assert all(manifest['partitions'][key]['graphs'] for key in keys)
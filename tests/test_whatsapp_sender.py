@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.twilio_pool import reset_twilio_clients
+from utils.whatsapp_sender import WhatsAppSender
+
+
+class _TwilioStub(BaseHTTPRequestHandler):
+
+    # Messages create only: accepts, or answers 429 (always, or over `per_second` creates in the current second)
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with server.lock:
+            second = int(time.time())
+            if second != server.window[0]:
+                server.window = [second, 0]
+            throttled = server.always_429 or (server.per_second and server.window[1] >= server.per_second)
+            if throttled:
+                server.throttled += 1
+            else:
+                server.window[1] += 1
+        if throttled:
+            headers = None if server.always_429 else {'Retry-After': f"{second + 1 - time.time():.3f}"}
+            self._reply(429, {'code': 20429, 'message': 'Too Many Requests', 'status': 429}, headers)
+            return
+        self._reply(201, {'sid': 'SM' + uuid.uuid4().hex, 'status': 'queued'})
+
+
+def _start_stub(per_second=0, always_429=False):
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TwilioStub)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.window = [0, 0]
+    server.per_second = per_second
+    server.always_429 = always_429
+    server.throttled = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def twilio_env(tmp_path, monkeypatch):
+
+    def configure(**server_options):
+        server, base_url = _start_stub(**server_options)
+        monkeypatch.setenv('TWILIO_API_BASE_URL', base_url)
+        servers.append(server)
+        return server
+
+    servers = []
+    monkeypatch.setenv('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN', 'test-token')
+    monkeypatch.setenv('TWILIO_WHATSAPP_FROM', '+10000000000')
+    monkeypatch.setenv('TWILIO_QUOTA_DB_PATH', str(tmp_path / 'quota.db'))
+    monkeypatch.setenv('TWILIO_DELIVERY_TRACKING', 'false')
+    monkeypatch.setenv('TWILIO_BREAKER_FAILURES', '1')
+    monkeypatch.setenv('TWILIO_THROTTLE_BACKOFF', '0.01')
+    yield configure
+    for server in servers:
+        server.shutdown()
+    reset_twilio_clients()
+
+
+def test_uninitialized_client_gives_the_quota_slot_back(twilio_env, monkeypatch):
+
+    twilio_env()
+    monkeypatch.delenv('TWILIO_AUTH_TOKEN')
+    sender = WhatsAppSender()
+
+    ok, _sid, error, retriable = sender.submit_twilio_message("hola", '+15550000001')
+
+    assert (ok, error, retriable) == (False, "Cliente de Twilio no inicializado", False)
+    assert sender.circuit_breaker.ledger.used() == 0
+
+
+def test_throttling_waits_for_retry_after_without_opening_the_breaker(twilio_env):
+
+    server = twilio_env(per_second=2)
+    sender = WhatsAppSender()
+
+    results = [sender.submit_twilio_message("hola", f"+1555000000{i}") for i in range(5)]
+
+    assert all(ok for ok, _sid, _error, _retriable in results)
+    assert server.throttled > 0
+    assert sender.circuit_breaker.status()['state'] == 'closed'
+    assert sender.circuit_breaker.ledger.used() == 5
+
+
+def test_persistent_throttling_is_retriable_and_not_a_breaker_failure(twilio_env, monkeypatch):
+
+    twilio_env(always_429=True)
+    monkeypatch.setenv('TWILIO_THROTTLE_RETRIES', '1')
+    sender = WhatsAppSender()
+
+    ok, _sid, _error, retriable = sender.submit_twilio_message("hola", '+15550000001')
+
+    assert not ok and retriable
+    status = sender.circuit_breaker.status()
+    assert (status['state'], status['failures'], status['used_24h']) == ('closed', 0, 0)
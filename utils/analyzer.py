@@ -1,7 +1,10 @@
+import hashlib
 import pandas as pd
 import numpy as np
 import logging
-from typing import Dict, Tuple, Any
+from typing import Dict, Tuple, Any, Optional, Union
+
+from utils.profiling import step
 
 logger = logging.getLogger(__name__)
 
@@ -143,15 +146,19 @@ class DataAnalyzer:
                 raise ValueError("Data validation failed.")
             logger.info("Iniciando análisis completo de datos.")
 
-            # Use keys expected by the visualizer
-            self.results = {
-                'sales_by_headquarter': self.calculate_sales_without_igv(),
-                'top_models': self.get_top_n_models(),
-                'sales_by_channel': self.analyze_sales_by_channel(),
-                'sales_by_segment': self.segment_sales_by_client(),
-                'summary_metrics': self.summarize_analysis(),
-                'monthly_sales_trend': self.analyze_temporal_trends()
-            }
+            # Use keys expected by the visualizer (each aggregation is a profiled sub-step)
+            aggregations = [
+                ('sales_by_headquarter', self.calculate_sales_without_igv),
+                ('top_models', self.get_top_n_models),
+                ('sales_by_channel', self.analyze_sales_by_channel),
+                ('sales_by_segment', self.segment_sales_by_client),
+                ('summary_metrics', self.summarize_analysis),
+                ('monthly_sales_trend', self.analyze_temporal_trends),
+            ]
+            self.results = {}
+            for key, aggregate in aggregations:
+                with step(aggregate.__name__):
+                    self.results[key] = aggregate()
 
             logger.info("Análisis completo de datos finalizado.")
             return self.results
@@ -160,6 +167,100 @@ class DataAnalyzer:
             logger.error(f"Error en el análisis completo de datos: {str(e)}")
             raise
     
+    # full_analysis for every value of `key` (e.g. per headquarter or segment). Every column is factorized
+    # once and aggregated on integer codes for all partitions together, so adding partitions only adds
+    # the cheap per-partition slicing; results match a full_analysis of each partition (ties included)
+
+    def partitioned_analysis(self, key: str = 'Headquarter') -> Dict[Any, Dict[str, Any]]:
+
+        if not self.validate_data():
+            raise ValueError("Data validation failed.")
+        if key not in self.df.columns:
+            raise KeyError(f"Columna de partición no encontrada: {key}")
+
+        with step('partition_aggregations'):
+            # rows with a missing key are dropped, like groupby does
+            part_codes, parts = pd.factorize(self.df[key], sort=True)
+            n_parts = len(parts)
+            rows = part_codes >= 0
+            price = self.df['Price_Without_IGV'].to_numpy(dtype=float)
+
+            # [partition x category] rows, sums of `weights` and first row (for value_counts tie order)
+            def table(column: Union[str, pd.Series], weights: Optional[np.ndarray] = None):
+                if isinstance(column, str) and column == key:
+                    codes, categories = part_codes, parts
+                else:
+                    codes, categories = pd.factorize(self.df[column] if isinstance(column, str) else column, sort=True)
+                mask = rows & (codes >= 0)
+                pair = part_codes[mask].astype(np.int64) * len(categories) + codes[mask]
+                shape = (n_parts, len(categories))
+                counts = np.bincount(pair, minlength=shape[0] * shape[1]).reshape(shape)
+                sums = None
+                if weights is not None:
+                    sums = np.bincount(pair, weights=np.nan_to_num(weights[mask]), minlength=counts.size).reshape(shape)
+                first = np.full(counts.size, len(part_codes), dtype=np.int64)
+                np.minimum.at(first, pair, np.flatnonzero(mask))
+                return categories, counts, sums, first.reshape(shape)
+
+            # one partition's row of a table as a Series; `order` sorts it like the single-frame aggregation
+            def series(categories, values, counts, first, i: int, name: str, order: Optional[str] = None) -> pd.Series:
+                present = np.flatnonzero(counts[i])
+                if order == 'desc':
+                    present = present[np.argsort(-values[i, present], kind='stable')]
+                elif order == 'count':
+                    present = present[np.lexsort((first[i, present], -values[i, present]))]
+                return pd.Series(values[i, present], index=categories[present].rename(name))
+
+            hq_cats, hq_counts, hq_sums, hq_first = table('Headquarter', price)
+            model_cats, model_counts, _, model_first = table('Model')
+            channel_cats, channel_counts, _, channel_first = table('Channel')
+            segment_cats, segment_counts, segment_sums, segment_first = table('Segment', price)
+
+            # same rules as analyze_temporal_trends: invalid dates are dropped
+            months = pd.to_datetime(self.df['Sell_Date'], errors='coerce').dt.to_period('M')
+            month_cats, month_counts, month_sums, month_first = table(months, price)
+
+            # summary metrics
+            valid = rows & ~np.isnan(price)
+            count = np.bincount(part_codes[rows], minlength=n_parts)
+            priced = np.bincount(part_codes[valid], minlength=n_parts)
+            totals = {column: np.bincount(part_codes[rows], minlength=n_parts,
+                                          weights=np.nan_to_num(self.df[column].to_numpy(dtype=float)[rows]))
+                      for column in ('Price_Without_IGV', 'Price_With_IGV', 'IGV')}
+            client_codes, clients = pd.factorize(self.df['Client_ID'])
+            client_rows = rows & (client_codes >= 0)
+            client_pairs = part_codes[client_rows].astype(np.int64) * max(1, len(clients)) + client_codes[client_rows]
+            if n_parts * len(clients) <= 50_000_000:
+                # dense (partition, client) table: no sort
+                seen = np.zeros(n_parts * max(1, len(clients)), dtype=bool)
+                seen[client_pairs] = True
+                unique_clients = seen.reshape(n_parts, -1).sum(axis=1)
+            else:
+                unique_clients = np.bincount(np.unique(client_pairs) // max(1, len(clients)), minlength=n_parts)
+            extremes = pd.Series(price[valid]).groupby(part_codes[valid]).agg(['max', 'min'])
+
+        partitions: Dict[Any, Dict[str, Any]] = {}
+        for i, part in enumerate(parts):
+            has_price = i in extremes.index
+            partitions[part] = {
+                'sales_by_headquarter': series(hq_cats, hq_sums, hq_counts, hq_first, i, 'Headquarter', 'desc'),
+                'top_models': series(model_cats, model_counts, model_counts, model_first, i, 'Model', 'count').head(5),
+                'sales_by_channel': series(channel_cats, channel_counts, channel_counts, channel_first, i, 'Channel', 'count'),
+                'sales_by_segment': series(segment_cats, segment_sums, segment_counts, segment_first, i, 'Segment'),
+                'summary_metrics': {
+                    'unique_clients': int(unique_clients[i]),
+                    'total_sales': int(count[i]),
+                    'total_sales_without_igv': float(totals['Price_Without_IGV'][i]),
+                    'total_sales_with_igv': float(totals['Price_With_IGV'][i]),
+                    'total_igv_collected': float(totals['IGV'][i]),
+                    'average_sales_without_igv': float(totals['Price_Without_IGV'][i] / priced[i]) if priced[i] else float('nan'),
+                    'max_sale_without_igv': float(extremes.at[i, 'max']) if has_price else float('nan'),
+                    'min_sale_without_igv': float(extremes.at[i, 'min']) if has_price else float('nan'),
+                },
+                'monthly_sales_trend': series(month_cats, month_sums, month_counts, month_first, i, 'Month'),
+            }
+        return partitions
+
     # get text summary
 
     def get_text_summary(self) -> str:
@@ -200,9 +301,143 @@ Análisis de los ultimos 12 Meses:
             logger.error(f"Error generando resumen de texto: {str(e)}")
             return "Error generando resumen de texto."
 
+
+class ChunkedAnalyzer:
+
+    """
+    full_analysis over a sequence of DataFrame chunks (streaming path of the
+    memory budget). add() folds each chunk into partial aggregates per key;
+    results() combines them into the same dict full_analysis returns, with
+    the same orderings (ties in counts keep first appearance). Memory grows
+    with the number of distinct keys and clients, not with the rows.
+    """
+
+    # partial aggregates are merged every COMPACT_EVERY chunks
+    COMPACT_EVERY = 32
+
+    # result key -> (key column, summed column or None for counts)
+    _GROUPED = {
+        'sales_by_headquarter': ('Headquarter', 'Price_Without_IGV'),
+        'top_models': ('Model', None),
+        'sales_by_channel': ('Channel', None),
+        'sales_by_segment': ('Segment', 'Price_Without_IGV'),
+    }
+
+    def __init__(self):
+
+        self.rows = 0
+        self._parts: Dict[str, list] = {key: [] for key in list(self._GROUPED) + ['monthly_sales_trend']}
+        self._clients: set = set()
+        self._totals = {'Price_Without_IGV': 0.0, 'Price_With_IGV': 0.0, 'IGV': 0.0}
+        self._priced = 0
+        self._max: Optional[float] = None
+        self._min: Optional[float] = None
+
+    # counts keep first-appearance order (sort=False) so ties rank as in value_counts
+
+    def _merge(self, key: str) -> pd.Series:
+
+        counts = key in self._GROUPED and self._GROUPED[key][1] is None
+        return pd.concat(self._parts[key]).groupby(level=0, sort=not counts).sum()
+
+    def add(self, chunk: pd.DataFrame):
+
+        with step('chunk_aggregate'):
+            self.rows += len(chunk)
+            for key, (column, value) in self._GROUPED.items():
+                if value is None:
+                    self._parts[key].append(chunk[column].value_counts(sort=False))
+                else:
+                    self._parts[key].append(chunk.groupby(column)[value].sum())
+
+            dates = pd.to_datetime(chunk['Sell_Date'], errors='coerce')
+            valid = dates.notna()
+            if valid.any():
+                months = dates[valid].dt.to_period('M').rename('Month')
+                self._parts['monthly_sales_trend'].append(chunk.loc[valid, 'Price_Without_IGV'].groupby(months).sum())
+
+            self._clients.update(chunk['Client_ID'].dropna().unique())
+            for column in self._totals:
+                self._totals[column] += chunk[column].sum()
+            prices = chunk['Price_Without_IGV']
+            self._priced += int(prices.count())
+            if self._priced:
+                high, low = prices.max(), prices.min()
+                self._max = high if self._max is None or high > self._max else self._max
+                self._min = low if self._min is None or low < self._min else self._min
+
+            if len(self._parts['top_models']) >= self.COMPACT_EVERY:
+                for key, parts in self._parts.items():
+                    if parts:
+                        self._parts[key] = [self._merge(key)]
+
+    def results(self) -> Dict[str, Any]:
+
+        if not self.rows:
+            logger.error("DataFrame is empty.")
+            raise ValueError("Data validation failed.")
+
+        merged = {key: self._merge(key) for key, parts in self._parts.items() if parts}
+        monthly = merged.get('monthly_sales_trend')
+        if monthly is None:
+            logger.warning("No hay fechas válidas en 'Sell_Date' para analizar tendencias temporales.")
+            monthly = pd.Series(dtype=float)
+
+        results = {
+            'sales_by_headquarter': merged['sales_by_headquarter'].sort_values(ascending=False),
+            'top_models': merged['top_models'].sort_values(ascending=False, kind='stable').head(5),
+            'sales_by_channel': merged['sales_by_channel'].sort_values(ascending=False, kind='stable'),
+            'sales_by_segment': merged['sales_by_segment'],
+            'summary_metrics': {
+                'unique_clients': len(self._clients),
+                'total_sales': self.rows,
+                'total_sales_without_igv': self._totals['Price_Without_IGV'],
+                'total_sales_with_igv': self._totals['Price_With_IGV'],
+                'total_igv_collected': self._totals['IGV'],
+                'average_sales_without_igv': self._totals['Price_Without_IGV'] / self._priced if self._priced else np.nan,
+                'max_sale_without_igv': self._max if self._max is not None else np.nan,
+                'min_sale_without_igv': self._min if self._min is not None else np.nan,
+            },
+            'monthly_sales_trend': monthly,
+        }
+        logger.info("Análisis por bloques finalizado: %d filas.", self.rows)
+        return results
+
 # aux function for direct use
 
 def analyze_data(df: pd.DataFrame) -> Dict[str, Any]:
 
     analyzer = DataAnalyzer(df)
-    return analyzer.full_analysis()
\ No newline at end of file
+    return analyzer.full_analysis()
+
+# full_analysis results from an iterable of chunks (ExcelChunks, or slices of a loaded frame)
+
+def analyze_in_chunks(chunks) -> Dict[str, Any]:
+
+    analyzer = ChunkedAnalyzer()
+    for chunk in chunks:
+        analyzer.add(chunk)
+    return analyzer.results()
+
+# one results dict per partition value (e.g. one per headquarter), same keys as full_analysis
+
+def analyze_partitions(df: pd.DataFrame, key: str = 'Headquarter') -> Dict[Any, Dict[str, Any]]:
+
+    partitions = DataAnalyzer(df).partitioned_analysis(key)
+    logger.info("Análisis por partición '%s' completado: %d particiones.", key, len(partitions))
+    return partitions
+
+# content hash of a results dict (same data -> same fingerprint), to reuse renders and skip unchanged reports
+
+def results_fingerprint(results: Dict[str, Any]) -> str:
+
+    digest = hashlib.sha256()
+    for key in sorted(results):
+        value = results[key]
+        digest.update(key.encode('utf-8'))
+        if isinstance(value, pd.Series):
+            digest.update(repr(list(value.index.astype(str))).encode('utf-8'))
+            digest.update(np.asarray(value.values, dtype=float).tobytes())
+        else:
+            digest.update(repr(sorted((k, float(v)) for k, v in value.items())).encode('utf-8'))
+    return digest.hexdigest()
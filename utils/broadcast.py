@@ -0,0 +1,136 @@
+import os
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# read recipients from WHATSAPP_RECIPIENTS (comma separated numbers) and/or WHATSAPP_RECIPIENTS_FILE
+# (one per line: "number[,headquarter[,name]]"); returns [{'number', 'headquarter', 'name'}, ...]
+
+def load_recipient_records() -> List[Dict[str, Optional[str]]]:
+
+    records: Dict[str, Dict[str, Optional[str]]] = {}
+    env_list = os.getenv('WHATSAPP_RECIPIENTS', '')
+    for number in (r.strip() for r in env_list.split(',')):
+        if number:
+            records.setdefault(number, {'number': number, 'headquarter': None, 'name': None})
+
+    path = os.getenv('WHATSAPP_RECIPIENTS_FILE', '').strip()
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                fields = [field.strip() or None for field in line.strip().split(',')] + [None, None]
+                records[fields[0]] = {'number': fields[0], 'headquarter': fields[1], 'name': fields[2]}
+
+    # keep order, drop duplicates
+    return list(records.values())
+
+def load_recipients() -> List[str]:
+
+    return [record['number'] for record in load_recipient_records()]
+
+
+class Broadcaster:
+
+    # send one message to many recipients concurrently under a shared messages-per-second limit
+
+    def __init__(self, sender, rate: Optional[float] = None, concurrency: Optional[int] = None,
+                 max_retries: Optional[int] = None, backoff: Optional[float] = None, burst: Optional[float] = None):
+
+        self.sender = sender
+        self.rate = rate if rate is not None else float(os.getenv('WHATSAPP_RATE_PER_SECOND', '1'))
+        self.concurrency = concurrency if concurrency is not None else int(os.getenv('WHATSAPP_BROADCAST_CONCURRENCY', '8'))
+        self.max_retries = max_retries if max_retries is not None else sender.config['max_retries']
+        self.backoff = backoff if backoff is not None else float(sender.config['wait_time'])
+        # sends allowed back to back before the rate applies; a full bucket of `rate` tokens
+        # would let the first second carry twice the limit
+        self.burst = burst if burst is not None else float(os.getenv('WHATSAPP_BURST', '1'))
+        self.bucket = TokenBucket(self.rate, capacity=max(1.0, self.burst))
+        self._abort = threading.Event()
+
+    # send to one recipient with its own retry state
+
+    def _send_one(self, recipient: str, parts: List[str], media_urls: Optional[List[str]]) -> Dict[str, Any]:
+
+        outcome: Dict[str, Any] = {'recipient': recipient, 'ok': False, 'status': 'failed',
+                                   'sid': None, 'attempts': 0, 'error': None, 'seconds': 0.0}
+        start = time.perf_counter()
+        # parts of a long body go in order; media rides on the first one
+        for index, part in enumerate(parts):
+            outcome['ok'] = False
+            self._send_part(outcome, part, media_urls if index == 0 else None)
+            if not outcome['ok']:
+                break
+        outcome['seconds'] = round(time.perf_counter() - start, 3)
+        return outcome
+
+    # one body part with its own retry loop; updates outcome in place
+
+    def _send_part(self, outcome: Dict[str, Any], message: str, media_urls: Optional[List[str]]):
+
+        from utils.whatsapp_sender import TwilioCircuitOpen, TwilioDailyLimitExceeded
+
+        recipient = outcome['recipient']
+        outcome.update(status='failed', error=None)
+        for attempt in range(max(1, self.max_retries)):
+            if self._abort.is_set():
+                outcome['status'] = 'aborted'
+                break
+            # every attempt (retries included) consumes a token of the shared rate
+            if not self.bucket.acquire(cancel=self._abort):
+                outcome['status'] = 'aborted'
+                break
+
+            outcome['attempts'] += 1
+            try:
+                ok, sid, error, retriable = self.sender.submit_twilio_message(message, recipient, media_urls)
+            except TwilioDailyLimitExceeded as e:
+                # account-wide limit: stop every pending recipient
+                self._abort.set()
+                outcome.update(status='circuit_open' if isinstance(e, TwilioCircuitOpen) else 'daily_limit', error=str(e))
+                break
+
+            if ok:
+                outcome.update(ok=True, status='sent', sid=sid, error=None)
+                break
+            outcome['error'] = error
+            if not retriable or attempt == self.max_retries - 1:
+                break
+            # exponential backoff with full jitter, per recipient
+            if self._abort.wait(random.uniform(0, self.backoff * (2 ** attempt))):
+                outcome['status'] = 'aborted'
+                break
+
+    def send(self, message: Optional[str], recipients: List[str], media_urls: Optional[List[str]] = None,
+             bodies: Optional[List[List[str]]] = None) -> Dict[str, Any]:
+        """
+        Send `message` to every recipient, or bodies[i] (pre-split parts) to recipients[i].
+        Returns {'outcomes': [per-recipient dicts in input order], 'summary': {...}}.
+        """
+        from utils.message_templates import split_message
+
+        if bodies is None:
+            bodies = [split_message(message)] * len(recipients)
+        start = time.perf_counter()
+        self._abort.clear()
+        workers = max(1, min(self.concurrency, len(recipients) or 1))
+        logger.info(f"Difusión a {len(recipients)} destinatarios ({workers} hilos, {self.rate:g} msg/s).")
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='broadcast') as pool:
+            outcomes = list(pool.map(lambda r, parts: self._send_one(r, parts, media_urls), recipients, bodies))
+
+        elapsed = time.perf_counter() - start
+        summary: Dict[str, Any] = {'recipients': len(recipients), 'seconds': round(elapsed, 3)}
+        for outcome in outcomes:
+            summary[outcome['status']] = summary.get(outcome['status'], 0) + 1
+        summary['attempts'] = sum(o['attempts'] for o in outcomes)
+        logger.info(f"Difusión completada: {summary}")
+        return {'outcomes': outcomes, 'summary': summary}
@@ -0,0 +1,123 @@
+"""
+Stage checkpoints (opt-in).
+
+In runs started with --checkpoint (or PIPELINE_CHECKPOINTS=true), --resume or
+--from-stage, the outputs of every checkpointed pipeline stage that succeeds
+are pickled to outputs/checkpoints/<stage>.pkl together with the fingerprint
+of the run inputs (workbook contents + options that change the outputs).
+Other runs neither hash the inputs nor write anything. A later run started
+with --resume or --from-stage restores those outputs instead of running the
+stage again, as long as:
+
+  - the input fingerprint is the same;
+  - the files the outputs point to (graph folder, PDF) were not modified;
+  - every checkpointed stage it depends on was restored too.
+
+Checkpoints are local, trusted files (pickle); PIPELINE_CHECKPOINT_DIR moves
+them.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_DIR = os.path.join('outputs', 'checkpoints')
+
+# PIPELINE_CHECKPOINTS=true: write checkpoints in every run (default: only when asked on the command line)
+
+def checkpoints_requested() -> bool:
+
+    return os.getenv('PIPELINE_CHECKPOINTS', 'false').strip().lower() in {'1', 'true', 'yes', 'y'}
+
+# fingerprint of the run inputs: file contents plus the options that change stage outputs
+
+def input_fingerprint(paths: Iterable[str], **options) -> str:
+
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.abspath(path).encode('utf-8'))
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        except FileNotFoundError:
+            digest.update(b'<missing>')
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+# (mtime_ns, size) of the paths among `outputs` (string values that exist on disk)
+
+def _file_signatures(outputs: Dict[str, Any]) -> Dict[str, Any]:
+
+    signatures = {}
+    for value in outputs.values():
+        if isinstance(value, str) and os.path.exists(value):
+            stat = os.stat(value)
+            signatures[os.path.abspath(value)] = [stat.st_mtime_ns, stat.st_size]
+    return signatures
+
+
+class CheckpointStore:
+
+    # one pickle per stage, valid only for the input fingerprint `key`
+
+    def __init__(self, key: str, root: Optional[str] = None, enabled: bool = True):
+
+        self.key = key
+        self.root = root or os.getenv('PIPELINE_CHECKPOINT_DIR', '').strip() or DEFAULT_CHECKPOINT_DIR
+        self.enabled = enabled
+
+    def _path(self, stage: str) -> str:
+
+        return os.path.join(self.root, f"{stage}.pkl")
+
+    def save(self, stage: str, outputs: Dict[str, Any]):
+
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        record = {'key': self.key, 'stage': stage, 'created_at': datetime.now().isoformat(timespec='seconds'),
+                  'files': _file_signatures(outputs), 'outputs': outputs}
+        path = self._path(stage)
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # an output that cannot be pickled only means this stage is not resumable
+            logger.warning(f"No se pudo guardar el checkpoint de '{stage}': {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # outputs of `stage`, or None if there is no valid checkpoint
+
+    def load(self, stage: str) -> Optional[Dict[str, Any]]:
+
+        try:
+            with open(self._path(stage), 'rb') as f:
+                record = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Checkpoint ilegible de '{stage}': {e}")
+            return None
+        if record.get('key') != self.key:
+            logger.info(f"Checkpoint de '{stage}' corresponde a otras entradas; se ejecuta la etapa.")
+            return None
+        for path, signature in record.get('files', {}).items():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                logger.info(f"Checkpoint de '{stage}': falta {path}; se ejecuta la etapa.")
+                return None
+            if [stat.st_mtime_ns, stat.st_size] != signature:
+                logger.info(f"Checkpoint de '{stage}': {path} cambió; se ejecuta la etapa.")
+                return None
+        return record['outputs']
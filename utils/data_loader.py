@@ -1,10 +1,15 @@
 import pandas as pd
+import numpy as np
+import io
 import os
 import logging
+from typing import Any, Callable, Iterator, List, Optional
 
-# config logging
+from utils.log_setup import diagnostics_enabled
+from utils.profiling import step
+
+# handlers are configured by the application (utils/log_setup.py), not on import
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def load_excel_data(file_path: str, sheet_name= 0):
@@ -20,11 +25,12 @@ def load_excel_data(file_path: str, sheet_name= 0):
         if not file_path.endswith(('.xlsx', '.xls')):
             raise ValueError("El archivo proporcionado no es un archivo de Excel válido.")
         
-        logger.info(f"Cargando datos desde el archivo: {file_path}, hoja: {sheet_name}")
+        logger.info("Cargando datos desde el archivo: %s, hoja: %s", file_path, sheet_name)
         
         # load excel file
 
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        with step('read_excel'):
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
 
         # basic validation
 
@@ -32,23 +38,24 @@ def load_excel_data(file_path: str, sheet_name= 0):
             logger.warning("El archivo de Excel está vacío.")
             return df
         
-        logger.info(f"Datos cargados exitosamente")
-        logger.info(f"Dimensiones: {df.shape[0]} filas y {df.shape[1]} columnas")
-        logger.info(f"Columnas: {list(df.columns)}")
+        logger.info("Datos cargados exitosamente")
+        logger.info("Dimensiones: %d filas y %d columnas", df.shape[0], df.shape[1])
+        logger.info("Columnas: %s", ", ".join(map(str, df.columns)))
 
-        # show basic info
+        # show basic info (describe() is a full extra scan: only with LOG_DIAGNOSTICS or DEBUG)
 
-        logger.info("\n" + "="*50)
-        logger.info("Información del DataFrame:")
-        logger.info("" + "="*50)
-        logger.info(f"\n{df.info()}")
-        logger.info(f"\nPrimeras 5 filas:\n{df.head()}")
-        logger.info(f"\nEstadísticas descriptivas:\n{df.describe()}")
+        if diagnostics_enabled(logger):
+            with step('diagnostics'):
+                info = io.StringIO()
+                df.info(buf=info)
+                logger.info("Información del DataFrame:\n%s", info.getvalue())
+                logger.info("Primeras 5 filas:\n%s", df.head().to_string())
+                logger.info("Estadísticas descriptivas:\n%s", df.describe().to_string())
 
         return df
     
     except Exception as e:
-        logger.error(f"Error al cargar el archivo de Excel: {e}")
+        logger.error("Error al cargar el archivo de Excel: %s", e)
         raise
 
 # validate data structure
@@ -74,7 +81,7 @@ def validate_data_structure(df, required_columns= None):
     if missing_cols:
         validation_result['is_valid'] = False
         validation_result['missing_columns'] = missing_cols
-        logger.error(f"Columnas faltantes: {missing_cols}")
+        logger.error("Columnas faltantes: %s", missing_cols)
 
     # verify if dataframe is empty
 
@@ -83,29 +90,32 @@ def validate_data_structure(df, required_columns= None):
         validation_result['empty_data'] = True
         logger.error("El DataFrame está vacío.")
 
+    _record_row_checks(validation_result, df.duplicated().sum(), df.isnull().sum())
+    return validation_result
+
+# duplicate and null checks shared by the in-memory and the chunked validation
+
+def _record_row_checks(validation_result, duplicates, null_counts):
+
     # count duplicate rows
 
-    duplicates = df.duplicated().sum()
     validation_result['duplicate_rows'] = duplicates
     if duplicates > 0:
         validation_result['is_valid'] = False
-        logger.warning(f"Número de filas duplicadas: {duplicates}")
+        logger.warning("Número de filas duplicadas: %d", duplicates)
 
     # verify null values in each column
-    null_counts = df.isnull().sum()
     for col, null_count in null_counts.items():
         if null_count > 0:
             validation_result['is_valid'] = False
             validation_result['null_values'][col] = null_count
-            logger.warning(f"Columna '{col}' tiene {null_count} valores nulos.")
+            logger.warning("Columna '%s' tiene %d valores nulos.", col, null_count)
 
     if validation_result['is_valid']:
         logger.info("El DataFrame ha pasado todas las validaciones.")
     else:
         logger.info("El DataFrame no ha pasado las validaciones.")
 
-    return validation_result
-
 # main load function
 
 def load_and_validate_data(file_path):
@@ -114,10 +124,141 @@ def load_and_validate_data(file_path):
         # 1. load excel data
         df = load_excel_data(file_path)
         # 2. validate data structure
-        validation_report = validate_data_structure(df)
+        with step('validate_data_structure'):
+            validation_report = validate_data_structure(df)
         # 3. return results
         return df, validation_report
     
     except Exception as e:
-        logger.error(f"Error en la carga y validación de datos: {e}")
-        return None, {'is_valid': False, 'error': str(e)}
\ No newline at end of file
+        logger.error("Error en la carga y validación de datos: %s", e)
+        return None, {'is_valid': False, 'error': str(e)}
+
+# rows of one sheet as DataFrames of at most `chunk_rows` rows (openpyxl read-only: the
+# workbook is never held in memory as a whole)
+
+def iter_excel_chunks(file_path: str, chunk_rows: int, sheet_name=0) -> Iterator[pd.DataFrame]:
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # same names pandas gives to empty header cells
+        columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+        chunk: List[tuple] = []
+        for row in rows:
+            # blank lines are skipped, as pd.read_excel does
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+class ExcelChunks:
+
+    """
+    Chunked view of a workbook sheet, used in place of the DataFrame when the
+    workbook does not fit the memory budget. Iterating reads the sheet again;
+    `rows` and `columns` are known after load_and_validate_chunks, and
+    `aggregates` holds the analysis computed during that same pass (if any).
+    """
+
+    def __init__(self, file_path: str, chunk_rows: int, sheet_name=0):
+
+        self.file_path = file_path
+        self.chunk_rows = chunk_rows
+        self.sheet_name = sheet_name
+        self.rows = 0
+        self.columns: List[str] = []
+        self.aggregates: Optional[Any] = None
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+
+        return iter_excel_chunks(self.file_path, self.chunk_rows, self.sheet_name)
+
+    def __len__(self) -> int:
+
+        return self.rows
+
+# row hashes comparable across chunks (a numeric column may be int in one chunk and float in another)
+
+def _row_hashes(chunk: pd.DataFrame) -> np.ndarray:
+
+    normalized = chunk.copy()
+    for col in normalized.columns:
+        if pd.api.types.is_numeric_dtype(normalized[col]) and not pd.api.types.is_bool_dtype(normalized[col]):
+            normalized[col] = normalized[col].astype('float64')
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+# streaming counterpart of load_and_validate_data: one pass over the sheet validates it and
+# hands every chunk to `on_chunk` (e.g. ChunkedAnalyzer.add)
+
+def load_and_validate_chunks(file_path: str, chunk_rows: int, on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+                             required_columns=None):
+
+    if required_columns is None:
+        required_columns = ['Sell_Date', 'Headquarter', 'Model', 'Channel',
+                            'Segment', 'Client_ID', 'Price_Without_IGV',
+                            'IGV', 'Price_With_IGV']
+
+    validation_result = {
+        'is_valid': True,
+        'missing_columns': [],
+        'empty_data': False,
+        'duplicate_rows': 0,
+        'null_values': {}
+    }
+
+    try:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
+        logger.info("Cargando datos por bloques de %d filas desde: %s", chunk_rows, file_path)
+
+        chunks = ExcelChunks(file_path, chunk_rows)
+        hashes: List[np.ndarray] = []
+        null_counts: Optional[pd.Series] = None
+        with step('read_excel_chunks'):
+            for chunk in chunks:
+                if not chunks.columns:
+                    chunks.columns = list(chunk.columns)
+                    missing_cols = [col for col in required_columns if col not in chunk.columns]
+                    if missing_cols:
+                        validation_result['is_valid'] = False
+                        validation_result['missing_columns'] = missing_cols
+                        logger.error("Columnas faltantes: %s", missing_cols)
+                        # nothing downstream can use a sheet without the required columns
+                        break
+                chunks.rows += len(chunk)
+                hashes.append(_row_hashes(chunk))
+                counts = chunk.isnull().sum()
+                null_counts = counts if null_counts is None else null_counts.add(counts, fill_value=0)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+
+        if chunks.rows == 0 and not validation_result['missing_columns']:
+            validation_result['is_valid'] = False
+            validation_result['empty_data'] = True
+            logger.error("El DataFrame está vacío.")
+
+        with step('validate_data_structure'):
+            all_hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+            duplicates = int(len(all_hashes) - len(np.unique(all_hashes)))
+            null_counts = null_counts.astype('int64') if null_counts is not None else pd.Series(dtype='int64')
+            _record_row_checks(validation_result, duplicates, null_counts)
+
+        logger.info("Datos cargados por bloques: %d filas y %d columnas", chunks.rows, len(chunks.columns))
+        return chunks, validation_result
+
+    except Exception as e:
+        logger.error("Error en la carga y validación por bloques: %s", e)
+        return None, {'is_valid': False, 'error': str(e)}
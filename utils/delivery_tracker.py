@@ -0,0 +1,294 @@
+"""
+Delivery status tracking for Twilio messages, out of the send path.
+
+Sends only record the message SID. Final states are reconciled later, either
+by a background poller that pages through the Messages list API in batches,
+or by a local webhook receiving Twilio status callbacks. The resident modes
+(main.py --daemon / --watch) run the poller in a background thread; a single
+run exits right after sending, so reconcile from cron or a separate process.
+
+Usage:
+    python -m utils.delivery_tracker poll            # reconcile pending messages once
+    python -m utils.delivery_tracker poll --loop     # keep reconciling every DELIVERY_POLL_INTERVAL s
+    python -m utils.delivery_tracker serve --port 8090  # status-callback receiver
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join('outputs', 'delivery_status.db')
+
+# states after which Twilio will not update the message anymore ('expired' is ours: never reported)
+FINAL_STATUSES = {'delivered', 'read', 'undelivered', 'failed', 'canceled', 'expired'}
+
+# pending messages older than this are closed as 'expired'
+MAX_TRACKING_AGE = timedelta(hours=24)
+
+
+class DeliveryStore:
+
+    # SQLite table of sent messages and their latest known status
+
+    def __init__(self, path: Optional[str] = None):
+
+        self.path = path or os.getenv('DELIVERY_DB_PATH', '').strip() or DEFAULT_DB_PATH
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS deliveries (
+                    sid TEXT PRIMARY KEY,
+                    recipient TEXT,
+                    status TEXT,
+                    error_code INTEGER,
+                    sent_at TEXT,
+                    updated_at TEXT,
+                    final INTEGER DEFAULT 0
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_deliveries_final ON deliveries(final, sent_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+
+        # one short-lived connection per operation: safe from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def record_sent(self, sid: str, recipient: str, status: str):
+
+        now = datetime.now(timezone.utc).isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO deliveries (sid, recipient, status, sent_at, updated_at, final) VALUES (?, ?, ?, ?, ?, ?)",
+                (sid, recipient, status, now, now, int(status in FINAL_STATUSES)))
+
+    def update_status(self, sid: str, status: str, error_code: Optional[int] = None) -> bool:
+
+        now = datetime.now(timezone.utc).isoformat()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE deliveries SET status = ?, error_code = ?, updated_at = ?, final = ? WHERE sid = ? AND final = 0",
+                (status, error_code, now, int(status in FINAL_STATUSES), sid))
+            return cur.rowcount > 0
+
+    def pending(self, limit: int = 500) -> List[Dict[str, Any]]:
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT sid, recipient, status, sent_at FROM deliveries WHERE final = 0 ORDER BY sent_at LIMIT ?",
+                (limit,)).fetchall()
+        return [{'sid': r[0], 'recipient': r[1], 'status': r[2], 'sent_at': r[3]} for r in rows]
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT sid, recipient, status, error_code, final FROM deliveries WHERE sid = ?", (sid,)).fetchone()
+        if not row:
+            return None
+        return {'sid': row[0], 'recipient': row[1], 'status': row[2], 'error_code': row[3], 'final': bool(row[4])}
+
+    def summary(self) -> Dict[str, int]:
+
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM deliveries GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class DeliveryPoller:
+
+    # background thread that reconciles pending statuses in batches via the paged Messages list API
+
+    def __init__(self, client, store: DeliveryStore, interval: float = 15.0, page_size: int = 100):
+
+        self.client = client
+        self.store = store
+        self.interval = interval
+        self.page_size = page_size
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # one reconciliation pass, returns the number of updated messages
+
+    def run_once(self) -> int:
+
+        pending = self.store.pending()
+        if not pending:
+            return 0
+
+        # close everything past the tracking window, seen by Twilio or not: a message stuck in
+        # queued/sent must not stay pending and keep the listing window growing
+        now = datetime.now(timezone.utc)
+        live = []
+        for item in pending:
+            if now - datetime.fromisoformat(item['sent_at']) > MAX_TRACKING_AGE:
+                self.store.update_status(item['sid'], 'expired')
+            else:
+                live.append(item)
+        if len(live) < len(pending):
+            logger.info(f"Mensajes sin estado final tras {MAX_TRACKING_AGE}: {len(pending) - len(live)} marcados como 'expired'.")
+        if not live:
+            return 0
+
+        by_sid = {p['sid']: p for p in live}
+        oldest = min(datetime.fromisoformat(p['sent_at']) for p in live)
+        updated = 0
+
+        # page through messages sent since the oldest pending one (a few requests instead of one per SID)
+        for message in self.client.messages.stream(date_sent_after=oldest - timedelta(minutes=5), page_size=self.page_size):
+            if message.sid in by_sid and message.status != by_sid[message.sid]['status']:
+                if self.store.update_status(message.sid, message.status, message.error_code):
+                    updated += 1
+                by_sid.pop(message.sid)
+            elif message.sid in by_sid:
+                by_sid.pop(message.sid)
+            if not by_sid:
+                break
+
+        if updated:
+            logger.info(f"Estados de entrega actualizados: {updated}")
+        return updated
+
+    def _loop(self):
+
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"Error reconciliando estados de entrega: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='delivery-poller')
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+# aux function for direct use: background poller for a real (non-simulated) sender, None if tracking is off
+
+def start_delivery_poller(sender, simulate: Optional[bool] = None, interval: Optional[float] = None) -> Optional[DeliveryPoller]:
+
+    if simulate is None:
+        simulate = bool(sender.config.get('simulate'))
+    if simulate or not sender.config['delivery_tracking']:
+        return None
+    sender.warm_up(simulate)
+    if not sender.twilio_client:
+        return None
+    interval = interval if interval is not None else float(os.getenv('DELIVERY_POLL_INTERVAL', '60'))
+    poller = DeliveryPoller(sender.twilio_client, DeliveryStore(), interval=interval)
+    poller.start()
+    logger.info(f"Conciliación de estados de entrega en segundo plano cada {interval:g} s.")
+    return poller
+
+
+class StatusCallbackHandler(BaseHTTPRequestHandler):
+
+    # receives Twilio status callbacks (application/x-www-form-urlencoded POST)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_POST(self):
+
+        length = int(self.headers.get('Content-Length') or 0)
+        params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+
+        validator = self.server.validator
+        if validator is not None:
+            url = self.server.public_url or f"http://{self.headers.get('Host')}{self.path}"
+            if not validator.validate(url, params, self.headers.get('X-Twilio-Signature', '')):
+                self.send_response(403)
+                self.end_headers()
+                return
+
+        sid = params.get('MessageSid')
+        status = params.get('MessageStatus')
+        if sid and status:
+            error_code = params.get('ErrorCode')
+            self.server.store.update_status(sid, status, int(error_code) if error_code else None)
+        self.send_response(204)
+        self.end_headers()
+
+# start the status-callback receiver in a background thread
+
+def serve_status_callbacks(store: DeliveryStore, host: str = '0.0.0.0', port: int = 8090,
+                           auth_token: Optional[str] = None, public_url: Optional[str] = None) -> ThreadingHTTPServer:
+
+    server = ThreadingHTTPServer((host, port), StatusCallbackHandler)
+    server.daemon_threads = True
+    server.store = store
+    server.public_url = public_url
+    server.validator = None
+    if auth_token:
+        from twilio.request_validator import RequestValidator
+        server.validator = RequestValidator(auth_token)
+    threading.Thread(target=server.serve_forever, daemon=True, name='status-callbacks').start()
+    logger.info(f"Receptor de status callbacks escuchando en http://{host}:{server.server_address[1]}/")
+    return server
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Seguimiento de estados de entrega de Twilio")
+    sub = parser.add_subparsers(dest='command', required=True)
+    poll = sub.add_parser('poll', help="Reconciliar mensajes pendientes una vez")
+    poll.add_argument('--loop', action='store_true', help="Seguir conciliando cada DELIVERY_POLL_INTERVAL s")
+    serve = sub.add_parser('serve', help="Receptor de status callbacks")
+    serve.add_argument('--port', type=int, default=int(os.getenv('TWILIO_STATUS_CALLBACK_PORT', '8090')))
+    sub.add_parser('summary', help="Resumen de estados registrados")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        if os.path.exists('whatsapp_config.env'):
+            load_dotenv('whatsapp_config.env', override=True)
+    except ImportError:
+        pass
+
+    store = DeliveryStore()
+    if args.command == 'summary':
+        print(store.summary())
+    elif args.command == 'poll':
+        from utils.whatsapp_sender import get_whatsapp_sender
+        sender = get_whatsapp_sender()
+        sender._initialize_twilio_client()
+        if not sender.twilio_client:
+            raise SystemExit("Cliente de Twilio no configurado.")
+        poller = DeliveryPoller(sender.twilio_client, store, interval=float(os.getenv('DELIVERY_POLL_INTERVAL', '60')))
+        if not args.loop:
+            poller.run_once()
+            print(store.summary())
+            return
+        poller.start()
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            poller.stop()
+    else:
+        validate = os.getenv('TWILIO_STATUS_CALLBACK_VALIDATE', 'true').strip().lower() in {'1', 'true', 'yes', 'y'}
+        server = serve_status_callbacks(store, port=args.port,
+                                        auth_token=os.getenv('TWILIO_AUTH_TOKEN') if validate else None,
+                                        public_url=os.getenv('TWILIO_STATUS_CALLBACK_URL') or None)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+
+if __name__ == "__main__":
+    main()
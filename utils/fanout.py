@@ -0,0 +1,143 @@
+"""
+Single-load report fan-out (one report per tenant).
+
+The workbook is loaded and aggregated once; the results are partitioned by a
+column (REPORT_FANOUT_KEY / --fanout, e.g. Headquarter or Segment) and every
+partition that has recipients gets its own message, chart set and broadcast.
+Only the per-tenant steps (slicing the aggregates, rendering, sending) grow
+with the number of tenants.
+
+Routing table (REPORT_ROUTING_FILE), one route per line:
+
+    # partition,number[,name]
+    Lima,+51999000111,Ana
+    Lima,+51999000222
+    Corporativo,+51999000333,Luis
+
+Partition names are matched case-insensitively. Without a routing table,
+the recipients of WHATSAPP_RECIPIENTS_FILE are routed by their headquarter
+column when partitioning by Headquarter.
+"""
+
+import os
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FANOUT_KEY = 'Headquarter'
+
+def fanout_key(value: Optional[str] = None) -> str:
+
+    return (value or os.getenv('REPORT_FANOUT_KEY', '') or DEFAULT_FANOUT_KEY).strip()
+
+# {partition (casefolded): [{'number', 'name', 'headquarter'}, ...]}
+
+def load_routing_table(key: str = DEFAULT_FANOUT_KEY, path: Optional[str] = None) -> Dict[str, List[Dict[str, Optional[str]]]]:
+
+    path = path or os.getenv('REPORT_ROUTING_FILE', '').strip()
+    routes: Dict[str, Dict[str, Dict[str, Optional[str]]]] = {}
+
+    def add(partition: str, number: str, name: Optional[str]):
+        # partitioning by headquarter: the tenant's row is highlighted in its own report
+        headquarter = partition if key == 'Headquarter' else None
+        routes.setdefault(partition.casefold(), {})[number] = {'number': number, 'name': name, 'headquarter': headquarter}
+
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                fields = [field.strip() or None for field in line.strip().split(',')] + [None]
+                if not fields[0] or not fields[1]:
+                    logger.warning(f"Ruta inválida en {path}: {line.strip()}")
+                    continue
+                add(fields[0], fields[1], fields[2])
+    elif key == 'Headquarter':
+        from utils.broadcast import load_recipient_records
+
+        for record in load_recipient_records():
+            if record['headquarter']:
+                add(record['headquarter'], record['number'], record['name'])
+
+    # keep order, drop duplicate numbers per partition
+    return {partition: list(recipients.values()) for partition, recipients in routes.items()}
+
+# [(partition, recipients)] in partition order, plus the partitions nobody receives
+
+def route_partitions(partitions: Dict[Any, Dict[str, Any]], routing: Dict[str, List[Dict[str, Optional[str]]]]
+                     ) -> Tuple[List[Tuple[Any, List[Dict[str, Optional[str]]]]], List[Any]]:
+
+    routed, unrouted = [], []
+    for partition in partitions:
+        recipients = routing.get(str(partition).casefold())
+        if recipients:
+            routed.append((partition, recipients))
+        else:
+            unrouted.append(partition)
+    known = {str(p).casefold() for p in partitions}
+    for name in routing:
+        if name not in known:
+            logger.warning(f"La ruta '{name}' no corresponde a ninguna partición de los datos.")
+    return routed, unrouted
+
+
+class ReportFanout:
+
+    """
+    Deliver one report per routed partition. Tenants are sent one after the
+    other (each broadcast already runs concurrently under the account-wide
+    WHATSAPP_RATE_PER_SECOND), so the total rate never exceeds the limit.
+    """
+
+    def __init__(self, sender, routing: Dict[str, List[Dict[str, Optional[str]]]], key: str = DEFAULT_FANOUT_KEY):
+
+        self.sender = sender
+        self.routing = routing
+        self.key = key
+
+    def send(self, partitions: Dict[Any, Dict[str, Any]], manifest: Optional[Dict[str, Dict[str, Any]]] = None,
+             simulate: Optional[bool] = None, include_graphs: bool = True) -> Dict[str, Any]:
+        """
+        `manifest` is the 'partitions' entry of generate_partitioned_visualizations.
+        Returns {'tenants': {partition: broadcast report}, 'summary': {...}}.
+        """
+        routed, unrouted = route_partitions(partitions, self.routing)
+        if unrouted:
+            logger.info(f"Particiones sin destinatarios (no se envían): {', '.join(map(str, unrouted))}")
+
+        tenants: Dict[str, Any] = {}
+        summary: Dict[str, Any] = {'tenants': len(routed), 'unrouted': len(unrouted), 'recipients': 0, 'failed_tenants': 0}
+        for partition, recipients in routed:
+            graphs = (manifest or {}).get(str(partition))
+            template = self.sender.compile_summary(partitions[partition], scope=str(partition))
+            logger.info(f"Enviando reporte de '{partition}' a {len(recipients)} destinatarios.")
+            report = self.sender.broadcast_full_report(partitions[partition], recipients, simulate=simulate,
+                                                       graphs_dir=graphs['dir'] if graphs else None,
+                                                       include_graphs=include_graphs and graphs is not None,
+                                                       template=template)
+            tenants[str(partition)] = report
+            summary['recipients'] += len(recipients)
+            if not all(outcome['ok'] for outcome in report['outcomes']):
+                summary['failed_tenants'] += 1
+        return {'tenants': tenants, 'summary': summary}
+
+# aux function for direct use: partition `df`, render and deliver every routed tenant
+
+def fan_out_report(df, key: Optional[str] = None, simulate: Optional[bool] = None, include_graphs: bool = True,
+                   routing: Optional[Dict[str, List[Dict[str, Optional[str]]]]] = None) -> Dict[str, Any]:
+
+    from utils.analyzer import analyze_partitions
+    from utils.whatsapp_sender import get_whatsapp_sender
+
+    key = fanout_key(key)
+    routing = routing if routing is not None else load_routing_table(key)
+    partitions = analyze_partitions(df, key)
+    routed, _unrouted = route_partitions(partitions, routing)
+    manifest = None
+    if include_graphs and routed:
+        from utils.visualizer import generate_partitioned_visualizations
+
+        manifest = generate_partitioned_visualizations({p: partitions[p] for p, _r in routed})['partitions']
+    return ReportFanout(get_whatsapp_sender(), routing, key).send(partitions, manifest, simulate=simulate,
+                                                                 include_graphs=include_graphs)
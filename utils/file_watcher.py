@@ -0,0 +1,203 @@
+"""
+Input file watcher (watch mode).
+
+Watches the directories of a set of input files (the workbook, the routing
+table...) and calls back with the files whose content changed. Linux uses
+inotify through ctypes (no extra dependency); other platforms, or
+WATCH_BACKEND=poll, fall back to comparing (mtime, size) every
+WATCH_POLL_SECONDS.
+
+Events are debounced: a batch is delivered once no event arrived for
+WATCH_DEBOUNCE_SECONDS, so a workbook written in several steps (or saved as
+a temporary file and renamed) triggers a single run. A batch only contains
+files whose (mtime, size) actually changed since the previous batch.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_MODIFY
+
+# (mtime_ns, size) of a file, None if it does not exist
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _InotifySource:
+
+    # directory watches on one inotify descriptor; wait() returns the paths touched
+
+    def __init__(self, directories: Sequence[str]):
+
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify sólo está disponible en Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        self._dirs: Dict[int, str] = {}
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch falló para {directory}")
+            self._dirs[wd] = directory
+
+    def wait(self, timeout: float) -> List[str]:
+
+        readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths: List[str] = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped: report every watched directory, signatures sort it out
+                paths.extend(self._dirs.values())
+            elif wd in self._dirs and name:
+                paths.append(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class _PollingSource:
+
+    # (mtime, size) comparison of the watched files every `interval` seconds
+
+    def __init__(self, files: Sequence[str], interval: float):
+
+        self.files = list(files)
+        self.interval = interval
+        self._last = {path: file_signature(path) for path in self.files}
+
+    def wait(self, timeout: float) -> List[str]:
+
+        time.sleep(max(0.0, min(timeout, self.interval)))
+        changed = []
+        for path in self.files:
+            signature = file_signature(path)
+            if signature != self._last[path]:
+                self._last[path] = signature
+                changed.append(path)
+        return changed
+
+    def close(self):
+        pass
+
+
+class FileWatcher:
+
+    """
+    Call `callback(changed_files, first_event_at)` after a debounced batch
+    of changes to `files`. `first_event_at` (time.time()) is when the first
+    event of the batch was seen, for trigger-to-result latency. The callback
+    runs in the watching thread: events that arrive meanwhile form the next
+    batch.
+    """
+
+    def __init__(self, files: Sequence[str], callback: Callable[[List[str], float], None],
+                 debounce: Optional[float] = None, poll_interval: Optional[float] = None, backend: Optional[str] = None):
+
+        self.files = [os.path.abspath(f) for f in files]
+        self.callback = callback
+        self.debounce = debounce if debounce is not None else float(os.getenv('WATCH_DEBOUNCE_SECONDS', '2'))
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('WATCH_POLL_SECONDS', '2'))
+        self.backend = (backend or os.getenv('WATCH_BACKEND', 'auto')).strip().lower()
+        self._signatures = {path: file_signature(path) for path in self.files}
+        self._stop = threading.Event()
+        self._source = self._open_source()
+
+    def _open_source(self):
+
+        if self.backend in ('auto', 'inotify'):
+            try:
+                directories = sorted({os.path.dirname(f) for f in self.files})
+                source = _InotifySource(directories)
+                logger.info(f"Observando {len(self.files)} archivos con inotify.")
+                return source
+            except (OSError, AttributeError) as e:
+                if self.backend == 'inotify':
+                    raise
+                logger.info(f"inotify no disponible ({e}); se usa sondeo cada {self.poll_interval:g} s.")
+        return _PollingSource(self.files, self.poll_interval)
+
+    # files of the batch whose content signature changed
+
+    def _changed(self) -> List[str]:
+
+        changed = []
+        for path in self.files:
+            signature = file_signature(path)
+            if signature != self._signatures[path]:
+                self._signatures[path] = signature
+                changed.append(path)
+        return changed
+
+    def stop(self, *_args):
+
+        self._stop.set()
+
+    def run_forever(self):
+        """Block until stop(); the callback in progress is allowed to finish."""
+        # a directory path means the event queue overflowed
+        relevant = set(self.files) | {os.path.dirname(f) for f in self.files}
+        first_event: Optional[float] = None
+        last_event = 0.0
+        try:
+            while not self._stop.is_set():
+                timeout = self.debounce - (time.monotonic() - last_event) if first_event is not None else 1.0
+                events = [p for p in self._source.wait(min(max(timeout, 0.0), 1.0)) if os.path.abspath(p) in relevant]
+                if events:
+                    if first_event is None:
+                        first_event = time.time()
+                    last_event = time.monotonic()
+                    continue
+                if first_event is not None and time.monotonic() - last_event >= self.debounce:
+                    changed = self._changed()
+                    event_at, first_event = first_event, None
+                    if changed:
+                        self.callback(changed, event_at)
+        finally:
+            self._source.close()
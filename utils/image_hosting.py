@@ -0,0 +1,225 @@
+import mimetypes
+import os
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from utils.profiling import step
+from utils.upload_cache import file_sha256, get_upload_cache, upload_key
+
+logger = logging.getLogger(__name__)
+
+
+class ImageHostingBackend:
+
+    # interface for publishing local files (graphs, PDF) at a URL reachable by the recipients
+
+    name = 'base'
+    # whether non-image files (e.g. the PDF report) can be hosted
+    supports_documents = False
+
+    def is_configured(self) -> bool:
+        return False
+
+    def upload(self, paths: List[str], name_prefix: Optional[str] = None) -> List[Optional[str]]:
+        """Return one URL per path, in input order (None for files that could not be hosted)."""
+        raise NotImplementedError
+
+
+class ImgbbBackend(ImageHostingBackend):
+
+    name = 'imgbb'
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = (api_key if api_key is not None else os.getenv('IMGBB_API_KEY', '')).strip()
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def upload(self, paths: List[str], name_prefix: Optional[str] = None) -> List[Optional[str]]:
+        from utils.image_uploader import upload_images_to_imgbb_ordered
+        return upload_images_to_imgbb_ordered(paths, self.api_key, name_prefix=name_prefix, max_count=len(paths))
+
+
+class S3Backend(ImageHostingBackend):
+
+    # S3-compatible object store (AWS S3, MinIO, ...); requires the optional boto3 package
+
+    name = 's3'
+    supports_documents = True
+
+    def __init__(self):
+        self.bucket = os.getenv('S3_BUCKET', '').strip()
+        self.prefix = os.getenv('S3_PREFIX', 'rpa-reports').strip().strip('/')
+        self.endpoint_url = os.getenv('S3_ENDPOINT_URL', '').strip() or None
+        self.region = os.getenv('S3_REGION', '').strip() or None
+        # public bucket/CDN base URL; when empty, presigned GET URLs are generated
+        self.public_base_url = os.getenv('S3_PUBLIC_BASE_URL', '').strip().rstrip('/')
+        self.url_expires = int(os.getenv('S3_URL_EXPIRES', str(7 * 24 * 3600)))
+        self.concurrency = int(os.getenv('S3_CONCURRENCY', '4'))
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        return bool(self.bucket)
+
+    def _get_client(self):
+        with self._client_lock:
+            if self._client is None:
+                try:
+                    import boto3
+                except ImportError:
+                    raise RuntimeError("boto3 no está instalado; instálelo para usar IMAGE_HOST_BACKEND=s3")
+                self._client = boto3.client(
+                    's3',
+                    endpoint_url=self.endpoint_url,
+                    region_name=self.region,
+                    aws_access_key_id=os.getenv('S3_ACCESS_KEY_ID') or None,
+                    aws_secret_access_key=os.getenv('S3_SECRET_ACCESS_KEY') or None,
+                )
+            return self._client
+
+    def _url_for(self, key: str) -> str:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{quote(key)}"
+        return self._get_client().generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=self.url_expires)
+
+    def _upload_one(self, path: str, cache) -> Optional[str]:
+        try:
+            digest = file_sha256(path)
+            cache_key = upload_key('s3', self.bucket, digest)
+            if cache is not None:
+                cached = cache.get(cache_key)
+                if cached:
+                    return cached
+
+            # content-addressed key: identical bytes map to the same object
+            key = f"{self.prefix}/{digest[:16]}/{os.path.basename(path)}"
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            # upload_file streams from disk (multipart for large files)
+            self._get_client().upload_file(path, self.bucket, key, ExtraArgs={'ContentType': content_type})
+            url = self._url_for(key)
+            if cache is not None:
+                cache.put(cache_key, url, expires_in=None if self.public_base_url else self.url_expires)
+            return url
+        except Exception as e:
+            logger.warning(f"Subida a S3 fallida de {os.path.basename(path)}: {e}")
+            return None
+
+    def upload(self, paths: List[str], name_prefix: Optional[str] = None) -> List[Optional[str]]:
+        cache = get_upload_cache()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(paths) or 1))) as pool:
+            results = list(pool.map(lambda p: self._upload_one(p, cache), paths))
+        if cache is not None:
+            cache.save()
+        return results
+
+
+class LocalStaticBackend(ImageHostingBackend):
+
+    # files stay where they are and are served by utils.static_server (no upload at all)
+    # the server only serves images, so the PDF is not linked
+
+    name = 'local'
+    supports_documents = False
+
+    _server = None
+    _server_lock = threading.Lock()
+
+    def __init__(self):
+        self.root = os.path.realpath(os.getenv('LOCAL_STATIC_ROOT', '').strip() or os.path.join('outputs', 'graphs'))
+        self.base_url = os.getenv('LOCAL_STATIC_BASE_URL', '').strip().rstrip('/')
+        self.serve = os.getenv('LOCAL_STATIC_SERVE', 'false').strip().lower() in {'1', 'true', 'yes', 'y'}
+
+    def is_configured(self) -> bool:
+        # base URL as seen by the recipients (e.g. http://reports.example.local:8080)
+        return bool(self.base_url)
+
+    # start the in-process server once (daemon / long-running modes)
+
+    def _ensure_server(self):
+        with LocalStaticBackend._server_lock:
+            if LocalStaticBackend._server is None:
+                from utils.static_server import serve_static
+                LocalStaticBackend._server = serve_static(
+                    self.root, port=int(os.getenv('LOCAL_STATIC_PORT', '8080')),
+                    max_age=int(os.getenv('LOCAL_STATIC_MAX_AGE', '300')))
+
+    def upload(self, paths: List[str], name_prefix: Optional[str] = None) -> List[Optional[str]]:
+        if self.serve:
+            self._ensure_server()
+        results: List[Optional[str]] = []
+        for path in paths:
+            full = os.path.realpath(path)
+            if not os.path.isfile(full) or not full.startswith(self.root + os.sep):
+                logger.warning(f"Archivo fuera de la carpeta servida ({self.root}): {path}")
+                results.append(None)
+                continue
+            rel = os.path.relpath(full, self.root).replace(os.sep, '/')
+            # mtime in the query busts client caches when a graph is re-rendered
+            version = int(os.path.getmtime(full))
+            results.append(f"{self.base_url}/{quote(rel)}?v={version}")
+        return results
+
+
+class GraphPublisher:
+
+    # uploads each graph as soon as it is saved, while the remaining graphs are still rendering
+
+    def __init__(self, backend: Optional[ImageHostingBackend] = None, workers: Optional[int] = None,
+                 name_prefix: str = 'carbiz-report'):
+
+        self.backend = backend
+        self.name_prefix = name_prefix
+        self._pool = ThreadPoolExecutor(max_workers=workers or int(os.getenv('IMGBB_CONCURRENCY', '4')))
+        self._futures: Dict[str, Future] = {}
+
+    # usable as DataVisualizer(on_saved=publisher.submit)
+
+    def submit(self, path: str):
+
+        if self.backend is None:
+            return
+        self._futures[os.path.abspath(path)] = self._pool.submit(self._upload, path)
+
+    def _upload(self, path: str) -> Optional[str]:
+
+        with step('upload_graph'):
+            return self.backend.upload([path], name_prefix=self.name_prefix)[0]
+
+    def results(self, timeout: Optional[float] = None) -> Dict[str, Optional[str]]:
+        """Wait for the submitted uploads; returns {absolute_path: url or None}."""
+        urls: Dict[str, Optional[str]] = {}
+        try:
+            for path, future in self._futures.items():
+                try:
+                    urls[path] = future.result(timeout=timeout)
+                except Exception as e:
+                    logger.warning(f"No se pudo publicar {os.path.basename(path)}: {e}")
+                    urls[path] = None
+        finally:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        return urls
+
+
+BACKENDS: Dict[str, type] = {
+    ImgbbBackend.name: ImgbbBackend,
+    S3Backend.name: S3Backend,
+    LocalStaticBackend.name: LocalStaticBackend,
+}
+
+def get_image_backend(name: Optional[str] = None) -> Optional[ImageHostingBackend]:
+    """Return the configured hosting backend (IMAGE_HOST_BACKEND, default imgbb), or None if not configured."""
+    name = (name or os.getenv('IMAGE_HOST_BACKEND', 'imgbb')).strip().lower()
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        logger.error(f"Backend de hosting desconocido: {name}. Opciones: {', '.join(BACKENDS)}")
+        return None
+    backend = backend_cls()
+    if not backend.is_configured():
+        logger.info(f"Backend de hosting '{name}' sin configurar; las gráficas no se publicarán.")
+        return None
+    return backend
@@ -1,34 +1,146 @@
-import base64
 import os
+import random
+import uuid
+import threading
 import time
-from typing import List, Optional, Tuple
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 
-def _encode_image_b64(path: str) -> str:
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+from utils.upload_cache import UploadCache, file_sha256, get_upload_cache, upload_key
 
-def upload_image_to_imgbb(image_path: str, api_key: str, name: Optional[str] = None, timeout: int = 30) -> Tuple[bool, Optional[str], Optional[str]]:
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_URL = "https://api.imgbb.com/1/upload"
+
+# shared keep-alive session (one TLS handshake per pooled connection, not per image)
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def _upload_url() -> str:
+    # overridable to point at a local stand-in server
+    return os.getenv("IMGBB_UPLOAD_URL", "").strip() or DEFAULT_UPLOAD_URL
+
+def _expiration() -> Optional[int]:
+    # imgbb auto-delete time in seconds (60-15552000); unset keeps images forever
+    value = os.getenv("IMGBB_EXPIRATION", "").strip()
+    return int(value) if value else None
+
+def get_session(pool_size: int = 8) -> requests.Session:
+    """Return the process-wide pooled session used for uploads."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+# chunk size used when streaming files from disk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class MultipartFileStream:
     """
-    Upload a single image to imgbb.
+    multipart/form-data body that streams one file from disk.
 
-    Returns: (success, direct_url, error_message)
+    Text fields and the multipart framing are small in-memory bytes; the file
+    itself is read in chunks while the request is sent, so peak memory per
+    upload is bounded by the chunk size regardless of the image size. The
+    total length is known up front, so requests sends a Content-Length header
+    instead of chunked transfer encoding.
+    """
+
+    def __init__(self, fields: Dict[str, str], file_field: str, file_path: str,
+                 content_type: str = "application/octet-stream", chunk_size: int = STREAM_CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.file_path = file_path
+
+        head = b""
+        for key, value in fields.items():
+            head += (f"--{self.boundary}\r\n"
+                     f"Content-Disposition: form-data; name=\"{key}\"\r\n\r\n"
+                     f"{value}\r\n").encode("utf-8")
+        filename = os.path.basename(file_path)
+        head += (f"--{self.boundary}\r\n"
+                 f"Content-Disposition: form-data; name=\"{file_field}\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: {content_type}\r\n\r\n").encode("utf-8")
+        self._head = head
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self._length = len(head) + os.path.getsize(file_path) + len(self._tail)
+        self._file = None
+        self._stage = 0  # 0: head, 1: file, 2: tail, 3: done
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.chunk_size
+        if self._stage == 0:
+            self._stage = 1
+            self._file = open(self.file_path, "rb")
+            return self._head
+        if self._stage == 1:
+            chunk = self._file.read(min(size, self.chunk_size))
+            if chunk:
+                return chunk
+            self.close()
+            self._stage = 2
+        if self._stage == 2:
+            self._stage = 3
+            return self._tail
+        return b""
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def _post_image(image_path: str, api_key: str, name: Optional[str], timeout: float,
+                session: requests.Session) -> Tuple[bool, Optional[str], Optional[str], bool]:
+    """
+    Single upload attempt.
+
+    Returns: (success, direct_url, error_message, retriable)
     """
     try:
         if not os.path.isfile(image_path):
-            return False, None, f"Archivo no encontrado: {image_path}"
+            return False, None, f"Archivo no encontrado: {image_path}", False
 
-        img_b64 = _encode_image_b64(image_path)
-        payload = {
-            "key": api_key,
-            "image": img_b64,
-        }
+        # send the file as a binary multipart part streamed from disk (no base64 copy in memory)
+        fields = {"key": api_key}
         if name:
-            payload["name"] = name
+            fields["name"] = name
+        expiration = _expiration()
+        if expiration:
+            fields["expiration"] = str(expiration)
 
-        resp = requests.post("https://api.imgbb.com/1/upload", data=payload, timeout=timeout)
+        body = MultipartFileStream(fields, "image", image_path)
+        try:
+            resp = session.post(_upload_url(), data=body, headers={"Content-Type": body.content_type}, timeout=timeout)
+        finally:
+            body.close()
         if resp.status_code != 200:
-            return False, None, f"HTTP {resp.status_code}: {resp.text}"
+            # throttling and server errors are worth retrying, client errors are not
+            retriable = resp.status_code == 429 or resp.status_code >= 500
+            return False, None, f"HTTP {resp.status_code}: {resp.text}", retriable
 
         data = resp.json().get("data", {})
         # prefer direct image URL if available, else fallback to public URL
@@ -39,25 +151,127 @@ def upload_image_to_imgbb(image_path: str, api_key: str, name: Optional[str] = N
             if not direct:
                 direct = data.get("display_url") or data.get("url")
         if not direct:
-            return False, None, "Respuesta de imgbb sin URL usable"
+            return False, None, "Respuesta de imgbb sin URL usable", False
 
-        return True, direct, None
+        return True, direct, None, False
+    except (requests.ConnectionError, requests.Timeout) as e:
+        return False, None, str(e), True
     except Exception as e:
-        return False, None, str(e)
+        return False, None, str(e), False
+
+def upload_image_to_imgbb(image_path: str, api_key: str, name: Optional[str] = None, timeout: int = 30,
+                          session: Optional[requests.Session] = None) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Upload a single image to imgbb.
+
+    Returns: (success, direct_url, error_message)
+    """
+    ok, url, err, _retriable = _post_image(image_path, api_key, name, timeout, session or get_session())
+    return ok, url, err
+
+def _upload_with_retries(image_path: str, api_key: str, name: Optional[str], session: requests.Session,
+                         timeout: float, retries: int, backoff: float, deadline: float,
+                         cancelled: threading.Event) -> Optional[str]:
+    """Upload one image retrying transient errors with exponential backoff + full jitter until the deadline."""
+    for attempt in range(retries + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or cancelled.is_set():
+            break
+
+        ok, url, err, retriable = _post_image(image_path, api_key, name, min(timeout, remaining), session)
+        if ok:
+            return url
+        if not retriable or attempt == retries:
+            logger.warning(f"Subida fallida de {os.path.basename(image_path)}: {err}")
+            break
+
+        delay = random.uniform(0, backoff * (2 ** attempt))
+        logger.info(f"Reintentando subida de {os.path.basename(image_path)} en {delay:.2f}s ({err})")
+        if cancelled.wait(min(delay, max(0.0, deadline - time.monotonic()))):
+            break
+    return None
+
+def upload_images_to_imgbb_ordered(image_paths: List[str], api_key: str, name_prefix: Optional[str] = None,
+                                   max_count: int = 3, concurrency: Optional[int] = None, retries: Optional[int] = None,
+                                   backoff: float = 0.5, timeout: int = 30, deadline: Optional[float] = None,
+                                   cache: Optional[UploadCache] = None) -> List[Optional[str]]:
+    """
+    Upload images concurrently through the shared pooled session.
+
+    Images whose bytes (SHA-256) were already uploaded and whose URL has not
+    expired are served from the upload cache without any network I/O.
+
+    Returns one entry per input path (up to max_count), in input order:
+    the direct URL, or None if that image could not be uploaded before the deadline.
+    """
+    if concurrency is None:
+        concurrency = int(os.getenv("IMGBB_CONCURRENCY", "4"))
+    if retries is None:
+        retries = int(os.getenv("IMGBB_RETRIES", "3"))
+    if deadline is None:
+        deadline = float(os.getenv("IMGBB_DEADLINE", "60"))
+
+    paths = image_paths[:max_count]
+    if not paths:
+        return []
+
+    results: List[Optional[str]] = [None] * len(paths)
+
+    # content-hash lookup: unchanged images skip the upload entirely
+    if cache is None:
+        cache = get_upload_cache()
+    keys: List[Optional[str]] = [None] * len(paths)
+    if cache is not None:
+        endpoint = _upload_url()
+        for i, path in enumerate(paths):
+            if os.path.isfile(path):
+                keys[i] = upload_key('imgbb', endpoint, file_sha256(path))
+                results[i] = cache.get(keys[i])
+    to_upload = [i for i in range(len(paths)) if results[i] is None]
+    if len(to_upload) < len(paths):
+        logger.info(f"Cache de subidas: {len(paths) - len(to_upload)}/{len(paths)} imágenes reutilizadas.")
+    if not to_upload:
+        return results
+
+    session = get_session(pool_size=max(concurrency, 1))
+    ends_at = time.monotonic() + deadline
+    cancelled = threading.Event()
+    ts = int(time.time())
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(to_upload))))
+    try:
+        futures = {}
+        for i in to_upload:
+            path, idx = paths[i], i + 1
+            name = None
+            if name_prefix:
+                base = os.path.splitext(os.path.basename(path))[0]
+                name = f"{name_prefix}_{base}_{ts}_{idx}"
+            future = pool.submit(_upload_with_retries, path, api_key, name, session,
+                                 timeout, retries, backoff, ends_at, cancelled)
+            futures[future] = i
+
+        done, pending = wait(futures, timeout=max(0.0, ends_at - time.monotonic()))
+        if pending:
+            logger.warning(f"Tiempo límite de subida alcanzado: {len(pending)} imágenes sin subir.")
+        for future in done:
+            i = futures[future]
+            results[i] = future.result()
+            if cache is not None and results[i] and keys[i]:
+                cache.put(keys[i], results[i], expires_in=_expiration())
+    finally:
+        # stop pending retries and do not block on in-flight requests past the deadline
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        if cache is not None:
+            cache.save()
+
+    return results
 
 def upload_images_to_imgbb(image_paths: List[str], api_key: str, name_prefix: Optional[str] = None, max_count: int = 3) -> List[str]:
     """
     Upload multiple images and return a list of direct URLs (up to max_count).
     Skips files that fail to upload; returns URLs for successes only.
     """
-    results: List[str] = []
-    ts = int(time.time())
-    for idx, path in enumerate(image_paths[:max_count], start=1):
-        name = None
-        if name_prefix:
-            base = os.path.splitext(os.path.basename(path))[0]
-            name = f"{name_prefix}_{base}_{ts}_{idx}"
-        ok, url, _err = upload_image_to_imgbb(path, api_key, name=name)
-        if ok and url:
-            results.append(url)
-    return results
+    uploaded = upload_images_to_imgbb_ordered(image_paths, api_key, name_prefix=name_prefix, max_count=max_count)
+    return [url for url in uploaded if url]
@@ -0,0 +1,161 @@
+"""
+Process logging off the calling thread.
+
+configure_logging() replaces the root handlers with a QueueHandler: pipeline
+stages and broadcast workers only enqueue their records, and a QueueListener
+thread formats them and writes to stderr (and LOG_FILE). Records whose
+arguments are plain values are formatted by the listener too; records that
+carry objects (a DataFrame...) are formatted when logged, so later changes to
+the object do not leak into the message.
+
+  LOG_LEVEL        root level (default INFO)
+  LOG_LEVELS       per-logger or per-stage levels, e.g. "analisis=WARNING,carga=DEBUG"
+                   (stage names as in the pipeline summary, module names such as
+                   "visualizer", or full logger names)
+  LOG_FILE         also write the log to this file
+  LOG_DIAGNOSTICS  "true" or a list of stages/loggers whose expensive diagnostics
+                   (DataFrame info / head / describe) are computed and logged;
+                   a logger at DEBUG level also gets them
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# pipeline stage -> logger of the module that does its work
+STAGE_LOGGERS = {
+    'carga': 'utils.data_loader',
+    'analisis': 'utils.analyzer',
+    'particiones': 'utils.analyzer',
+    'graficas': 'utils.visualizer',
+    'graficas_particiones': 'utils.visualizer',
+    'subidas': 'utils.image_uploader',
+    'pdf': 'utils.pdf_report',
+    'envio': 'utils.whatsapp_sender',
+    'envio_particiones': 'utils.fanout',
+}
+
+_SIMPLE_TYPES = (str, int, float, bool, type(None))
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handlers: List[logging.Handler] = []
+_fork_hook_registered = False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+
+    # enqueue the record unformatted when its arguments cannot change afterwards
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        args = record.args if isinstance(record.args, tuple) else ()
+        if record.exc_info or not isinstance(record.msg, str) or not all(isinstance(a, _SIMPLE_TYPES) for a in args):
+            return super().prepare(record)
+        return record
+
+# "carga" -> "utils.data_loader", "visualizer" -> "utils.visualizer"
+
+def _logger_name(name: str) -> str:
+
+    name = name.strip()
+    if name in STAGE_LOGGERS:
+        return STAGE_LOGGERS[name]
+    if name and '.' not in name and name != 'root' and not name.startswith('utils'):
+        return f"utils.{name}"
+    return name
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        value = logging.getLevelName(level.strip().upper())
+        if isinstance(value, int):
+            levels[_logger_name(name)] = value
+        else:
+            logger.warning("Nivel de log desconocido para %s: %s", name.strip(), level.strip())
+    return levels
+
+def _diagnostic_loggers() -> Optional[Set[str]]:
+
+    # None means every logger
+    value = os.getenv('LOG_DIAGNOSTICS', 'false').strip()
+    if value.lower() in {'1', 'true', 'yes', 'y'}:
+        return None
+    if value.lower() in {'', '0', 'false', 'no', 'n'}:
+        return set()
+    return {_logger_name(name) for name in value.split(',') if name.strip()}
+
+def diagnostics_enabled(log: logging.Logger) -> bool:
+    """Whether `log`'s module should compute its expensive diagnostics."""
+    if log.isEnabledFor(logging.DEBUG):
+        return True
+    enabled = _diagnostic_loggers()
+    return enabled is None or log.name in enabled
+
+# a forked worker (graph render pool) has the queue but not the listener thread: write directly
+
+def _after_fork_in_child():
+
+    global _listener
+
+    if _listener is None:
+        return
+    _listener = None
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in _handlers:
+        root.addHandler(handler)
+
+def configure_logging(level: Optional[str] = None):
+    """
+    Install the queue handler on the root logger (once per process) and
+    apply LOG_LEVEL / LOG_LEVELS. Calling it again only re-applies levels.
+    """
+    global _listener, _fork_hook_registered
+
+    root = logging.getLogger()
+    root_level = logging.getLevelName((level or os.getenv('LOG_LEVEL', 'INFO')).strip().upper())
+    root.setLevel(root_level if isinstance(root_level, int) else logging.INFO)
+
+    if _listener is None:
+        formatter = logging.Formatter(logging.BASIC_FORMAT)
+        handlers = [logging.StreamHandler()]
+        log_file = os.getenv('LOG_FILE', '').strip()
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        _handlers[:] = handlers
+
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_DeferredQueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        # flush what is still queued when the process exits
+        atexit.register(stop_logging)
+        if hasattr(os, 'register_at_fork') and not _fork_hook_registered:
+            os.register_at_fork(after_in_child=_after_fork_in_child)
+            _fork_hook_registered = True
+
+    for name, value in _parse_levels(os.getenv('LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(value)
+
+def stop_logging():
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
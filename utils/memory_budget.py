@@ -0,0 +1,130 @@
+"""
+Memory budget for a report run.
+
+With MEMORY_BUDGET_MB set, the load stage estimates the memory a workbook
+needs before reading it: the sheet dimension gives the row count, and the
+first MEMORY_SAMPLE_ROWS rows give the bytes per row (dtypes, string
+lengths). Reading with pandas peaks at about WORKING_SET_FACTOR times the
+final DataFrame (openpyxl keeps every row as Python objects until the frame
+is built), so
+
+    current RSS + WORKING_SET_FACTOR * estimated frame > budget
+
+switches the run to the streaming path: the sheet is read in chunks of
+MEMORY_CHUNK_ROWS rows (by default sized to a fraction of the free budget),
+validated and aggregated chunk by chunk, and never held in memory as a whole.
+The analysis stage also checks the live RSS: a frame that was loaded but
+left the process over budget is aggregated in slices instead of copied.
+
+Without a budget (the default) nothing is estimated and runs are unchanged.
+"""
+
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.profiling import current_rss_mb
+
+logger = logging.getLogger(__name__)
+
+# peak RSS of pd.read_excel over the final DataFrame size (measured: ~2.8x at 1e5 rows)
+WORKING_SET_FACTOR = 3.0
+
+# share of the free budget one chunk may use (parsing a chunk also goes through Python objects)
+CHUNK_BUDGET_FRACTION = 0.1
+MIN_CHUNK_ROWS = 1_000
+
+def _env_float(name: str, default: float) -> float:
+
+    try:
+        return float(os.getenv(name, '').strip() or default)
+    except ValueError:
+        logger.warning("Valor inválido para %s; se usa %s.", name, default)
+        return default
+
+# (data rows, first rows as a DataFrame) of a sheet, read through openpyxl in read-only mode
+
+def sample_sheet(file_path: str, sheet_name=0, sample_rows: int = 1_000) -> Tuple[Optional[int], Any]:
+
+    import openpyxl
+    import pandas as pd
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return 0, pd.DataFrame()
+        sample: List[tuple] = []
+        for row in rows:
+            if any(value is not None for value in row):
+                sample.append(row)
+                if len(sample) >= sample_rows:
+                    break
+        # the dimension tag may be missing (files not written by Excel)
+        total = sheet.max_row - 1 if sheet.max_row is not None else None
+        return total, pd.DataFrame(sample, columns=list(header))
+    finally:
+        workbook.close()
+
+
+class MemoryBudget:
+
+    # budget of the whole process (MEMORY_BUDGET_MB); disabled when 0 or unset
+
+    def __init__(self, limit_mb: Optional[float] = None):
+
+        self.limit_mb = limit_mb if limit_mb is not None else _env_float('MEMORY_BUDGET_MB', 0)
+        self.sample_rows = int(_env_float('MEMORY_SAMPLE_ROWS', 1_000))
+        self.chunk_rows_override = int(_env_float('MEMORY_CHUNK_ROWS', 0))
+
+    @property
+    def enabled(self) -> bool:
+
+        return self.limit_mb > 0
+
+    def over_budget(self) -> bool:
+
+        rss = current_rss_mb()
+        return self.enabled and rss is not None and rss > self.limit_mb
+
+    # rows per chunk so one chunk stays within a fraction of the free budget
+
+    def chunk_rows(self, bytes_per_row: float) -> int:
+
+        if self.chunk_rows_override > 0:
+            return self.chunk_rows_override
+        free_mb = max(self.limit_mb - (current_rss_mb() or 0), self.limit_mb * CHUNK_BUDGET_FRACTION)
+        rows = free_mb * CHUNK_BUDGET_FRACTION * 1024 * 1024 / (max(bytes_per_row, 1.0) * WORKING_SET_FACTOR)
+        return max(MIN_CHUNK_ROWS, int(rows))
+
+    def plan_load(self, file_path: str, sheet_name=0) -> Dict[str, Any]:
+        """
+        Decide how to load `file_path`: {'stream': bool, 'rows', 'estimate_mb',
+        'rss_mb', 'limit_mb', 'chunk_rows'}. Without a budget, {'stream': False}.
+        """
+        if not self.enabled:
+            return {'stream': False}
+
+        rows, sample = sample_sheet(file_path, sheet_name, self.sample_rows)
+        bytes_per_row = float(sample.memory_usage(deep=True, index=False).sum()) / len(sample) if len(sample) else 0.0
+        rss_mb = current_rss_mb() or 0.0
+        if rows is None and len(sample) >= self.sample_rows:
+            # no dimension and more rows than the sample: the size is unknown, stream to stay safe
+            logger.info("%s no declara sus dimensiones; se procesa por bloques.", os.path.basename(file_path))
+            return {'stream': True, 'rows': None, 'estimate_mb': None, 'rss_mb': round(rss_mb, 1),
+                    'limit_mb': self.limit_mb, 'chunk_rows': self.chunk_rows(bytes_per_row)}
+        rows = len(sample) if rows is None else rows
+        estimate_mb = rows * bytes_per_row * WORKING_SET_FACTOR / (1024 * 1024)
+        plan = {
+            'stream': rss_mb + estimate_mb > self.limit_mb,
+            'rows': rows,
+            'estimate_mb': round(estimate_mb, 1),
+            'rss_mb': round(rss_mb, 1),
+            'limit_mb': self.limit_mb,
+            'chunk_rows': self.chunk_rows(bytes_per_row),
+        }
+        logger.info("Memoria estimada para %s: %.1f MB (%d filas), RSS actual %.1f MB, presupuesto %.0f MB.",
+                    os.path.basename(file_path), estimate_mb, rows, rss_mb, self.limit_mb)
+        return plan
@@ -0,0 +1,199 @@
+import copy
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Twilio rejects WhatsApp bodies longer than 1600 characters (counted in UTF-16 code units)
+MAX_BODY_LENGTH = 1600
+
+# room kept for the "\n(NN/NN)" marker added to each part of a split message
+_PART_MARKER_RESERVE = len("\n(99/99)")
+
+_NUMBER_EMOJI = {1: "1️⃣", 2: "2️⃣", 3: "3️⃣", 4: "4️⃣", 5: "5️⃣"}
+
+def message_length(text: str) -> int:
+    """Length as Twilio counts it (UTF-16 code units: most emoji count as 2)."""
+    return len(text.encode('utf-16-le')) // 2
+
+# cut one line into pieces of at most `budget` units, preferring the last space
+
+def _wrap_line(line: str, budget: int) -> List[str]:
+
+    pieces: List[str] = []
+    while message_length(line) > budget:
+        cut = budget
+        while message_length(line[:cut]) > budget:
+            cut -= 1
+        space = line.rfind(' ', 0, cut)
+        if space > cut // 2:
+            cut = space
+        pieces.append(line[:cut].rstrip())
+        line = line[cut:].lstrip()
+    pieces.append(line)
+    return pieces
+
+def split_message(text: str, limit: int = MAX_BODY_LENGTH) -> List[str]:
+    """
+    Split a body into parts of at most `limit` units. Deterministic: lines are
+    packed greedily in order, long lines are cut at the last space, and each
+    part ends with a "(i/n)" marker. Short bodies are returned unchanged.
+    """
+    if message_length(text) <= limit:
+        return [text]
+
+    budget = limit - _PART_MARKER_RESERVE
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in text.split('\n'):
+        for piece in _wrap_line(line, budget):
+            piece_length = message_length(piece)
+            added = piece_length + (1 if current else 0)
+            if current and size + added > budget:
+                chunks.append('\n'.join(current))
+                current, size = [piece], piece_length
+            else:
+                current.append(piece)
+                size += added
+    if current:
+        chunks.append('\n'.join(current))
+
+    # blank lines at a cut point carry no content
+    chunks = [c.strip('\n') for c in chunks if c.strip()]
+    total = len(chunks)
+    return [f"{chunk}\n({index}/{total})" for index, chunk in enumerate(chunks, start=1)]
+
+
+class ReportTemplate:
+
+    """
+    Sales report message compiled once from the analysis results.
+
+    Everything that does not depend on the recipient (metrics, rankings,
+    footer, extra text such as graph links) is rendered at construction. The
+    headquarter block is pre-rendered once per headquarter with that row
+    highlighted, so a personalized render is a few string concatenations.
+    Split points only depend on line lengths, so the split of a long body is
+    cached per (headquarter, greeting length) and reused across recipients.
+
+    Recipients are dicts with 'number' and optional 'name' / 'headquarter'.
+    """
+
+    def __init__(self, results: Dict[str, Any], generated_at: str, extra: str = '', limit: int = MAX_BODY_LENGTH,
+                 scope: Optional[str] = None):
+
+        self.limit = limit
+        metrics = results['summary_metrics']
+        by_headquarter = results['sales_by_headquarter']
+
+        # multi-line structure for better readability
+        head: List[str] = [
+            f"📊 Reporte de análisis de ventas — {scope}" if scope else "📊 Reporte de análisis de ventas",
+            f"👥 Clientes únicos: {metrics['unique_clients']:,}",
+            f"🧾 Total de ventas: {metrics['total_sales']:,}",
+            f"💵 Ventas sin IGV: ${metrics['total_sales_without_igv']:,.2f}",
+            f"💰 Ventas con IGV: ${metrics['total_sales_with_igv']:,.2f}",
+            f"🧮 IGV recaudado: ${metrics['total_igv_collected']:,.2f}",
+            f"📈 Venta promedio: ${metrics['average_sales_without_igv']:,.2f}",
+            "",
+            f"🏆 Modelo más vendido: {results['top_models'].index[0]}",
+            f"📍 Sede con más ventas: {by_headquarter.index[0]}",
+            f"📣 Canal con más ventas: {results['sales_by_channel'].index[0]}",
+            "",
+            "📍 Ventas por sede:",
+        ]
+
+        # top 5 models and footer
+        tail: List[str] = ["", "🔝 Top 5 modelos:"]
+        for i, (model, sales) in enumerate(results['top_models'].items(), 1):
+            tail.append(f"{_NUMBER_EMOJI.get(i, f'{i}.')} {model}: ${sales:,.2f}")
+            if i >= 5:
+                break
+        tail += ["", f"🗓️ Generado: {generated_at}"]
+
+        self._head = "\n".join(head) + "\n"
+        self._tail = "\n" + "\n".join(tail) + extra
+
+        # sales by headquarter (one per line), plain and once per highlighted headquarter
+        headquarters = [str(hq) for hq in by_headquarter.index]
+        rows = [f"• 🏢 {hq}: ${sales:,.2f}" for hq, sales in zip(headquarters, by_headquarter.values)]
+        self._hq_block = "\n".join(rows)
+        self._hq_blocks: Dict[str, str] = {'': self._hq_block}
+        total = len(rows)
+        for rank, (hq, sales) in enumerate(zip(headquarters, by_headquarter.values), start=1):
+            highlighted = rows[:rank - 1] + [f"👉 🏢 {hq}: ${sales:,.2f} ⬅️ tu sede (puesto {rank} de {total})"] + rows[rank:]
+            self._hq_blocks[hq.casefold()] = "\n".join(highlighted)
+
+        self._compile_tail()
+
+    # everything that depends on the tail (lengths and split points)
+
+    def _compile_tail(self):
+
+        self._base = self._head + self._hq_block + self._tail
+        self._base_parts = split_message(self._base, self.limit)
+        self._lengths = {key: message_length(self._head + block + self._tail) for key, block in self._hq_blocks.items()}
+        self._split_cache: Dict[tuple, List[str]] = {}
+
+    # same report with `extra` appended (e.g. graph links published after the summary was compiled)
+
+    def with_extra(self, extra: str) -> 'ReportTemplate':
+
+        if not extra:
+            return self
+        template = copy.copy(self)
+        template._tail = self._tail + extra
+        template._compile_tail()
+        return template
+
+    # the non-personalized report (same text as before templates existed)
+
+    def render(self) -> str:
+
+        return self._base
+
+    # (greeting, headquarter key) for a recipient; unknown headquarters get the plain block
+
+    def _personal_fields(self, recipient: Optional[Dict[str, Any]]):
+
+        if not recipient:
+            return "", ""
+        hq = recipient.get('headquarter')
+        key = str(hq).casefold() if hq else ""
+        name = recipient.get('name')
+        return (f"👋 Hola {name}\n" if name else ""), (key if key in self._hq_blocks else "")
+
+    def render_for(self, recipient: Optional[Dict[str, Any]] = None) -> str:
+
+        greeting, key = self._personal_fields(recipient)
+        if not greeting and not key:
+            return self._base
+        return greeting + self._head + self._hq_blocks[key] + self._tail
+
+    # body parts ready to send (split at the WhatsApp limit)
+
+    def render_parts(self, recipient: Optional[Dict[str, Any]] = None) -> List[str]:
+
+        greeting, key = self._personal_fields(recipient)
+        if not greeting and not key:
+            return self._base_parts
+        greeting_length = message_length(greeting)
+        if greeting_length + self._lengths[key] <= self.limit:
+            return [greeting + self._head + self._hq_blocks[key] + self._tail]
+        if greeting_length > self.limit // 2:
+            # a greeting that long may itself be wrapped: no shared split
+            return split_message(self.render_for(recipient), self.limit)
+
+        cache_key = (key, greeting_length)
+        shared = self._split_cache.get(cache_key)
+        if shared is None:
+            parts = split_message(greeting + self._head + self._hq_blocks[key] + self._tail, self.limit)
+            # the greeting is the first line of the first part; keep the rest for every recipient
+            shared = [parts[0][len(greeting):]] + parts[1:]
+            self._split_cache[cache_key] = shared
+        return [greeting + shared[0]] + shared[1:]
+
+    def render_many(self, recipients: Sequence[Dict[str, Any]]) -> List[List[str]]:
+
+        return [self.render_parts(recipient) for recipient in recipients]
@@ -0,0 +1,404 @@
+"""
+Durable outbound message queue (SQLite, WAL mode).
+
+Every message carries an idempotency key derived from the recipient and the
+report identity (input fingerprint + results fingerprint, never the rendered
+body, which carries the generation time), so enqueueing the same report twice
+is a no-op and a restarted run resumes pending messages instead of sending
+them again. Only rows that ended up failed are queued again (with fresh
+attempts) when the same report is enqueued once more.
+Workers claim rows with a lease; several processes can drain the same queue.
+The lease covers the longest a submit can take (429 waits and HTTP timeouts
+included) and is renewed for the rest of a batch before each send, so a
+slow row is never reclaimed by another worker while it is still in flight.
+
+A row whose lease expired after it was handed to Twilio (process died
+mid-send) is first reconciled against the Messages list API before it is
+retried, so the message reaches Twilio only once.
+
+Usage:
+    python -m utils.outbound_queue drain --workers 4   # drain pending messages
+    python -m utils.outbound_queue status              # count by status
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import sqlite3
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = os.path.join('outputs', 'outbound_queue.db')
+
+# queue row states
+PENDING, IN_FLIGHT, SENT, FAILED = 'pending', 'in_flight', 'sent', 'failed'
+
+# extra lease time over the longest submit (database writes, reconciliation lookups)
+LEASE_MARGIN_SECONDS = 60.0
+
+# sha256 of the message content (body + attached media)
+
+def report_fingerprint(body: str, media_urls: Optional[List[str]] = None) -> str:
+
+    digest = hashlib.sha256(body.encode('utf-8'))
+    for url in media_urls or []:
+        digest.update(b'\0' + url.encode('utf-8'))
+    return digest.hexdigest()
+
+def idempotency_key(recipient: str, fingerprint: str) -> str:
+
+    return hashlib.sha256(f"{recipient.strip()}|{fingerprint}".encode('utf-8')).hexdigest()[:32]
+
+# identity of one report: same inputs and same aggregates give the same id, whatever the clock says
+
+def report_identity(results_key: str, input_key: Optional[str] = None) -> str:
+
+    return hashlib.sha256(f"{input_key or ''}|{results_key}".encode('utf-8')).hexdigest()
+
+
+class OutboundQueue:
+
+    # SQLite table of outbound messages; safe to share between threads and processes
+
+    def __init__(self, path: Optional[str] = None, backoff_base: Optional[float] = None,
+                 backoff_max: Optional[float] = None):
+
+        self.path = path or os.getenv('OUTBOUND_QUEUE_PATH', '').strip() or DEFAULT_QUEUE_PATH
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv('WHATSAPP_WAIT_TIME', '5'))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv('WHATSAPP_BACKOFF_MAX', '300'))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbound (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT UNIQUE NOT NULL,
+                    recipient TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    media_urls TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    lease_until REAL,
+                    worker TEXT,
+                    submitted_at REAL,
+                    sid TEXT,
+                    last_error TEXT,
+                    created_at TEXT,
+                    updated_at TEXT
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbound_ready ON outbound(status, next_attempt_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+
+        # autocommit mode: claims use explicit BEGIN IMMEDIATE transactions
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict[str, Any]:
+
+        item = dict(row)
+        item['media_urls'] = json.loads(item['media_urls']) if item['media_urls'] else None
+        return item
+
+    # add a message; returns its idempotency key
+    # pending / in-flight / sent rows are left untouched; a failed row is queued again with fresh attempts
+
+    def enqueue(self, recipient: str, body: str, media_urls: Optional[List[str]] = None,
+                key: Optional[str] = None, max_attempts: Optional[int] = None) -> str:
+
+        key = key or idempotency_key(recipient, report_fingerprint(body, media_urls))
+        max_attempts = max_attempts or int(os.getenv('WHATSAPP_MAX_RETRIES', '3'))
+        now = datetime.now(timezone.utc).isoformat()
+        with self._connect() as conn:
+            previous = conn.execute("SELECT status FROM outbound WHERE idempotency_key = ?", (key,)).fetchone()
+            cur = conn.execute(
+                "INSERT INTO outbound (idempotency_key, recipient, body, media_urls, status, max_attempts, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(idempotency_key) DO UPDATE SET status = excluded.status, attempts = 0, "
+                "max_attempts = excluded.max_attempts, next_attempt_at = excluded.next_attempt_at, lease_until = NULL, "
+                "worker = NULL, submitted_at = NULL, sid = NULL, last_error = NULL, body = excluded.body, "
+                "media_urls = excluded.media_urls, updated_at = excluded.updated_at WHERE outbound.status = ?",
+                (key, recipient, body, json.dumps(media_urls) if media_urls else None, PENDING, max_attempts,
+                 time.time(), now, now, FAILED))
+            if cur.rowcount == 0:
+                logger.info(f"Mensaje ya encolado para {recipient} (clave {key[:8]}); no se duplica.")
+            elif previous is not None:
+                logger.info(f"Mensaje fallido para {recipient} (clave {key[:8]}) encolado de nuevo.")
+        return key
+
+    # enqueue the parts of one report; part i of report `report_id` for `recipient` always gets the same key
+
+    def enqueue_report(self, recipient: str, parts: List[str], report_id: str, media_urls: Optional[List[str]] = None,
+                       max_attempts: Optional[int] = None) -> List[str]:
+
+        return [self.enqueue(recipient, part, media_urls if index == 0 else None,
+                             key=idempotency_key(recipient, f"{report_id}#{index}"), max_attempts=max_attempts)
+                for index, part in enumerate(parts)]
+
+    # atomically lease up to `limit` ready rows (pending and due, or in flight with an expired lease)
+
+    def claim(self, worker: str, limit: int = 1, lease_seconds: float = 120.0) -> List[Dict[str, Any]]:
+
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM outbound WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY next_attempt_at LIMIT ?", (PENDING, now, IN_FLIGHT, now, limit)).fetchall()
+            for row in rows:
+                conn.execute("UPDATE outbound SET status = ?, lease_until = ?, worker = ?, updated_at = ? WHERE id = ?",
+                             (IN_FLIGHT, now + lease_seconds, worker, datetime.now(timezone.utc).isoformat(), row['id']))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [self._row(r) for r in rows]
+
+    # heartbeat: push the lease of rows this worker still holds (a slow batch is not reclaimed mid-send)
+
+    def extend_lease(self, items: List[Dict[str, Any]], worker: str, lease_seconds: float):
+
+        if not items:
+            return
+        marks = ', '.join('?' for _ in items)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE outbound SET lease_until = ? WHERE status = ? AND worker = ? AND id IN ({marks})",
+                         (time.time() + lease_seconds, IN_FLIGHT, worker, *(item['id'] for item in items)))
+
+    def _update(self, item_id: int, **fields):
+
+        fields['updated_at'] = datetime.now(timezone.utc).isoformat()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE outbound SET {assignments} WHERE id = ?", (*fields.values(), item_id))
+
+    # mark the row as handed to Twilio (a crash after this point triggers reconciliation)
+
+    def mark_submitting(self, item: Dict[str, Any]):
+
+        item['attempts'] += 1
+        self._update(item['id'], attempts=item['attempts'], submitted_at=time.time())
+
+    def mark_sent(self, item: Dict[str, Any], sid: str):
+
+        self._update(item['id'], status=SENT, sid=sid, lease_until=None, last_error=None)
+
+    # schedule a retry with exponential backoff and full jitter, or fail the row for good
+
+    def mark_retry(self, item: Dict[str, Any], error: Optional[str], retriable: bool = True):
+
+        if not retriable or item['attempts'] >= item['max_attempts']:
+            self._update(item['id'], status=FAILED, lease_until=None, submitted_at=None, last_error=error)
+            logger.error(f"Mensaje a {item['recipient']} descartado tras {item['attempts']} intentos: {error}")
+            return
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** max(0, item['attempts'] - 1))))
+        self._update(item['id'], status=PENDING, lease_until=None, submitted_at=None, last_error=error,
+                     next_attempt_at=time.time() + delay)
+
+    # give a claimed row back without consuming an attempt (e.g. daily limit reached)
+
+    def release(self, item: Dict[str, Any], delay: float = 0.0, error: Optional[str] = None):
+
+        self._update(item['id'], status=PENDING, attempts=item['attempts'], lease_until=None, submitted_at=None,
+                     last_error=error, next_attempt_at=time.time() + delay)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM outbound WHERE idempotency_key = ?", (key,)).fetchone()
+        return self._row(row) if row else None
+
+    # seconds until the next row can be claimed (0 if one is ready), None if nothing is left to send
+
+    def next_ready_in(self) -> Optional[float]:
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MIN(CASE WHEN status = ? THEN next_attempt_at ELSE lease_until END) FROM outbound WHERE status IN (?, ?)",
+                (PENDING, PENDING, IN_FLIGHT)).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def summary(self) -> Dict[str, int]:
+
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM outbound GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+# seconds to keep rows queued after a daily-limit / open-circuit error
+
+def _limit_delay(error: Exception) -> float:
+
+    retry_at = getattr(error, 'retry_at', 0.0)
+    if retry_at:
+        return max(0.0, retry_at - time.time())
+    return float(os.getenv('WHATSAPP_DAILY_LIMIT_DELAY', '3600'))
+
+
+class QueueWorker:
+
+    # drains the queue through a WhatsAppSender (one Twilio submit per claimed row)
+
+    def __init__(self, sender, queue: OutboundQueue, worker_id: Optional[str] = None,
+                 batch_size: int = 10, lease_seconds: Optional[float] = None):
+
+        self.sender = sender
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size
+        # one row must outlast its slowest submit (429 waits and HTTP timeouts included), with a margin
+        self.lease_seconds = lease_seconds if lease_seconds is not None else max(
+            LEASE_MARGIN_SECONDS * 2, sender.max_submit_seconds() + LEASE_MARGIN_SECONDS)
+
+    # look for a message Twilio already accepted for this row (previous run died before recording it)
+
+    def _find_existing_sid(self, item: Dict[str, Any]) -> Optional[str]:
+
+        client = self.sender.twilio_client
+        if client is None:
+            self.sender._initialize_twilio_client()
+            client = self.sender.twilio_client
+        if client is None:
+            return None
+        since = datetime.fromtimestamp(item['submitted_at'], timezone.utc) - timedelta(minutes=5)
+        to = f"whatsapp:{item['recipient']}"
+        for message in client.messages.stream(to=to, date_sent_after=since, limit=200):
+            if message.to == to and message.body == item['body']:
+                return message.sid
+        return None
+
+    def _process(self, item: Dict[str, Any]):
+
+        from utils.whatsapp_sender import TwilioDailyLimitExceeded
+
+        if item['submitted_at'] and not item['sid']:
+            try:
+                sid = self._find_existing_sid(item)
+            except Exception as e:
+                # cannot tell whether it was sent: keep the row for a later pass
+                self.queue.release(item, delay=self.queue.backoff_base, error=f"Reconciliación fallida: {e}")
+                return
+            if sid:
+                logger.info(f"Mensaje a {item['recipient']} ya aceptado por Twilio (SID {sid}); no se reenvía.")
+                self.queue.mark_sent(item, sid)
+                return
+
+        self.queue.mark_submitting(item)
+        try:
+            ok, sid, error, retriable = self.sender.submit_twilio_message(item['body'], item['recipient'], item['media_urls'])
+        except TwilioDailyLimitExceeded as e:
+            # not the message's fault: retry after the window resets, without spending an attempt
+            item['attempts'] -= 1
+            self.queue.release(item, delay=_limit_delay(e), error=str(e))
+            raise
+        if ok:
+            self.queue.mark_sent(item, sid)
+        else:
+            self.queue.mark_retry(item, error, retriable)
+
+    # process one batch; returns the number of claimed rows
+
+    def run_once(self) -> int:
+
+        from utils.whatsapp_sender import TwilioDailyLimitExceeded
+
+        items = self.queue.claim(self.worker_id, self.batch_size, self.lease_seconds)
+        for index, item in enumerate(items):
+            # rows still waiting in this batch get a fresh lease before each send
+            if index:
+                self.queue.extend_lease(items[index:], self.worker_id, self.lease_seconds)
+            try:
+                self._process(item)
+            except TwilioDailyLimitExceeded as e:
+                for rest in items[index + 1:]:
+                    self.queue.release(rest, delay=_limit_delay(e))
+                raise
+        return len(items)
+
+    # keep claiming until nothing is left (waiting for backoff timers), or until max_wait seconds
+
+    def drain(self, max_wait: Optional[float] = None, poll_interval: float = 1.0) -> Dict[str, int]:
+
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            if self.run_once():
+                continue
+            wait = self.queue.next_ready_in()
+            if wait is None:
+                break
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = min(wait, remaining)
+            time.sleep(min(max(wait, 0.05), poll_interval))
+        return self.queue.summary()
+
+# worker process entry point (each process builds its own sender / Twilio client)
+
+def _drain_worker(queue_path: str, max_wait: Optional[float]) -> Dict[str, int]:
+
+    from utils.whatsapp_sender import TwilioDailyLimitExceeded, get_whatsapp_sender
+
+    try:
+        return QueueWorker(get_whatsapp_sender(), OutboundQueue(queue_path)).drain(max_wait=max_wait)
+    except TwilioDailyLimitExceeded:
+        logger.error("Límite diario de Twilio alcanzado; mensajes pendientes conservados en la cola.")
+        return OutboundQueue(queue_path).summary()
+
+# aux function for direct use: drain the queue with N worker processes
+
+def drain_queue(workers: int = 1, path: Optional[str] = None, max_wait: Optional[float] = None) -> Dict[str, int]:
+
+    queue = OutboundQueue(path)
+    if workers <= 1:
+        return _drain_worker(queue.path, max_wait)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_drain_worker, [queue.path] * workers, [max_wait] * workers))
+    return queue.summary()
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Cola persistente de mensajes salientes de WhatsApp")
+    sub = parser.add_subparsers(dest='command', required=True)
+    drain = sub.add_parser('drain', help="Enviar los mensajes pendientes")
+    drain.add_argument('--workers', type=int, default=1, help="Procesos que drenan la cola en paralelo")
+    drain.add_argument('--max-wait', type=float, default=None, help="Tiempo máximo esperando reintentos (s)")
+    sub.add_parser('status', help="Conteo de mensajes por estado")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        if os.path.exists('whatsapp_config.env'):
+            load_dotenv('whatsapp_config.env', override=True)
+    except ImportError:
+        pass
+
+    if args.command == 'status':
+        print(OutboundQueue().summary())
+    else:
+        print(drain_queue(args.workers, max_wait=args.max_wait))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import struct
+import time
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Callable
+
+logger = logging.getLogger(__name__)
+
+# A4 portrait in mm
+PAGE_WIDTH = 210
+PAGE_HEIGHT = 297
+MARGIN = 15
+
+DEFAULT_PDF_PATH = os.path.join('outputs', 'reporte_ventas.pdf')
+
+# core PDF fonts are latin-1 only: drop emojis and other unsupported characters
+
+def _latin1(text: str) -> str:
+
+    return text.encode('latin-1', errors='ignore').decode('latin-1').strip()
+
+# read width/height from a PNG header (None if not a PNG)
+
+def _png_size(path: str) -> Optional[Tuple[int, int]]:
+
+    with open(path, 'rb') as f:
+        header = f.read(24)
+    if header[:8] != b'\x89PNG\r\n\x1a\n':
+        return None
+    return struct.unpack('>II', header[16:24])
+
+# fit an image inside a box keeping its aspect ratio, returns (w, h)
+
+def _fit(path: str, max_w: float, max_h: float) -> Tuple[float, float]:
+
+    size = _png_size(path)
+    if not size:
+        return max_w, 0
+    ratio = size[1] / size[0]
+    w = max_w
+    h = w * ratio
+    if h > max_h:
+        h = max_h
+        w = h / ratio
+    return w, h
+
+
+class PDFReportBuilder:
+
+    # assemble summary, KPI table and graphs in a single PDF document
+
+    def __init__(self, results: Dict[str, Any], graphs: List[Tuple[str, str]], summary: str):
+
+        self.results = results
+        self.graphs = graphs
+        self.summary = summary
+
+    # pages are produced lazily, one callable per page
+
+    def iter_pages(self) -> Iterator[Callable[[Any], None]]:
+
+        yield self._summary_page
+        yield self._kpi_page
+        if self.graphs:
+            yield self._overview_page
+            for title, path in self.graphs:
+                yield lambda pdf, title=title, path=path: self._graph_page(pdf, title, path)
+
+    def _title(self, pdf, text: str):
+
+        from fpdf.enums import XPos, YPos
+
+        pdf.set_font('Helvetica', 'B', 16)
+        pdf.cell(0, 10, _latin1(text), new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+        pdf.ln(4)
+
+    # page 1: text summary (same content as the WhatsApp message)
+
+    def _summary_page(self, pdf):
+
+        self._title(pdf, 'Reporte de análisis de ventas')
+        pdf.set_font('Helvetica', '', 11)
+        lines = [_latin1(line) for line in self.summary.splitlines()]
+        pdf.multi_cell(0, 6, '\n'.join(lines))
+
+    # page 2: KPI table
+
+    def _kpi_page(self, pdf):
+
+        from fpdf.enums import XPos, YPos
+
+        metrics = self.results['summary_metrics']
+        rows = [
+            ('Clientes únicos', f"{metrics['unique_clients']:,}"),
+            ('Total de ventas', f"{metrics['total_sales']:,}"),
+            ('Ventas sin IGV', f"S/ {metrics['total_sales_without_igv']:,.2f}"),
+            ('Ventas con IGV', f"S/ {metrics['total_sales_with_igv']:,.2f}"),
+            ('IGV recaudado', f"S/ {metrics['total_igv_collected']:,.2f}"),
+            ('Venta promedio', f"S/ {metrics['average_sales_without_igv']:,.2f}"),
+            ('Venta máxima', f"S/ {metrics['max_sale_without_igv']:,.2f}"),
+            ('Venta mínima', f"S/ {metrics['min_sale_without_igv']:,.2f}"),
+        ]
+
+        self._title(pdf, 'Métricas clave')
+        col_w = (PAGE_WIDTH - 2 * MARGIN) / 2
+        pdf.set_font('Helvetica', 'B', 11)
+        pdf.set_fill_color(46, 134, 171)
+        pdf.set_text_color(255, 255, 255)
+        pdf.cell(col_w, 8, 'Indicador', border=1, fill=True)
+        pdf.cell(col_w, 8, 'Valor', border=1, fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        pdf.set_font('Helvetica', '', 11)
+        pdf.set_text_color(0, 0, 0)
+        for i, (label, value) in enumerate(rows):
+            fill = i % 2 == 1
+            pdf.set_fill_color(235, 242, 247)
+            pdf.cell(col_w, 8, _latin1(label), border=1, fill=fill)
+            pdf.cell(col_w, 8, _latin1(value), border=1, fill=fill, align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    # page 3: thumbnails of every graph (same image objects as the detail pages)
+
+    def _overview_page(self, pdf):
+
+        self._title(pdf, 'Resumen gráfico')
+        cols = 2
+        cell_w = (PAGE_WIDTH - 2 * MARGIN) / cols
+        cell_h = 75
+        top = pdf.get_y()
+        pdf.set_font('Helvetica', '', 9)
+        for idx, (title, path) in enumerate(self.graphs):
+            row, col = divmod(idx, cols)
+            x = MARGIN + col * cell_w
+            y = top + row * cell_h
+            w, h = _fit(path, cell_w - 6, cell_h - 12)
+            pdf.set_xy(x, y)
+            pdf.cell(cell_w, 5, _latin1(title), align='C')
+            pdf.image(path, x=x + (cell_w - w) / 2, y=y + 6, w=w, h=h)
+
+    # one page per graph
+
+    def _graph_page(self, pdf, title: str, path: str):
+
+        self._title(pdf, title)
+        w, h = _fit(path, PAGE_WIDTH - 2 * MARGIN, PAGE_HEIGHT - pdf.get_y() - MARGIN)
+        pdf.image(path, x=(PAGE_WIDTH - w) / 2, y=pdf.get_y(), w=w, h=h)
+
+    # render all pages and write the file, returns build stats
+
+    def build(self, output_path: str = DEFAULT_PDF_PATH) -> Dict[str, Any]:
+
+        from fpdf import FPDF
+
+        start = time.perf_counter()
+        pdf = FPDF(orientation='P', unit='mm', format='A4')
+        pdf.set_auto_page_break(auto=True, margin=MARGIN)
+        pdf.set_margins(MARGIN, MARGIN, MARGIN)
+        pdf.set_title('Reporte de análisis de ventas')
+
+        pages = 0
+        for render_page in self.iter_pages():
+            pdf.add_page()
+            render_page(pdf)
+            pages += 1
+
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        pdf.output(output_path)
+
+        stats = {
+            'path': output_path,
+            'pages': pages,
+            'images': len(self.graphs),
+            'size_bytes': os.path.getsize(output_path),
+            'build_seconds': round(time.perf_counter() - start, 3),
+        }
+        logger.info(f"Reporte PDF generado: {output_path} ({stats['pages']} páginas, "
+                    f"{stats['size_bytes'] / 1024:,.1f} KB, {stats['build_seconds']:.2f} s)")
+        return stats
+
+# aux function for direct use
+
+def build_pdf_report(results: Dict[str, Any], graphs_dir: Optional[str] = os.path.join('outputs', 'graphs'),
+                     output_path: str = DEFAULT_PDF_PATH, summary: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the PDF report from the analysis results and the rendered graphs.
+
+    Each graph is embedded once and referenced by both the overview page and its own page.
+    graphs_dir=None builds a text-only report.
+    Returns: {'path', 'pages', 'images', 'size_bytes', 'build_seconds'}
+    """
+    from utils.whatsapp_sender import get_whatsapp_sender
+
+    sender = get_whatsapp_sender()
+    if summary is None:
+        summary = sender.format_summary(results)
+    graphs = sender.graphs_in_order(graphs_dir) if graphs_dir and os.path.isdir(graphs_dir) else []
+
+    return PDFReportBuilder(results, graphs, summary).build(output_path)
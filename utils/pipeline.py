@@ -0,0 +1,240 @@
+"""
+Dependency-aware stage runner.
+
+Each stage declares the values it reads (inputs) and the values it produces
+(outputs). A stage is started as soon as all of its inputs exist, so
+independent stages run concurrently and the wall-clock time approaches the
+critical path (the longest chain of dependent stages).
+
+    pipeline = Pipeline([
+        Stage('load', load, outputs=['df']),
+        Stage('analyze', analyze, inputs=['df'], outputs=['results']),
+        Stage('render', render, inputs=['results'], outputs=['graphs']),
+        Stage('format', format_summary, inputs=['results'], outputs=['summary']),
+        Stage('send', send, inputs=['summary', 'graphs'], outputs=['sent']),
+    ])
+    values = pipeline.run()
+
+With a CheckpointStore, the outputs of stages declared with checkpoint=True
+are saved after they succeed, and `run(resume=True)` / `run(from_stage=...)`
+restores them instead of running the stages again.
+"""
+
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.profiling import step
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+
+    # a required stage failed (or the graph cannot make progress)
+
+    def __init__(self, stage: str, error: Any):
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+
+    """
+    One unit of work. `func` receives the inputs as keyword arguments and
+    returns the single output, a tuple for several outputs, or nothing.
+    A failing optional stage (required=False) is logged and its outputs are
+    set to None so the stages that depend on it still run.
+    checkpoint=True persists the outputs (except `transient` ones, such as
+    live objects, which are restored as None) for resumed runs.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], inputs: Sequence[str] = (),
+                 outputs: Sequence[str] = (), required: bool = True, checkpoint: bool = False,
+                 transient: Sequence[str] = ()):
+
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.required = required
+        self.checkpoint = checkpoint
+        self.transient = set(transient)
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+
+class Pipeline:
+
+    def __init__(self, stages: Sequence[Stage], max_workers: Optional[int] = None, checkpoints=None):
+
+        self.stages = list(stages)
+        self.checkpoints = checkpoints
+        self.max_workers = max_workers or max(1, len(self.stages))
+        self.producers: Dict[str, Stage] = {}
+        names = set()
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Etapa duplicada: {stage.name}")
+            names.add(stage.name)
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"'{output}' lo producen '{self.producers[output].name}' y '{stage.name}'")
+                self.producers[output] = stage
+        # {stage: {'start', 'end', 'seconds', 'ok', 'restored'}} of the last run, relative to its start
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+    def _call(self, stage: Stage, kwargs: Dict[str, Any], origin: float) -> Dict[str, Any]:
+
+        start = time.perf_counter()
+        ok = False
+        try:
+            with step(stage.name, stage=True):
+                result = stage.func(**kwargs)
+                if not stage.outputs:
+                    outputs = {}
+                elif len(stage.outputs) == 1:
+                    outputs = {stage.outputs[0]: result}
+                else:
+                    outputs = dict(zip(stage.outputs, result))
+                if stage.checkpoint and self.checkpoints is not None:
+                    self.checkpoints.save(stage.name, {k: None if k in stage.transient else v for k, v in outputs.items()})
+            ok = True
+        finally:
+            end = time.perf_counter()
+            self.timings[stage.name] = {'start': start - origin, 'end': end - origin, 'seconds': end - start,
+                                        'ok': ok, 'restored': False}
+        return outputs
+
+    # restore `stage` from its checkpoint when allowed, otherwise run it: (outputs, restored)
+
+    def _run_stage(self, stage: Stage, kwargs: Dict[str, Any], origin: float, restore: bool) -> Tuple[Dict[str, Any], bool]:
+
+        if restore:
+            start = time.perf_counter()
+            outputs = self.checkpoints.load(stage.name)
+            if outputs is not None:
+                end = time.perf_counter()
+                self.timings[stage.name] = {'start': start - origin, 'end': end - origin, 'seconds': end - start,
+                                            'ok': True, 'restored': True}
+                logger.info(f"Etapa '{stage.name}' restaurada desde checkpoint.")
+                return outputs, True
+            logger.info(f"Sin checkpoint válido para '{stage.name}': se ejecuta.")
+        return self._call(stage, kwargs, origin), False
+
+    # stages that depend (directly or not) on `name`, itself included
+
+    def downstream(self, name: str) -> List[str]:
+
+        if name not in {s.name for s in self.stages}:
+            raise ValueError(f"Etapa desconocida: {name} (etapas: {', '.join(s.name for s in self.stages)})")
+        found = {name}
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages:
+                if stage.name not in found and any(i in self.producers and self.producers[i].name in found for i in stage.inputs):
+                    found.add(stage.name)
+                    changed = True
+        return [s.name for s in self.stages if s.name in found]
+
+    # whether `stage` may be restored instead of run
+
+    def _restorable(self, stage: Stage, forced: set, restored: set) -> bool:
+
+        if not stage.checkpoint or self.checkpoints is None or stage.name in forced:
+            return False
+        # a checkpointed producer that ran again may have produced something else
+        return all(self.producers[i].name in restored for i in stage.inputs
+                   if i in self.producers and self.producers[i].checkpoint)
+
+    def run(self, context: Optional[Dict[str, Any]] = None, resume: bool = False,
+            from_stage: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run every stage; `context` holds values that no stage produces. Returns all values.
+        resume: restore every stage with a valid checkpoint. from_stage: run that stage and
+        everything downstream of it, restoring the stages before it.
+        """
+        values: Dict[str, Any] = dict(context or {})
+        pending = list(self.stages)
+        running = {}
+        self.timings = {}
+        origin = time.perf_counter()
+        if from_stage is not None:
+            forced = set(self.downstream(from_stage))
+        elif resume:
+            forced = set()
+        else:
+            forced = {s.name for s in self.stages}
+        restored: set = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage') as pool:
+            try:
+                while pending or running:
+                    for stage in [s for s in pending if all(i in values for i in s.inputs)]:
+                        pending.remove(stage)
+                        kwargs = {i: values[i] for i in stage.inputs}
+                        restore = self._restorable(stage, forced, restored)
+                        running[pool.submit(self._run_stage, stage, kwargs, origin, restore)] = stage
+                        logger.debug(f"Etapa iniciada: {stage.name}")
+
+                    if not running:
+                        missing = sorted({i for s in pending for i in s.inputs if i not in values})
+                        raise PipelineError(pending[0].name, f"entradas no disponibles: {', '.join(missing)}")
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = running.pop(future)
+                        try:
+                            outputs, was_restored = future.result()
+                            values.update(outputs)
+                            if was_restored:
+                                restored.add(stage.name)
+                        except Exception as e:
+                            if stage.required:
+                                raise PipelineError(stage.name, e) from e
+                            logger.warning(f"Etapa opcional '{stage.name}' falló: {e}")
+                            values.update(dict.fromkeys(stage.outputs))
+            except BaseException:
+                # do not start anything else; stages already running finish on shutdown
+                for future in running:
+                    future.cancel()
+                raise
+        return values
+
+    def critical_path(self) -> Tuple[float, List[str]]:
+        """Longest chain of dependent stages in the last run: (seconds, [stage names])."""
+        best: Dict[str, Tuple[float, List[str]]] = {}
+
+        def longest(stage: Stage) -> Tuple[float, List[str]]:
+            if stage.name not in best:
+                chain = (0.0, [])
+                for producer in {self.producers[i].name: self.producers[i] for i in stage.inputs if i in self.producers}.values():
+                    candidate = longest(producer)
+                    if candidate[0] > chain[0]:
+                        chain = candidate
+                own = self.timings.get(stage.name, {}).get('seconds', 0.0)
+                best[stage.name] = (chain[0] + own, chain[1] + [stage.name])
+            return best[stage.name]
+
+        return max((longest(s) for s in self.stages), default=(0.0, []), key=lambda c: c[0])
+
+    # one line per stage (start/end offsets) plus wall-clock vs critical path
+
+    def summary(self) -> str:
+
+        lines = []
+        for stage in sorted(self.stages, key=lambda s: self.timings.get(s.name, {}).get('start', float('inf'))):
+            t = self.timings.get(stage.name)
+            if t is None:
+                lines.append(f"  {stage.name:<16} no ejecutada")
+            else:
+                status = '  (checkpoint)' if t.get('restored') else ('' if t['ok'] else '  (error)')
+                lines.append(f"  {stage.name:<16} {t['start']:7.2f} s -> {t['end']:7.2f} s  ({t['seconds']:.2f} s){status}")
+        wall = max((t['end'] for t in self.timings.values()), default=0.0)
+        seconds, chain = self.critical_path()
+        lines.append(f"  Total: {wall:.2f} s  ruta crítica: {seconds:.2f} s ({' -> '.join(chain)})")
+        return "\n".join(lines)
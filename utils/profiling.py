@@ -0,0 +1,254 @@
+"""
+Run instrumentation: wall time, CPU time and RSS per pipeline stage and
+sub-step, written as a JSON run report.
+
+Memory per step is the change of the current RSS over the step
+(rss_delta_mb; process-wide, so concurrent stages show up in each other's
+numbers) and the process high-water mark when the step ended
+(process_peak_rss_mb; it only ever rises, so it is not a per-step peak).
+
+Instrumented code calls `step(name)`; it is a no-op unless a run is active
+(`start_run()` ... `finish_run()`), so library use of the modules is not
+affected. Sub-steps are named after their parents in the same thread
+("graficas/create_top_models_graph") and aggregated by name (a broadcast
+records thousands of "twilio_submit" steps as one entry).
+
+With profiling enabled (`python main.py --profile`):
+  - tracemalloc records the memory each step leaves allocated (net_alloc_kb)
+    and the top allocation sites of every pipeline stage. Both are
+    process-wide, so concurrent stages show up in each other's numbers, and a
+    stage snapshot diff costs a few seconds once pandas / matplotlib are loaded;
+  - every pipeline stage is run under cProfile and dumped to
+    outputs/profile/<stage>.prof (open with `python -m pstats` or snakeviz).
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_PATH = os.path.join('outputs', 'run_report.json')
+DEFAULT_PROFILE_DIR = os.path.join('outputs', 'profile')
+
+# peak resident set size of the process so far, in MB (None if it cannot be measured)
+
+def peak_rss_mb() -> Optional[float]:
+
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+# current resident set size of the process in MB (None if it cannot be measured)
+
+def current_rss_mb() -> Optional[float]:
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+class RunProfiler:
+
+    # collects the steps of one run; thread-safe (pipeline stages run concurrently)
+
+    def __init__(self, trace_allocations: bool = False, cprofile_dir: Optional[str] = None, top: Optional[int] = None):
+
+        self.trace_allocations = trace_allocations
+        self.cprofile_dir = cprofile_dir
+        self.top = top if top is not None else int(os.getenv('PROFILE_TOP_ALLOCATIONS', '10'))
+        self.started_at = datetime.now()
+        self._origin = time.perf_counter()
+        self._cpu_origin = time.process_time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stages: List[Dict[str, Any]] = []
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.notes: Dict[str, Any] = {}
+        self._started_tracing = False
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '1')))
+            self._started_tracing = True
+        if cprofile_dir:
+            os.makedirs(cprofile_dir, exist_ok=True)
+
+    def _top_allocations(self, before) -> List[Dict[str, Any]]:
+
+        # filtering the stats is much cheaper than Snapshot.filter_traces on ~1e6 traces
+        diff = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+        top: List[Dict[str, Any]] = []
+        for stat in diff:
+            if len(top) >= self.top:
+                break
+            frame = stat.traceback[0]
+            # sorted by absolute difference: skip what the stage freed
+            if stat.size_diff <= 0 or frame.filename == tracemalloc.__file__ or frame.filename.startswith('<frozen importlib'):
+                continue
+            top.append({'where': f"{frame.filename}:{frame.lineno}", 'size_kb': round(stat.size_diff / 1024, 1),
+                        'count': stat.count_diff})
+        return top
+
+    @contextmanager
+    def step(self, name: str, stage: bool = False) -> Iterator[None]:
+
+        stack = self._local.__dict__.setdefault('stack', [])
+        full_name = '/'.join(stack + [name])
+
+        tracing = self.trace_allocations and tracemalloc.is_tracing()
+        snapshot = tracemalloc.take_snapshot() if tracing and stage and self.top else None
+        traced_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+
+        # cProfile is per thread; only whole stages (never nested in this thread) are profiled
+        profiler = None
+        if stage and self.cprofile_dir and not stack:
+            import cProfile
+            profiler = cProfile.Profile()
+
+        stack.append(name)
+        ok = False
+        rss_start = current_rss_mb()
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+            ok = True
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+            stack.pop()
+            rss_end = current_rss_mb()
+            record = {'name': full_name, 'start': round(start - self._origin, 4), 'wall_seconds': round(wall, 4),
+                      'cpu_seconds': round(cpu, 4),
+                      'rss_delta_mb': round(rss_end - rss_start, 2) if rss_end is not None and rss_start is not None else None,
+                      'process_peak_rss_mb': peak_rss_mb(), 'ok': ok, 'thread': threading.current_thread().name}
+            if tracing:
+                record['net_alloc_kb'] = round((tracemalloc.get_traced_memory()[0] - traced_start) / 1024, 1)
+            if snapshot is not None:
+                record['top_allocations'] = self._top_allocations(snapshot)
+            if profiler is not None:
+                path = os.path.join(self.cprofile_dir, re.sub(r'[^\w\-]+', '_', full_name) + '.prof')
+                profiler.dump_stats(path)
+                record['cprofile'] = path
+            self._record(record, stage)
+
+    def _record(self, record: Dict[str, Any], stage: bool):
+
+        with self._lock:
+            if stage:
+                self.stages.append(record)
+            entry = self.steps.get(record['name'])
+            if entry is None:
+                entry = self.steps[record['name']] = {'count': 0, 'errors': 0, 'wall_seconds': 0.0, 'wall_max': 0.0,
+                                                      'cpu_seconds': 0.0, 'rss_delta_mb_max': None,
+                                                      'process_peak_rss_mb': None}
+            entry['count'] += 1
+            entry['errors'] += 0 if record['ok'] else 1
+            entry['wall_seconds'] = round(entry['wall_seconds'] + record['wall_seconds'], 4)
+            entry['wall_max'] = max(entry['wall_max'], record['wall_seconds'])
+            entry['cpu_seconds'] = round(entry['cpu_seconds'] + record['cpu_seconds'], 4)
+            if record['rss_delta_mb'] is not None:
+                previous = entry['rss_delta_mb_max']
+                entry['rss_delta_mb_max'] = record['rss_delta_mb'] if previous is None else max(previous, record['rss_delta_mb'])
+            if record['process_peak_rss_mb'] is not None:
+                entry['process_peak_rss_mb'] = max(entry['process_peak_rss_mb'] or 0.0, record['process_peak_rss_mb'])
+            if 'net_alloc_kb' in record:
+                entry['net_alloc_kb'] = round(entry.get('net_alloc_kb', 0.0) + record['net_alloc_kb'], 1)
+            if 'top_allocations' in record:
+                entry['top_allocations'] = record['top_allocations']
+
+    def report(self, **extra) -> Dict[str, Any]:
+
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'argv': sys.argv[1:],
+                'python': sys.version.split()[0],
+                'wall_seconds': round(time.perf_counter() - self._origin, 4),
+                'cpu_seconds': round(time.process_time() - self._cpu_origin, 4),
+                'peak_rss_mb': peak_rss_mb(),
+                'profiled': bool(self.trace_allocations or self.cprofile_dir),
+                **self.notes,
+                **extra,
+                'stages': sorted(self.stages, key=lambda r: r['start']),
+                'steps': dict(sorted(self.steps.items())),
+            }
+
+    def close(self):
+
+        if self._started_tracing:
+            tracemalloc.stop()
+
+# the run being recorded (None outside instrumented runs)
+_active: Optional[RunProfiler] = None
+
+def start_run(profile: bool = False, cprofile_dir: Optional[str] = DEFAULT_PROFILE_DIR) -> RunProfiler:
+    """Start recording steps; `profile` adds tracemalloc and per-stage cProfile dumps."""
+    global _active
+    _active = RunProfiler(trace_allocations=profile, cprofile_dir=cprofile_dir if profile else None)
+    return _active
+
+def finish_run(path: Optional[str] = None, **extra) -> Optional[str]:
+    """Stop recording and write the JSON run report; returns its path."""
+    global _active
+    run, _active = _active, None
+    if run is None:
+        return None
+    run.close()
+    path = path or os.getenv('RUN_REPORT_PATH', '').strip() or DEFAULT_REPORT_PATH
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(run.report(**extra), f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+# aux function for instrumented code: record `name` if a run is active, otherwise do nothing
+
+@contextmanager
+def step(name: str, stage: bool = False) -> Iterator[None]:
+
+    run = _active
+    if run is None:
+        yield
+        return
+    with run.step(name, stage=stage):
+        yield
+
+# aux function for instrumented code: add a top-level entry to the run report (no-op outside a run)
+
+def annotate(key: str, value: Any):
+
+    run = _active
+    if run is not None:
+        with run._lock:
+            run.notes[key] = value
@@ -0,0 +1,261 @@
+"""
+Twilio daily-quota accounting and circuit breaker.
+
+The ledger counts accepted messages in a rolling 24 h window (persisted in
+SQLite, shared by every sender instance and process). The breaker opens when
+the configured quota is used up, when Twilio answers 63038, or after
+repeated transient failures; while open, sends are refused before any
+network call and the caller falls back to the simulation sink. Once the
+window resets (or the failure cool-down ends) a single half-open probe is let
+through; its outcome closes or re-opens the breaker.
+
+Usage:
+    python -m utils.quota_guard status
+    python -m utils.quota_guard reset
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GUARD_PATH = os.path.join('outputs', 'twilio_quota.db')
+
+WINDOW_SECONDS = 24 * 3600
+
+# breaker states
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class QuotaLedger:
+
+    # accepted messages per rolling 24 h window, against TWILIO_DAILY_LIMIT (0 = unknown limit)
+
+    def __init__(self, path: Optional[str] = None, daily_limit: Optional[int] = None):
+
+        self.path = path or os.getenv('TWILIO_QUOTA_DB_PATH', '').strip() or DEFAULT_GUARD_PATH
+        self.daily_limit = daily_limit if daily_limit is not None else int(os.getenv('TWILIO_DAILY_LIMIT', '0'))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sends (ts REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sends_ts ON sends(ts)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS breaker (
+                    name TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    failures INTEGER DEFAULT 0,
+                    open_until REAL DEFAULT 0,
+                    probe_until REAL DEFAULT 0,
+                    reason TEXT
+                )""")
+
+    def _connect(self) -> sqlite3.Connection:
+
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # count a send before it goes out (concurrent senders cannot overshoot the limit); returns the slot id
+
+    def reserve(self, conn: Optional[sqlite3.Connection] = None) -> int:
+
+        now = time.time()
+        if conn is None:
+            with self._connect() as own:
+                return self.reserve(own)
+        slot = conn.execute("INSERT INTO sends (ts) VALUES (?)", (now,)).lastrowid
+        # the ledger only needs the current window
+        conn.execute("DELETE FROM sends WHERE ts < ?", (now - 2 * WINDOW_SECONDS,))
+        return slot
+
+    # give back the slot of a message Twilio did not accept
+
+    def cancel(self, slot: int):
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sends WHERE rowid = ?", (slot,))
+
+    def used(self, conn: Optional[sqlite3.Connection] = None) -> int:
+
+        if conn is None:
+            with self._connect() as own:
+                return self.used(own)
+        return conn.execute("SELECT COUNT(*) FROM sends WHERE ts > ?", (time.time() - WINDOW_SECONDS,)).fetchone()[0]
+
+    def remaining(self, conn: Optional[sqlite3.Connection] = None) -> Optional[int]:
+
+        if not self.daily_limit:
+            return None
+        return max(0, self.daily_limit - self.used(conn))
+
+    # when the window frees a slot again: oldest counted send + 24 h (now + 24 h if none is recorded)
+
+    def window_reset_at(self) -> float:
+
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT ts FROM sends WHERE ts > ? ORDER BY ts LIMIT 1 OFFSET ?",
+                               (now - WINDOW_SECONDS, max(0, self.used() - self.daily_limit) if self.daily_limit else 0)).fetchone()
+        return (row[0] + WINDOW_SECONDS) if row else now + WINDOW_SECONDS
+
+
+class CircuitBreaker:
+
+    # persisted breaker shared by every WhatsAppSender (and process) using the same ledger file
+
+    def __init__(self, ledger: QuotaLedger, name: str = 'twilio', failure_threshold: Optional[int] = None,
+                 reset_timeout: Optional[float] = None, probe_timeout: float = 60.0):
+
+        self.ledger = ledger
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv('TWILIO_BREAKER_FAILURES', '5'))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(os.getenv('TWILIO_BREAKER_RESET', '60'))
+        self.probe_timeout = probe_timeout
+        with self.ledger._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO breaker (name, state) VALUES (?, ?)", (name, CLOSED))
+
+    def _read(self, conn) -> Dict[str, Any]:
+
+        row = conn.execute("SELECT state, failures, open_until, probe_until, reason FROM breaker WHERE name = ?",
+                           (self.name,)).fetchone()
+        return {'state': row[0], 'failures': row[1], 'open_until': row[2], 'probe_until': row[3], 'reason': row[4]}
+
+    def _open(self, conn, until: float, reason: str):
+
+        conn.execute("UPDATE breaker SET state = ?, open_until = ?, probe_until = 0, reason = ? WHERE name = ?",
+                     (OPEN, until, reason, self.name))
+        logger.warning(f"Circuito de Twilio abierto hasta {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(until))}: {reason}")
+
+    # reserve a quota slot for one send; None means: do not touch the network, use the fallback
+    # the slot must be settled with record_success / record_failure / record_daily_limit / release
+
+    def acquire(self) -> Optional[int]:
+
+        now = time.time()
+        conn = self.ledger._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            state = self._read(conn)
+            allowed = True
+            if state['state'] == CLOSED:
+                # proactive: the configured quota is used up before Twilio has to tell us
+                remaining = self.ledger.remaining(conn)
+                if remaining is not None and remaining <= 0:
+                    self._open(conn, self.ledger.window_reset_at(), f"cuota diaria agotada ({self.ledger.daily_limit} mensajes/24 h)")
+                    allowed = False
+            elif now < state['open_until']:
+                allowed = False
+            elif state['state'] == HALF_OPEN and now < state['probe_until']:
+                # another caller is already probing
+                allowed = False
+            else:
+                # window / cool-down is over: let exactly one probe through
+                conn.execute("UPDATE breaker SET state = ?, probe_until = ? WHERE name = ?",
+                             (HALF_OPEN, now + self.probe_timeout, self.name))
+                logger.info("Circuito de Twilio semiabierto: enviando mensaje de prueba.")
+            slot = self.ledger.reserve(conn) if allowed else None
+            conn.execute("COMMIT")
+            return slot
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # epoch seconds when sends may be attempted again (0 if closed)
+
+    def retry_at(self) -> float:
+
+        with self.ledger._connect() as conn:
+            state = self._read(conn)
+        if state['state'] == CLOSED:
+            return 0.0
+        return max(state['open_until'], state['probe_until'])
+
+    # the message was accepted: its slot stays counted
+
+    def record_success(self, slot: Optional[int] = None):
+
+        with self.ledger._connect() as conn:
+            state = self._read(conn)
+            if state['state'] != CLOSED or state['failures']:
+                conn.execute("UPDATE breaker SET state = ?, failures = 0, open_until = 0, probe_until = 0, reason = NULL "
+                             "WHERE name = ?", (CLOSED, self.name))
+                if state['state'] != CLOSED:
+                    logger.info("Circuito de Twilio cerrado: envíos restablecidos.")
+
+    # transient failure (5xx, network; throttling 429 is not counted): open after `failure_threshold` in a row, or if the probe failed
+
+    def record_failure(self, slot: Optional[int] = None, reason: str = 'fallos consecutivos'):
+
+        self.release(slot)
+        with self.ledger._connect() as conn:
+            state = self._read(conn)
+            failures = state['failures'] + 1
+            conn.execute("UPDATE breaker SET failures = ? WHERE name = ?", (failures, self.name))
+            if state['state'] == HALF_OPEN or failures >= self.failure_threshold:
+                self._open(conn, time.time() + self.reset_timeout, f"{reason} ({failures})")
+
+    # Twilio answered 63038: no probe until the rolling window frees a slot
+
+    def record_daily_limit(self, slot: Optional[int] = None):
+
+        self.release(slot)
+        with self.ledger._connect() as conn:
+            self._open(conn, self.ledger.window_reset_at(), "Twilio 63038: límite diario de mensajes excedido")
+
+    # the send did not reach Twilio's quota (rejected request, not a service failure)
+
+    def release(self, slot: Optional[int] = None):
+
+        if slot is not None:
+            self.ledger.cancel(slot)
+
+    def reset(self):
+
+        with self.ledger._connect() as conn:
+            conn.execute("UPDATE breaker SET state = ?, failures = 0, open_until = 0, probe_until = 0, reason = NULL "
+                         "WHERE name = ?", (CLOSED, self.name))
+
+    def status(self) -> Dict[str, Any]:
+
+        with self.ledger._connect() as conn:
+            state = self._read(conn)
+        state.update(used_24h=self.ledger.used(), daily_limit=self.ledger.daily_limit or None,
+                     remaining=self.ledger.remaining())
+        return state
+
+# aux function for direct use: breaker over the default ledger (None if disabled with TWILIO_QUOTA_GUARD=false)
+
+def get_circuit_breaker() -> Optional[CircuitBreaker]:
+
+    if os.getenv('TWILIO_QUOTA_GUARD', 'true').strip().lower() not in {'1', 'true', 'yes', 'y'}:
+        return None
+    return CircuitBreaker(QuotaLedger())
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Cuota diaria y circuit breaker de Twilio")
+    parser.add_argument('command', choices=['status', 'reset'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        if os.path.exists('whatsapp_config.env'):
+            load_dotenv('whatsapp_config.env', override=True)
+    except ImportError:
+        pass
+
+    breaker = CircuitBreaker(QuotaLedger())
+    if args.command == 'reset':
+        breaker.reset()
+    print(breaker.status())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+
+    # thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor que 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # take one token without waiting; False if none is available
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    # wait until a token is available (or timeout); returns False on timeout / cancel
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None,
+                cancel: Optional[threading.Event] = None) -> bool:
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            if cancel is not None:
+                if cancel.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
@@ -0,0 +1,252 @@
+"""
+Resident report scheduler (daemon mode).
+
+The process stays up between runs, so imports (pandas, matplotlib, twilio),
+the shared WhatsApp sender with its Twilio client, the upload cache and the
+parsed workbook / aggregates stay warm; a run only redoes what changed.
+
+Schedule specs (REPORT_SCHEDULE / --schedule, separated by ';' or ','):
+
+    08:00               every day at 08:00
+    monday@09:30        every Monday at 09:30 (Spanish day names also work: lunes@09:30)
+    every 30m           every 30 minutes (also: every 2h)
+
+Runs never overlap: a trigger that fires while a run is in progress is
+coalesced into a single re-run after it. The time of the last run is stored
+in outputs/scheduler_state.json; on start, a scheduled run missed within the
+last SCHEDULE_CATCHUP_HOURS (default 24) is run once. SIGINT / SIGTERM stop
+the loop and wait for the current run to finish.
+"""
+
+import json
+import os
+import re
+import signal
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_PATH = os.path.join('outputs', 'scheduler_state.json')
+
+_WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+_WEEKDAY_ALIASES = {'lunes': 'monday', 'martes': 'tuesday', 'miercoles': 'wednesday', 'miércoles': 'wednesday',
+                    'jueves': 'thursday', 'viernes': 'friday', 'sabado': 'saturday', 'sábado': 'saturday',
+                    'domingo': 'sunday'}
+
+_AT_RE = re.compile(r'^(?:(?P<day>[^\s@]+)@)?(?P<hour>\d{1,2}):(?P<minute>\d{2})$')
+_EVERY_RE = re.compile(r'^every\s+(?P<count>\d+)\s*(?P<unit>[mh])$')
+
+
+class ScheduleSpec:
+
+    # one parsed trigger: a daily / weekly time of day, or a fixed interval
+
+    def __init__(self, text: str):
+
+        self.text = text.strip()
+        spec = self.text.lower()
+        self.weekday: Optional[str] = None
+        self.at: Optional[str] = None
+        self.interval: Optional[timedelta] = None
+
+        match = _AT_RE.match(spec)
+        if match:
+            hour, minute = int(match['hour']), int(match['minute'])
+            if hour > 23 or minute > 59:
+                raise ValueError(f"Hora inválida en la programación: {text}")
+            self.at = f"{hour:02d}:{minute:02d}"
+            day = match['day']
+            if day:
+                day = _WEEKDAY_ALIASES.get(day, day)
+                if day not in _WEEKDAYS:
+                    raise ValueError(f"Día inválido en la programación: {text}")
+                self.weekday = day
+            return
+        match = _EVERY_RE.match(spec)
+        if match and int(match['count']) > 0:
+            count = int(match['count'])
+            self.interval = timedelta(minutes=count) if match['unit'] == 'm' else timedelta(hours=count)
+            return
+        raise ValueError(f"Programación no reconocida: {text} (ejemplos: 08:00, lunes@09:30, every 30m)")
+
+    # register the trigger on a schedule.Scheduler
+
+    def register(self, scheduler, func: Callable[[], Any]):
+
+        if self.interval is not None:
+            return scheduler.every(int(self.interval.total_seconds())).seconds.do(func)
+        if self.weekday is not None:
+            return getattr(scheduler.every(), self.weekday).at(self.at).do(func)
+        return scheduler.every().day.at(self.at).do(func)
+
+    # latest time this trigger was due at or before `now` (interval triggers count from the last run)
+
+    def previous_due(self, now: datetime, last_run: Optional[datetime]) -> Optional[datetime]:
+
+        if self.interval is not None:
+            return last_run + self.interval if last_run else None
+        hour, minute = map(int, self.at.split(':'))
+        due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if self.weekday is not None:
+            due -= timedelta(days=(now.weekday() - _WEEKDAYS.index(self.weekday)) % 7)
+            if due > now:
+                due -= timedelta(days=7)
+        elif due > now:
+            due -= timedelta(days=1)
+        return due
+
+    def __repr__(self) -> str:
+        return f"ScheduleSpec({self.text!r})"
+
+def parse_schedule(text: str) -> List[ScheduleSpec]:
+
+    return [ScheduleSpec(part) for part in re.split(r'[;,]', text or '') if part.strip()]
+
+
+class ReportDaemon:
+
+    """
+    Runs `job` on every trigger of `specs` until stopped. The job runs in a
+    worker thread so the scheduler loop stays responsive to signals; at most
+    one run is in progress and at most one more is queued behind it.
+    """
+
+    def __init__(self, job: Callable[[], Any], specs: List[ScheduleSpec], name: str = 'reporte',
+                 state_path: Optional[str] = None, catchup_hours: Optional[float] = None):
+
+        import schedule
+
+        if not specs:
+            raise ValueError("No hay horarios configurados (REPORT_SCHEDULE / --schedule).")
+        self.job = job
+        self.specs = specs
+        self.name = name
+        self.state_path = state_path or os.getenv('SCHEDULER_STATE_PATH', '').strip() or DEFAULT_STATE_PATH
+        self.catchup = timedelta(hours=catchup_hours if catchup_hours is not None
+                                 else float(os.getenv('SCHEDULE_CATCHUP_HOURS', '24')))
+        self.scheduler = schedule.Scheduler()
+        for spec in specs:
+            spec.register(self.scheduler, self.trigger)
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = False
+        self._worker: Optional[threading.Thread] = None
+        self.runs = 0
+
+    # persisted last-run timestamps
+
+    def _load_state(self) -> Dict[str, Any]:
+
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, **values):
+
+        state = self._load_state()
+        state.setdefault(self.name, {}).update(values)
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def last_run(self) -> Optional[datetime]:
+
+        value = self._load_state().get(self.name, {}).get('last_run')
+        return datetime.fromisoformat(value) if value else None
+
+    # a run missed while the daemon was down (within the catch-up window), or None
+
+    def missed_run(self, now: Optional[datetime] = None) -> Optional[datetime]:
+
+        now = now or datetime.now()
+        last = self.last_run()
+        if last is None or not self.catchup:
+            return None
+        due = [d for d in (spec.previous_due(now, last) for spec in self.specs) if d is not None and last < d <= now]
+        latest = max(due, default=None)
+        if latest is not None and now - latest <= self.catchup:
+            return latest
+        return None
+
+    # schedule callback: start a run, or queue one behind the run in progress
+
+    def trigger(self):
+
+        with self._lock:
+            if self._stop.is_set():
+                return
+            if self._running:
+                if not self._pending:
+                    logger.warning(f"'{self.name}' sigue en ejecución; el disparo se ejecutará al terminar.")
+                self._pending = True
+                return
+            self._running = True
+        self._worker = threading.Thread(target=self._run_loop, name=f"job-{self.name}")
+        self._worker.start()
+
+    def _run_loop(self):
+
+        while True:
+            started = datetime.now()
+            logger.info(f"Ejecución de '{self.name}' iniciada.")
+            start = time.perf_counter()
+            ok = False
+            try:
+                ok = bool(self.job())
+            except Exception as e:
+                logger.error(f"Ejecución de '{self.name}' falló: {e}")
+            seconds = time.perf_counter() - start
+            self.runs += 1
+            self._save_state(last_run=started.isoformat(timespec='seconds'), last_ok=ok, last_seconds=round(seconds, 3))
+            logger.info(f"Ejecución de '{self.name}' terminada en {seconds:.2f} s ({'ok' if ok else 'con errores'}).")
+
+            with self._lock:
+                if self._pending and not self._stop.is_set():
+                    self._pending = False
+                    continue
+                self._pending = False
+                self._running = False
+                return
+
+    def stop(self, *_args):
+
+        if not self._stop.is_set():
+            logger.info("Deteniendo el programador; se espera a que termine la ejecución en curso.")
+        self._stop.set()
+
+    def run_forever(self, install_signals: bool = True):
+        """Block until stop() (or SIGINT / SIGTERM); the run in progress is allowed to finish."""
+        if install_signals and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        missed = self.missed_run()
+        if missed is not None:
+            logger.info(f"Ejecución perdida de las {missed:%Y-%m-%d %H:%M}: se ejecuta ahora.")
+            self.trigger()
+        elif self.last_run() is None:
+            # first start: nothing was missed yet, start counting from now
+            self._save_state(last_run=datetime.now().isoformat(timespec='seconds'))
+
+        logger.info(f"Programador activo ({', '.join(s.text for s in self.specs)}); próxima ejecución: "
+                    f"{self.scheduler.next_run:%Y-%m-%d %H:%M:%S}")
+        while not self._stop.is_set():
+            self.scheduler.run_pending()
+            idle = self.scheduler.idle_seconds
+            # wake up at least every 30 s (clock changes, suspend/resume)
+            self._stop.wait(timeout=min(max(idle if idle is not None else 30.0, 0.1), 30.0))
+
+        worker = self._worker
+        if worker is not None:
+            worker.join()
+        logger.info(f"Programador detenido ({self.runs} ejecuciones).")
@@ -0,0 +1,218 @@
+"""
+Structured simulation sink.
+
+Simulated sends are appended as JSON Lines records (timestamp, recipient,
+body, media, report fingerprint, reason) through a buffered writer. When the
+active file exceeds the size limit it is rotated and compressed:
+
+    outputs/simulation_log.jsonl          active file
+    outputs/simulation_log.1.jsonl.gz     most recent rotated file
+    outputs/simulation_log.N.jsonl.gz     oldest kept file
+
+A recorded stream can be pushed back through the real send path:
+
+Usage:
+    python -m utils.simulation_sink stats
+    python -m utils.simulation_sink replay --rate 2 [--to +123...] [--limit 50] [--dry-run]
+"""
+
+import argparse
+import atexit
+import gzip
+import json
+import os
+import shutil
+import threading
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SINK_PATH = os.path.join('outputs', 'simulation_log.jsonl')
+
+
+class SimulationSink:
+
+    # buffered, thread-safe JSONL writer with size-based rotation and gzip compression
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None, backups: Optional[int] = None,
+                 compress: bool = True, buffer_size: int = 64 * 1024):
+
+        self.path = path or os.getenv('SIMULATION_LOG_PATH', '').strip() or DEFAULT_SINK_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('SIMULATION_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+        self.backups = backups if backups is not None else int(os.getenv('SIMULATION_LOG_BACKUPS', '5'))
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+
+    def _open(self):
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # binary append: the position and the counted size are both in bytes
+        self._file = open(self.path, 'ab', buffering=self.buffer_size)
+        self._size = self._file.tell()
+
+    def _rotated_name(self, index: int) -> str:
+
+        base = self.path[:-len('.jsonl')] if self.path.endswith('.jsonl') else self.path
+        return f"{base}.{index}.jsonl" + ('.gz' if self.compress else '')
+
+    def _rotate(self):
+
+        self._file.close()
+        self._file = None
+        # shift older files: .1 -> .2 ... ; the oldest beyond `backups` is dropped
+        for index in range(self.backups, 0, -1):
+            source = self._rotated_name(index)
+            if os.path.exists(source):
+                if index == self.backups:
+                    os.remove(source)
+                else:
+                    os.replace(source, self._rotated_name(index + 1))
+        if self.backups > 0:
+            target = self._rotated_name(1)
+            if self.compress:
+                with open(self.path, 'rb') as src, gzip.open(target, 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, target)
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write(self, record: Dict[str, Any]):
+
+        # bodies are mostly Spanish text and emoji (ensure_ascii=False): count encoded bytes, not characters
+        line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self.max_bytes and self._size and self._size + len(line) > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._size += len(line)
+
+    def flush(self):
+
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # active + rotated files, oldest first
+
+    def files(self) -> List[str]:
+
+        rotated = [self._rotated_name(i) for i in range(self.backups, 0, -1)]
+        return [p for p in rotated + [self.path] if os.path.exists(p)]
+
+# read every record of the sink (rotated files included), oldest first
+
+def iter_records(sink: 'SimulationSink') -> Iterator[Dict[str, Any]]:
+
+    sink.flush()
+    for path in sink.files():
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def make_record(recipient: Optional[str], body: str, media: Optional[List[str]] = None,
+                reason: str = 'simulate', fingerprint: Optional[str] = None) -> Dict[str, Any]:
+
+    from utils.outbound_queue import report_fingerprint
+
+    return {
+        'ts': datetime.now(timezone.utc).isoformat(),
+        'recipient': recipient,
+        'body': body,
+        'media': media or [],
+        'fingerprint': fingerprint or report_fingerprint(body, media),
+        'reason': reason,
+    }
+
+_sink: Optional[SimulationSink] = None
+_sink_lock = threading.Lock()
+
+def get_simulation_sink() -> SimulationSink:
+    """Return the process-wide sink (flushed at exit)."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = SimulationSink()
+            atexit.register(_sink.close)
+        return _sink
+
+# push recorded messages back through the real send path at `rate` messages per second
+
+def replay(sink: SimulationSink, rate: float = 1.0, to: Optional[str] = None, limit: Optional[int] = None,
+           dry_run: bool = False) -> Dict[str, int]:
+
+    from utils.rate_limit import TokenBucket
+    from utils.whatsapp_sender import TwilioDailyLimitExceeded, get_whatsapp_sender
+
+    sender = None if dry_run else get_whatsapp_sender()
+    bucket = TokenBucket(rate, capacity=1)
+    counts = {'replayed': 0, 'failed': 0, 'skipped': 0}
+    for record in iter_records(sink):
+        if limit is not None and counts['replayed'] + counts['failed'] >= limit:
+            break
+        recipient = to or record.get('recipient')
+        if not recipient:
+            counts['skipped'] += 1
+            continue
+        bucket.acquire()
+        if dry_run:
+            logger.info(f"[dry-run] {recipient}: {len(record['body'])} caracteres, {len(record.get('media') or [])} adjuntos")
+            counts['replayed'] += 1
+            continue
+        try:
+            ok = sender.send_message(record['body'], recipient, linked_file=record.get('media') or None)
+        except TwilioDailyLimitExceeded as e:
+            logger.error(f"Reproducción detenida: {e}")
+            break
+        counts['replayed' if ok else 'failed'] += 1
+    return counts
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Bitácora JSONL de envíos simulados")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help="Archivos y cantidad de registros")
+    rep = sub.add_parser('replay', help="Reenviar los registros por el envío real")
+    rep.add_argument('--rate', type=float, default=1.0, help="Mensajes por segundo")
+    rep.add_argument('--to', default=None, help="Enviar todo a este número en lugar del destinatario registrado")
+    rep.add_argument('--limit', type=int, default=None)
+    rep.add_argument('--dry-run', action='store_true', help="No envía; sólo recorre los registros")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        if os.path.exists('whatsapp_config.env'):
+            load_dotenv('whatsapp_config.env', override=True)
+    except ImportError:
+        pass
+
+    sink = SimulationSink()
+    if args.command == 'stats':
+        for path in sink.files():
+            print(f"{path}: {os.path.getsize(path):,} bytes")
+        print(f"Registros: {sum(1 for _ in iter_records(sink))}")
+    else:
+        print(replay(sink, rate=args.rate, to=args.to, limit=args.limit, dry_run=args.dry_run))
+
+if __name__ == "__main__":
+    main()
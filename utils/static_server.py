@@ -0,0 +1,171 @@
+"""
+Minimal static file server for the generated graphs.
+
+Files are sent with socket.sendfile (os.sendfile zero-copy where the OS
+supports it), with single-range requests, ETag/Last-Modified validation and
+Cache-Control headers.
+
+Only images under the root (default outputs/graphs) are served, and the
+server binds to 127.0.0.1 unless LOCAL_STATIC_HOST / --host say otherwise:
+the rest of outputs/ holds phone numbers, message bodies and databases.
+
+Usage:
+    python -m utils.static_server --root outputs/graphs --port 8080
+"""
+
+import argparse
+import email.utils
+import mimetypes
+import os
+import re
+import threading
+import logging
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+DEFAULT_ROOT = os.path.join('outputs', 'graphs')
+DEFAULT_HOST = '127.0.0.1'
+
+# raster images only (SVG can carry scripts)
+SERVED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+
+
+class StaticFileHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'RPAStatic/1.0'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    # map the URL path to an image under the root (None if outside the root, missing or not an image)
+
+    def _resolve(self) -> Optional[str]:
+
+        root = self.server.root
+        rel = unquote(urlsplit(self.path).path).lstrip('/')
+        full = os.path.realpath(os.path.join(root, rel))
+        if full != root and not full.startswith(root + os.sep):
+            return None
+        if os.path.splitext(full)[1].lower() not in SERVED_EXTENSIONS:
+            return None
+        return full if os.path.isfile(full) else None
+
+    # parse a single "bytes=a-b" range, returns (start, end) inclusive or None if absent/invalid
+
+    def _parse_range(self, size: int) -> Tuple[bool, Optional[Tuple[int, int]]]:
+
+        header = self.headers.get('Range')
+        if not header:
+            return False, None
+        match = _RANGE_RE.match(header.strip())
+        if not match or (not match.group(1) and not match.group(2)):
+            return True, None
+        first, last = match.group(1), match.group(2)
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # suffix range: last N bytes
+            start = max(0, size - int(last))
+            end = size - 1
+        if start > end or start >= size:
+            return True, None
+        return True, (start, end)
+
+    def _send_error(self, status: HTTPStatus, extra_headers=None):
+
+        self.send_response(status)
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _serve(self, with_body: bool):
+
+        path = self._resolve()
+        if path is None:
+            self._send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+        # conditional request: nothing changed since the client cached it
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', self.server.cache_control)
+            self.end_headers()
+            return
+
+        has_range, byte_range = self._parse_range(size)
+        if has_range and byte_range is None:
+            self._send_error(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, {'Content-Range': f'bytes */{size}'})
+            return
+
+        start, end = byte_range if byte_range else (0, size - 1)
+        length = max(0, end - start + 1)
+
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+        self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('Cache-Control', self.server.cache_control)
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if with_body and length:
+            with open(path, 'rb') as f:
+                # zero-copy from the page cache to the socket where supported
+                self.connection.sendfile(f, offset=start, count=length)
+
+    def do_GET(self):
+        self._serve(with_body=True)
+
+    def do_HEAD(self):
+        self._serve(with_body=False)
+
+# start a static server in a background thread
+
+def serve_static(root: str = DEFAULT_ROOT, host: Optional[str] = None, port: int = 8080,
+                 max_age: int = 300) -> ThreadingHTTPServer:
+
+    host = host or os.getenv('LOCAL_STATIC_HOST', '').strip() or DEFAULT_HOST
+    server = ThreadingHTTPServer((host, port), StaticFileHandler)
+    server.daemon_threads = True
+    server.root = os.path.realpath(root)
+    server.cache_control = f'public, max-age={max_age}'
+    threading.Thread(target=server.serve_forever, daemon=True, name='static-server').start()
+    logger.info(f"Servidor estático sirviendo {server.root} en http://{host}:{server.server_address[1]}/")
+    return server
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Servidor estático de gráficas (sendfile, rangos, cache)")
+    parser.add_argument('--root', default=os.getenv('LOCAL_STATIC_ROOT', '').strip() or DEFAULT_ROOT)
+    parser.add_argument('--host', default=None, help="Interfaz (default LOCAL_STATIC_HOST o 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=int(os.getenv('LOCAL_STATIC_PORT', '8080')))
+    parser.add_argument('--max-age', type=int, default=int(os.getenv('LOCAL_STATIC_MAX_AGE', '300')))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = serve_static(args.root, args.host, args.port, args.max_age)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
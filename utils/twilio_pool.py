@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# process-wide connection counters (new TCP/TLS connections and time spent opening them)
+_stats_lock = threading.Lock()
+_stats: Dict[str, float] = {'connections': 0, 'connect_seconds': 0.0}
+
+def _record_connect(seconds: float):
+
+    with _stats_lock:
+        _stats['connections'] += 1
+        _stats['connect_seconds'] += seconds
+
+# Retry-After of the last throttled (429) response seen by this thread
+_throttle = threading.local()
+
+def _remember_retry_after(response, *args, **kwargs):
+
+    if response.status_code == 429:
+        _throttle.retry_after = response.headers.get('Retry-After')
+    return response
+
+def last_retry_after() -> Optional[float]:
+    """Seconds Twilio asked to wait in this thread's last 429 answer (None if it did not say); clears it."""
+    value, _throttle.retry_after = getattr(_throttle, 'retry_after', None), None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        # HTTP-date form: not used by Twilio, treat as unknown
+        return None
+
+
+class _TimedHTTPConnection(HTTPConnection):
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _record_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+
+    # includes the TLS handshake
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _record_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+
+    # keep-alive pool whose connection setups are counted in pool_stats()
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool}
+
+# registry of long-lived clients, keyed by (account_sid, auth_token, base_url)
+_clients: Dict[Tuple[str, str, Optional[str]], Any] = {}
+_clients_lock = threading.Lock()
+
+def get_twilio_client(account_sid: str, auth_token: str, base_url: Optional[str] = None,
+                      pool_size: Optional[int] = None, timeout: Optional[float] = None):
+    """Return the process-wide twilio Client for these credentials (created on first use)."""
+    key = (account_sid, auth_token, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client
+
+            pool_size = pool_size or int(os.getenv('TWILIO_POOL_SIZE', '16'))
+            timeout = timeout or float(os.getenv('TWILIO_HTTP_TIMEOUT', '30'))
+            http_client = TwilioHttpClient(pool_connections=True, timeout=timeout,
+                                           request_hooks={'response': [_remember_retry_after]})
+            # pool sized for the broadcast threads; http:// too for local stand-ins
+            adapter = PooledAdapter(pool_connections=2, pool_maxsize=pool_size)
+            http_client.session.mount('https://', adapter)
+            http_client.session.mount('http://', adapter)
+
+            client = Client(account_sid, auth_token, http_client=http_client)
+            if base_url:
+                client.api.base_url = base_url
+            _clients[key] = client
+            logger.info(f"Cliente de Twilio creado (pool {pool_size}, timeout {timeout:g} s).")
+        return client
+
+def pool_stats() -> Dict[str, float]:
+    """New connections opened so far and the total / average time spent opening them."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['avg_connect_ms'] = 1000 * stats['connect_seconds'] / stats['connections'] if stats['connections'] else 0.0
+    return stats
+
+# drop cached clients (tests, credential rotation)
+
+def reset_twilio_clients():
+
+    with _clients_lock:
+        for client in _clients.values():
+            session = getattr(client.http_client, 'session', None)
+            if session is not None:
+                session.close()
+        _clients.clear()
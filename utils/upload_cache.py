@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join('outputs', 'upload_cache.json')
+
+# entries expiring within this margin are treated as expired (the URL must survive delivery)
+EXPIRY_MARGIN_SECONDS = 3600
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file read in chunks (memory bounded by chunk_size)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# cache key of an upload: the same bytes hosted by another backend / endpoint / bucket is another entry
+
+def upload_key(backend: str, scope: str, digest: str) -> str:
+
+    return f"{backend}:{scope}:{digest}"
+
+
+class UploadCache:
+
+    # persistent map: upload_key(backend, endpoint or bucket, sha256 of image bytes) -> hosted URL (with expiry)
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: Optional[int] = None):
+
+        self.path = path
+        # default lifetime for entries whose host does not report an expiry
+        self.ttl = ttl if ttl is not None else int(os.getenv('UPLOAD_CACHE_TTL', str(7 * 24 * 3600)))
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Cache de subidas ilegible ({self.path}), se ignora: {e}")
+            return {}
+
+    # return the cached URL for a key, None if missing or (about to be) expired
+
+    def get(self, key: str) -> Optional[str]:
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            if entry.get('expires_at') and entry['expires_at'] - EXPIRY_MARGIN_SECONDS <= time.time():
+                del self._entries[key]
+                self._dirty = True
+                return None
+            return entry.get('url')
+
+    # store a URL; expires_in is the host-side expiration (seconds), if any
+
+    def put(self, key: str, url: str, expires_in: Optional[int] = None):
+
+        now = time.time()
+        lifetime = min(expires_in, self.ttl) if expires_in else self.ttl
+        with self._lock:
+            self._entries[key] = {
+                'url': url,
+                'uploaded_at': int(now),
+                'expires_at': int(now + lifetime) if lifetime else None,
+            }
+            self._dirty = True
+
+    # drop expired entries (and bare-digest entries from before keys named their host)
+
+    def prune(self) -> int:
+
+        now = time.time()
+        with self._lock:
+            expired = [k for k, v in self._entries.items()
+                       if ':' not in k or (v.get('expires_at') and v['expires_at'] <= now)]
+            for key in expired:
+                del self._entries[key]
+            if expired:
+                self._dirty = True
+        return len(expired)
+
+    # write atomically (temp file + replace)
+
+    def save(self):
+
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[UploadCache] = None
+_cache_lock = threading.Lock()
+
+def get_upload_cache() -> Optional[UploadCache]:
+    """Process-wide cache instance, or None when disabled with UPLOAD_CACHE=false."""
+    global _cache
+    if os.getenv('UPLOAD_CACHE', 'true').strip().lower() not in {'1', 'true', 'yes', 'y'}:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = UploadCache(os.getenv('UPLOAD_CACHE_PATH', '').strip() or DEFAULT_CACHE_PATH)
+            _cache.prune()
+        return _cache
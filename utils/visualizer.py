@@ -1,24 +1,122 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
+import hashlib
 import os 
+import re
+import json
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from matplotlib import rcParams
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
-from tomlkit import date
+from utils.profiling import step
 
 logger = logging.getLogger(__name__)
 
+# label used for the bucket that groups the categories beyond the top N
+OTHERS_LABEL = 'Otros'
+
+# root folder for the rendered graphs
+GRAPHS_DIR = os.path.join('outputs', 'graphs')
+
+# figures reused across renders in this process, keyed by figsize
+_FIGURE_TEMPLATES: Dict[Tuple[float, float], Any] = {}
+
+# styles are global to matplotlib, apply them once per process
+_STYLES_CONFIGURED = False
+
+# read an int setting from env, falling back to default on missing/invalid values
+
+def _env_int(name: str, default: int) -> int:
+
+    try:
+        return int(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+
+# keep the top N categories and sum the rest into a single 'Otros' bucket
+
+def collapse_top_n(data: pd.Series, n: int, other_label: str = OTHERS_LABEL) -> pd.Series:
+
+    if n <= 0 or len(data) <= n:
+        return data
+
+    ordered = data.sort_values(ascending=False)
+    top = ordered.iloc[:n]
+    rest = ordered.iloc[n:].sum()
+    return pd.concat([top, pd.Series({other_label: rest})])
+
+# step between visible labels so that at most max_labels are drawn
+
+def label_step(count: int, max_labels: int) -> int:
+
+    if max_labels <= 0 or count <= max_labels:
+        return 1
+    return int(np.ceil(count / max_labels))
+
+# downsample a series with Largest-Triangle-Three-Buckets, returns kept positions
+
+def lttb_indices(values: np.ndarray, threshold: int) -> np.ndarray:
+    """Return the indices of the points kept by LTTB.
+
+    The x axis is the point position, so it works for any ordered series
+    (monthly periods included). First and last points are always kept.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.asarray(values, dtype=float)
+    x = np.arange(n, dtype=float)
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    # buckets for the inner points (first and last are fixed)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point for the final bucket)
+        if i < threshold - 3:
+            nxt_start, nxt_end = edges[i + 1], edges[i + 2]
+        else:
+            nxt_start, nxt_end = n - 1, n
+        avg_x = x[nxt_start:nxt_end].mean()
+        avg_y = y[nxt_start:nxt_end].mean()
+
+        # pick the point forming the largest triangle with a and the next average
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                       (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        kept[i + 1] = a
+
+    return kept
+
 class DataVisualizer:
     
     # class to generate graphs from sales data
 
-    def __init__(self, results: Dict[str, Any]):
+    def __init__(self, results: Dict[str, Any], max_categories: Optional[int] = None,
+                 max_labels: Optional[int] = None, max_points: Optional[int] = None,
+                 output_dir: str = GRAPHS_DIR, reuse_figures: bool = False,
+                 on_saved: Optional[Callable[[str], None]] = None):
 
         # initialize with analysis results
 
         self.results = results
+        self.output_dir = output_dir
+        self.reuse_figures = reuse_figures
+        # called with the path of every saved graph (e.g. to start its upload while the rest render)
+        self.on_saved = on_saved
+
+        # high-cardinality limits (env overridable)
+
+        self.max_categories = max_categories if max_categories is not None else _env_int('GRAPH_MAX_CATEGORIES', 10)
+        self.max_labels = max_labels if max_labels is not None else _env_int('GRAPH_MAX_LABELS', 24)
+        self.max_points = max_points if max_points is not None else _env_int('GRAPH_MAX_POINTS', 120)
         
         # styles
 
@@ -28,11 +126,14 @@ class DataVisualizer:
 
     def configure_styles(self):
 
-        plt.style.use('seaborn-v0_8')
-        rcParams['figure.figsize'] = (12, 8)
-        rcParams['font.size'] = 12
-        rcParams['axes.titlesize'] = 16
-        rcParams['axes.labelsize'] = 14
+        global _STYLES_CONFIGURED
+        if not _STYLES_CONFIGURED:
+            plt.style.use('seaborn-v0_8')
+            rcParams['figure.figsize'] = (12, 8)
+            rcParams['font.size'] = 12
+            rcParams['axes.titlesize'] = 16
+            rcParams['axes.labelsize'] = 14
+            _STYLES_CONFIGURED = True
 
         # colors
 
@@ -46,13 +147,58 @@ class DataVisualizer:
         # verify route exists
 
         try: 
-            abs_path = os.path.join('outputs', 'graphs', filename)
-            plt.savefig(abs_path, dpi=dpi, bbox_inches='tight', facecolor= 'white', edgecolor='white')
-            plt.close()
-            logger.info(f"Graph saved to {abs_path}")
+            abs_path = os.path.join(self.output_dir, filename)
+            with step('savefig'):
+                plt.savefig(abs_path, dpi=dpi, bbox_inches='tight', facecolor= 'white', edgecolor='white')
+            # template figures stay open to be cleared and reused by the next render
+            if not self.reuse_figures:
+                plt.close()
+            logger.info("Graph saved to %s", abs_path)
         except Exception as e:
             logger.error(f"Error saving graph: {str(e)}")
             raise
+        if self.on_saved is not None:
+            self.on_saved(abs_path)
+
+    # new figure and axes, or a cleared template figure when reuse is enabled
+
+    def _subplots(self, figsize: Tuple[float, float]):
+
+        if not self.reuse_figures:
+            return plt.subplots(figsize=figsize)
+
+        fig = _FIGURE_TEMPLATES.get(figsize)
+        if fig is None:
+            fig = plt.figure(figsize=figsize)
+            _FIGURE_TEMPLATES[figsize] = fig
+        else:
+            fig.clf()
+            # make it the current figure so plt.* helpers act on it
+            plt.figure(fig.number)
+        ax = fig.add_subplot(111)
+        return fig, ax
+
+    # keep at most max_labels category ticks on the x axis
+
+    def _decimate_xticks(self, ax, labels: List[str]):
+
+        step = label_step(len(labels), self.max_labels)
+        if step > 1:
+            positions = list(range(0, len(labels), step))
+            ax.set_xticks(positions)
+            ax.set_xticklabels([labels[i] for i in positions], rotation=45, ha='right')
+
+    # write the value on top of each bar, decimated when there are many bars
+
+    def _annotate_bars(self, ax, bars, fmt):
+
+        step = label_step(len(bars), self.max_labels)
+        for i, bar in enumerate(bars):
+            if i % step:
+                continue
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height + height*0.01,
+                   fmt(height), ha='center', va='bottom', fontweight='bold')
 
     # create graph for sales by headquarter
 
@@ -60,10 +206,10 @@ class DataVisualizer:
 
         try:
             
-            data= self.results['sales_by_headquarter']
+            data = collapse_top_n(self.results['sales_by_headquarter'], self.max_categories)
 
-            fig, ax = plt.subplots(figsize=(14,8))
-            bars = ax.bar(data.index, data.values, color=self.colors[:len(data)], edgecolor='black', linewidth=0.5)
+            fig, ax = self._subplots(figsize=(14,8))
+            bars = ax.bar(data.index.astype(str), data.values, color=self.colors[:len(data)], edgecolor='black', linewidth=0.5)
         
             # customize graphs
             ax.set_title('VENTAS SIN IGV POR SEDE', fontsize=18, fontweight='bold', pad=20)
@@ -73,12 +219,10 @@ class DataVisualizer:
 
             # add value to bars
 
-            for bar in bars:
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height + height*0.01,
-                       f'S/ {height:,.0f}', ha='center', va='bottom', fontweight='bold')
+            self._annotate_bars(ax, bars, lambda h: f'S/ {h:,.0f}')
                 
             plt.xticks(rotation=45, ha='right')
+            self._decimate_xticks(ax, list(data.index.astype(str)))
             plt.tight_layout()
 
             self.save_graph('sales_by_headquarter.png')
@@ -95,7 +239,7 @@ class DataVisualizer:
 
             data = self.results['top_models']
 
-            fig, ax = plt.subplots(figsize=(14,8))
+            fig, ax = self._subplots(figsize=(14,8))
             bars = ax.barh(range(len(data)), data.values, color=self.colors[:len(data)], edgecolor='black', linewidth=0.5)
 
             # customize graphs
@@ -125,10 +269,10 @@ class DataVisualizer:
 
         try: 
 
-            data = self.results['sales_by_channel'] 
+            data = collapse_top_n(self.results['sales_by_channel'], self.max_categories)
 
-            fig, ax = plt.subplots(figsize=(14,8))
-            bars= ax.bar(data.index, data.values, color=self.colors[4:4+len(data)], edgecolor='black', linewidth=0.5)
+            fig, ax = self._subplots(figsize=(14,8))
+            bars= ax.bar(data.index.astype(str), data.values, color=self.colors[4:4+len(data)], edgecolor='black', linewidth=0.5)
 
             # customize graphs
             ax.set_title('ANÁLISIS DE VENTAS POR CANAL', fontsize=18, fontweight='bold', pad=20)
@@ -137,12 +281,10 @@ class DataVisualizer:
             ax.grid(axis='y', linestyle='--', alpha=0.3)
 
             # add value to bars
-            for bar in bars:
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height + height*0.01,
-                       f'{int(height)}', ha='center', va='bottom', fontweight='bold')
+            self._annotate_bars(ax, bars, lambda h: f'{int(h)}')
                 
             plt.xticks(rotation=45, ha='right')
+            self._decimate_xticks(ax, list(data.index.astype(str)))
             plt.tight_layout()
             self.save_graph('sales_by_channel.png')
 
@@ -157,7 +299,7 @@ class DataVisualizer:
         try: 
 
             data= self.results['sales_by_segment']
-            fig, ax = plt.subplots(figsize=(12,12))
+            fig, ax = self._subplots(figsize=(12,12))
 
             # create pie chart
 
@@ -204,13 +346,18 @@ class DataVisualizer:
                 logger.warning("No hay datos para crear la gráfica de tendencia de ventas mensuales.")
                 return
             
-            fig, ax = plt.subplots(figsize=(15,8))
+            fig, ax = self._subplots(figsize=(15,8))
 
             # convert period to string for better x-axis labels
+            # and downsample long series so render time stays bounded
 
-            months = data.index.astype(str)
+            kept = lttb_indices(data.values, self.max_points)
+            months = data.index.astype(str)[kept]
+            values = data.values[kept]
+            if len(kept) < len(data):
+                logger.info("Tendencia mensual reducida de %d a %d puntos (LTTB).", len(data), len(kept))
 
-            ax.plot(months, data.values, marker='o', color=self.colors[0], linewidth=3, markersize=8, markerfacecolor='white', markeredgecolor='black')
+            ax.plot(months, values, marker='o', color=self.colors[0], linewidth=3, markersize=8, markerfacecolor='white', markeredgecolor='black')
 
             # customize graphs
             ax.set_title('TENDENCIA MENSUAL DE VENTAS SIN IGV', fontsize=18, fontweight='bold', pad=20)
@@ -221,11 +368,15 @@ class DataVisualizer:
             # rotate x labels for better visibility
 
             plt.xticks(rotation=45, ha='right')
+            self._decimate_xticks(ax, list(months))
 
-            # add value for each point
+            # add value for each point (decimated by density, last point always shown)
 
-            for i, (months, value) in enumerate(zip(months, data.values)):
-                ax.annotate(f'S/ {value:,.0f}', (months, value),
+            step = label_step(len(values), self.max_labels)
+            for i, (month, value) in enumerate(zip(months, values)):
+                if i % step and i != len(values) - 1:
+                    continue
+                ax.annotate(f'S/ {value:,.0f}', (month, value),
                            textcoords="offset points", xytext=(0,10),
                            ha='center', fontweight='bold')
 
@@ -244,7 +395,7 @@ class DataVisualizer:
 
             metrics = self.results['summary_metrics']
 
-            fig, ax = plt.subplots(figsize=(10,6))
+            fig, ax = self._subplots(figsize=(10,6))
             ax.axis('off')
 
             # main title
@@ -323,14 +474,13 @@ class DataVisualizer:
             logger.info("Iniciando generación de gráficos.")
 
             # verify path
-            os.makedirs('outputs/graphs', exist_ok=True)
+            os.makedirs(self.output_dir, exist_ok=True)
 
-            self.create_sales_by_headquarter_graph()
-            self.create_top_models_graph()
-            self.create_sales_by_channel_graph()
-            self.create_sales_by_segment_graph()
-            self.create_monthly_sales_trend_graph()
-            self.create_dashboard_summary()
+            for create in (self.create_sales_by_headquarter_graph, self.create_top_models_graph,
+                           self.create_sales_by_channel_graph, self.create_sales_by_segment_graph,
+                           self.create_monthly_sales_trend_graph, self.create_dashboard_summary):
+                with step(create.__name__):
+                    create()
 
             logger.info("Generación de gráficos finalizada.")
 
@@ -340,7 +490,88 @@ class DataVisualizer:
 
 # aux function for direct use
 
-def generate_visualizations(results: Dict[str, Any]):
-
-    visualizer = DataVisualizer(results)
-    visualizer.generate_all_graphs()
\ No newline at end of file
+def generate_visualizations(results: Dict[str, Any], max_categories: Optional[int] = None,
+                            max_labels: Optional[int] = None, max_points: Optional[int] = None,
+                            on_saved: Optional[Callable[[str], None]] = None):
+
+    visualizer = DataVisualizer(results, max_categories=max_categories,
+                                max_labels=max_labels, max_points=max_points, on_saved=on_saved)
+    visualizer.generate_all_graphs()
+
+# folder name for a partition key: readable part (letters, digits, dash, underscore) plus a short
+# hash of the key, so "Lima Norte", "Lima_Norte" and "Lima/Norte" never share a folder
+
+def partition_dirname(key: Any) -> str:
+
+    name = re.sub(r'[^\w\-]+', '_', str(key), flags=re.UNICODE).strip('_') or 'sin_nombre'
+    return f"{name}_{hashlib.sha1(str(key).encode('utf-8')).hexdigest()[:8]}"
+
+# worker setup: backend and styles are configured once per process
+
+def _init_render_worker():
+
+    import matplotlib
+    matplotlib.use('Agg')
+    DataVisualizer({}).configure_styles()
+
+# render the chart set of one partition reusing the worker figure templates
+
+def _render_partition(key: Any, results: Dict[str, Any], output_dir: str, options: Dict[str, Any]) -> Tuple[Any, str, List[str]]:
+
+    # list only what this render wrote: charts left over from an earlier run are not part of it
+    written: List[str] = []
+    visualizer = DataVisualizer(results, output_dir=output_dir, reuse_figures=True,
+                                on_saved=lambda path: written.append(os.path.basename(path)), **options)
+    visualizer.generate_all_graphs()
+    return key, output_dir, sorted(set(written))
+
+# render one chart set per partition (e.g. per headquarter) in a worker pool
+
+def generate_partitioned_visualizations(partitioned_results: Dict[Any, Dict[str, Any]], output_root: str = GRAPHS_DIR,
+                                        workers: Optional[int] = None, max_categories: Optional[int] = None,
+                                        max_labels: Optional[int] = None, max_points: Optional[int] = None,
+                                        reuse: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Render the graphs of every partition into `<output_root>/<partition>/` and
+    write `<output_root>/manifest.json`. `reuse` holds manifest entries of
+    partitions rendered earlier and still valid; they are listed, not rendered.
+
+    Returns the manifest: {'generated_at': ..., 'partitions': {key: {'dir': ..., 'graphs': [...]}}}
+    """
+    if workers is None:
+        workers = _env_int('GRAPH_WORKERS', os.cpu_count() or 1)
+    workers = max(1, min(workers, len(partitioned_results) or 1))
+    options = {'max_categories': max_categories, 'max_labels': max_labels, 'max_points': max_points}
+
+    os.makedirs(output_root, exist_ok=True)
+    manifest: Dict[str, Any] = {'generated_at': datetime.now().isoformat(timespec='seconds'), 'partitions': dict(reuse or {})}
+    errors: Dict[str, str] = {}
+
+    logger.info("Generando gráficos para %d particiones con %d procesos.", len(partitioned_results), workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as pool:
+        futures = {}
+        for key, results in partitioned_results.items():
+            output_dir = os.path.join(output_root, partition_dirname(key))
+            futures[pool.submit(_render_partition, key, results, output_dir, options)] = key
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                _key, output_dir, files = future.result()
+                manifest['partitions'][str(key)] = {'dir': output_dir, 'graphs': files}
+            except Exception as e:
+                logger.error(f"Error generando gráficos de la partición '{key}': {str(e)}")
+                errors[str(key)] = str(e)
+
+    # keep manifest order stable (reused partitions first, then the input order)
+    order = list(reuse or {}) + [str(k) for k in partitioned_results if str(k) not in (reuse or {})]
+    manifest['partitions'] = {k: manifest['partitions'][k] for k in order if k in manifest['partitions']}
+    if errors:
+        manifest['errors'] = errors
+
+    manifest_path = os.path.join(output_root, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    logger.info("Manifiesto de gráficos escrito en %s", manifest_path)
+
+    return manifest
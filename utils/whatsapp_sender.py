@@ -1,17 +1,75 @@
 import os
+import json
 import logging
+import random
+import threading
 import time
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
+
+from utils.profiling import step
+
+# twilio is imported lazily (client init / send) to keep startup fast
 
 logger = logging.getLogger(__name__)
 
+# statuses returned by messages.create that mean Twilio accepted the message
+ACCEPTED_STATUSES = {'accepted', 'scheduled', 'queued', 'sending', 'sent', 'delivered', 'read'}
+
 class TwilioDailyLimitExceeded(Exception):
     """Raised when Twilio returns error 63038 (daily messages limit exceeded)."""
     pass
 
+class TwilioCircuitOpen(TwilioDailyLimitExceeded):
+    """Raised without any network call while the quota circuit breaker is open.
+    retry_at is the epoch time when a probe send will be allowed."""
+
+    def __init__(self, message: str, retry_at: float = 0.0):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+class _TwilioThrottled(Exception):
+    # HTTP 429 (other than 63038): Twilio is healthy but asks to slow down
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# read environment configuration. Normalize and strip whitespace.
+
+def load_config() -> Dict[str, Any]:
+
+    config = {
+        'destination_whatsapp': (os.getenv('WHATSAPP_DESTINY') or os.getenv('DESTINATION_WHATSAPP') or '').strip(),
+        # Twilio config
+        'twilio_account_sid': os.getenv('TWILIO_ACCOUNT_SID', '').strip() or None,
+        'twilio_auth_token': os.getenv('TWILIO_AUTH_TOKEN', '').strip() or None,
+        'twilio_whatsapp_from': os.getenv('TWILIO_WHATSAPP_FROM', '').strip() or None,
+        # Simulation mode (to avoid using Twilio while testing)
+        'simulate': (os.getenv('WHATSAPP_SIMULATE', 'false').strip().lower() in {'1','true','yes','y'}),
+        # Retry config
+        'max_retries': int(os.getenv('WHATSAPP_MAX_RETRIES', '3')),
+        'wait_time': int(os.getenv('WHATSAPP_WAIT_TIME', '5')),
+        # HTTP 429 throttling: waits honoring Retry-After (or exponential backoff), not counted by the breaker
+        'throttle_retries': int(os.getenv('TWILIO_THROTTLE_RETRIES', '3')),
+        'throttle_backoff': float(os.getenv('TWILIO_THROTTLE_BACKOFF', '1')),
+        'throttle_max_wait': float(os.getenv('TWILIO_THROTTLE_MAX_WAIT', '60')),
+        # Durable outbound queue (SQLite): survives restarts, never sends the same report twice
+        'outbound_queue': (os.getenv('WHATSAPP_OUTBOUND_QUEUE', 'false').strip().lower() in {'1','true','yes','y'}),
+        # Twilio API endpoint override (local stand-in for load tests)
+        'twilio_api_base_url': os.getenv('TWILIO_API_BASE_URL', '').strip().rstrip('/') or None,
+        # Delivery tracking (statuses are reconciled out of the send path)
+        'status_callback_url': os.getenv('TWILIO_STATUS_CALLBACK_URL', '').strip() or None,
+        'delivery_tracking': (os.getenv('TWILIO_DELIVERY_TRACKING', 'true').strip().lower() in {'1','true','yes','y'}),
+        # Daily quota ledger + circuit breaker (shared by every sender through outputs/twilio_quota.db)
+        'quota_guard': (os.getenv('TWILIO_QUOTA_GUARD', 'true').strip().lower() in {'1','true','yes','y'}),
+    }
+
+    logger.info("Configuracion del WhatsAppSender cargada.")
+    return config
+
 
 class WhatsAppSender:
 
@@ -22,29 +80,16 @@ class WhatsAppSender:
         # initialize sender
 
         self.config = self._load_config()
+        # client is created on first real send (simulated runs never import twilio)
         self.twilio_client = None
-        self._initialize_twilio_client()    
+        self.delivery_store = None
+        self.circuit_breaker = None
+        self.last_sid: Optional[str] = None
+        self._client_lock = threading.Lock()
 
     def _load_config(self) -> Dict[str, Any]:
 
-       # config loader
-
-        # Read environment configuration. Normalize and strip whitespace.
-        config = {
-            'destination_whatsapp': (os.getenv('WHATSAPP_DESTINY') or os.getenv('DESTINATION_WHATSAPP') or '').strip(),
-            # Twilio config
-            'twilio_account_sid': os.getenv('TWILIO_ACCOUNT_SID', '').strip() or None,
-            'twilio_auth_token': os.getenv('TWILIO_AUTH_TOKEN', '').strip() or None,
-            'twilio_whatsapp_from': os.getenv('TWILIO_WHATSAPP_FROM', '').strip() or None,
-            # Simulation mode (to avoid using Twilio while testing)
-            'simulate': (os.getenv('WHATSAPP_SIMULATE', 'false').strip().lower() in {'1','true','yes','y'}),
-            # Retry config
-            'max_retries': int(os.getenv('WHATSAPP_MAX_RETRIES', '3')),
-            'wait_time': int(os.getenv('WHATSAPP_WAIT_TIME', '5')),
-        }
-
-        logger.info("Configuracion del WhatsAppSender cargada.")
-        return config
+        return load_config()
     
     # initialize Twilio client
 
@@ -56,24 +101,106 @@ class WhatsAppSender:
             self.config['twilio_whatsapp_from']):
 
             try:
-
-                self.twilio_client = Client(
-                    self.config['twilio_account_sid'], 
-                    self.config['twilio_auth_token']
+                from utils.twilio_pool import get_twilio_client
+
+                # shared long-lived client: keep-alive connections survive across senders and sends
+                # (the base URL override points it at a local Twilio stand-in for load tests)
+                self.twilio_client = get_twilio_client(
+                    self.config['twilio_account_sid'],
+                    self.config['twilio_auth_token'],
+                    self.config['twilio_api_base_url'],
                 )
                 logger.info("Cliente de Twilio inicializado con éxito.")
             except Exception as e:
                 logger.error(f"Error al inicializar el cliente de Twilio: {str(e)}")
                 self.twilio_client = None
     
+    # create the Twilio client and breaker ahead of the first send (overlaps with report preparation)
+
+    def warm_up(self, simulate: Optional[bool] = None):
+
+        if simulate is None:
+            simulate = bool(self.config.get('simulate'))
+        if simulate:
+            return
+        with self._client_lock:
+            if not self.twilio_client:
+                self._initialize_twilio_client()
+        self._get_circuit_breaker()
+
     # METHOD 1: send message using twilio API
 
     def send_twilio_message(self, message: str, destiny: str, linked_file: List[str] = None) -> bool:
 
+        ok, _sid, _error, _retriable = self.submit_twilio_message(message, destiny, linked_file)
+        return ok
+
+    # persisted quota ledger / circuit breaker, created on first real send
+
+    def _get_circuit_breaker(self):
+
+        if not self.config['quota_guard']:
+            return None
+        if self.circuit_breaker is None:
+            with self._client_lock:
+                if self.circuit_breaker is None:
+                    from utils.quota_guard import CircuitBreaker, QuotaLedger
+                    self.circuit_breaker = CircuitBreaker(QuotaLedger())
+        return self.circuit_breaker
+
+    # longest one submit_twilio_message call can take: every throttled attempt times out or waits the max
+
+    def max_submit_seconds(self) -> float:
+
+        retries = max(0, self.config['throttle_retries'])
+        http_timeout = float(os.getenv('TWILIO_HTTP_TIMEOUT', '30'))
+        return (retries + 1) * http_timeout + retries * self.config['throttle_max_wait']
+
+    # single Twilio submission; returns (accepted, sid, error_message, retriable)
+    # raises TwilioDailyLimitExceeded on error 63038, TwilioCircuitOpen while the breaker refuses sends
+    # throttled requests (429) are retried here after the wait Twilio asks for; the breaker never sees them
+
+    def submit_twilio_message(self, message: str, destiny: str, linked_file: Optional[List[str]] = None) -> Tuple[bool, Optional[str], Optional[str], bool]:
+
+        retries = max(0, self.config['throttle_retries'])
+        for attempt in range(retries + 1):
+            try:
+                return self._submit_once(message, destiny, linked_file)
+            except _TwilioThrottled as e:
+                if attempt == retries:
+                    # still throttled: retriable, the caller's own backoff takes over
+                    return False, None, str(e), True
+                if e.retry_after is not None:
+                    delay = e.retry_after
+                else:
+                    # no Retry-After: exponential backoff with full jitter
+                    delay = random.uniform(0, self.config['throttle_backoff'] * (2 ** attempt))
+                delay = min(delay, self.config['throttle_max_wait'])
+                logger.warning(f"Twilio limitó el envío a {destiny} (429); reintento en {delay:.2f} s.")
+                time.sleep(delay)
+
+    def _submit_once(self, message: str, destiny: str, linked_file: Optional[List[str]] = None) -> Tuple[bool, Optional[str], Optional[str], bool]:
+
+        from twilio.base.exceptions import TwilioRestException
+
+        # quota used up or Twilio failing repeatedly: go to the fallback without a network call
+        breaker = self._get_circuit_breaker()
+        slot = None
+        if breaker is not None:
+            slot = breaker.acquire()
+            if slot is None:
+                raise TwilioCircuitOpen("Circuito de Twilio abierto (cuota diaria o fallos repetidos).", breaker.retry_at())
+
         try: 
+            if not self.twilio_client:
+                with self._client_lock:
+                    if not self.twilio_client:
+                        self._initialize_twilio_client()
             if not self.twilio_client:
                 logger.error("El cliente de Twilio no está inicializado.")
-                return False
+                if breaker is not None:
+                    breaker.release(slot)
+                return False, None, "Cliente de Twilio no inicializado", False
 
             # format whatsapp numbers
 
@@ -92,19 +219,28 @@ class WhatsAppSender:
             if linked_file:
                 message_params['media_url'] = linked_file
 
-            # send message
+            # let Twilio push status changes to our webhook receiver, if configured
+            if self.config['status_callback_url']:
+                message_params['status_callback'] = self.config['status_callback_url']
 
-            message = self.twilio_client.messages.create(**message_params)
+            # send message (returns as soon as Twilio accepts it; no status polling here)
+
+            with step('twilio_submit'):
+                message = self.twilio_client.messages.create(**message_params)
+            self.last_sid = message.sid
 
             logger.info(f"Mensaje enviado via Twilio a {destiny}. SID: {message.sid}")
             logger.info(f"Estado del mensaje: {message.status}")
 
-            # verify status
-            time.sleep(2)
-            message = message.fetch()
-            logger.info(f"📊 Estado actualizado: {message.status}")
+            # final delivery state is reconciled later by utils.delivery_tracker
+            self._record_delivery(message.sid, destiny, message.status)
 
-            return message.status in ['queued', 'sent', 'delivered']
+            accepted = message.status in ACCEPTED_STATUSES
+            if breaker is not None and accepted:
+                breaker.record_success(slot)
+            elif breaker is not None:
+                breaker.release(slot)
+            return accepted, message.sid, None if accepted else f"Estado {message.status}", False
    
         except TwilioRestException as e:
             # Detect daily limit exceed to avoid useless retries
@@ -115,14 +251,47 @@ class WhatsAppSender:
 
             if code == 63038 or 'daily messages limit' in str(e).lower():
                 logger.error("Twilio: límite diario de mensajes excedido (63038). Deteniendo reintentos hasta que el límite se reinicie.")
+                if breaker is not None:
+                    breaker.record_daily_limit(slot)
                 raise TwilioDailyLimitExceeded(str(e))
+            status = getattr(e, 'status', None) or 0
+            if status == 429:
+                # throttling is not a service failure: give the slot back and wait as asked
+                from utils.twilio_pool import last_retry_after
+
+                if breaker is not None:
+                    breaker.release(slot)
+                raise _TwilioThrottled(str(e), last_retry_after())
             else:
                 logger.error(f"Error de Twilio: {e}")
-                return False
+                # server errors are transient, other 4xx are not
+                retriable = status >= 500
+                if breaker is not None:
+                    if retriable:
+                        breaker.record_failure(slot, f"Twilio HTTP {status}")
+                    else:
+                        breaker.release(slot)
+                return False, None, str(e), retriable
         except Exception as e:
             logger.error(f"Error inesperado en Twilio: {e}")
-            return False
+            if breaker is not None:
+                breaker.record_failure(slot, "error de red")
+            return False, None, str(e), True
         
+    # register the SID so the poller / status callbacks can reconcile its final state
+
+    def _record_delivery(self, sid: str, destiny: str, status: str):
+
+        if not self.config['delivery_tracking']:
+            return
+        try:
+            if self.delivery_store is None:
+                from utils.delivery_tracker import DeliveryStore
+                self.delivery_store = DeliveryStore()
+            self.delivery_store.record_sent(sid, destiny, status)
+        except Exception as e:
+            logger.warning(f"No se pudo registrar el mensaje {sid} para seguimiento: {e}")
+
     # MAIN SEND METHOD (Twilio-only)
 
     def send_message(self, message: str, destiny: str = None, retry: bool = True, linked_file: Optional[List[str]] = None) -> bool:
@@ -136,6 +305,21 @@ class WhatsAppSender:
 
         max_retries = self.config['max_retries'] if retry else 1
 
+        # bodies over the WhatsApp limit go as numbered parts; media rides on the first one
+        from utils.message_templates import split_message
+
+        parts = split_message(message)
+        for index, part in enumerate(parts):
+            if len(parts) > 1:
+                logger.info(f"Enviando parte {index + 1}/{len(parts)}...")
+            if not self._send_with_retries(part, destiny, max_retries, linked_file if index == 0 else None):
+                return False
+        return True
+
+    # send one body with the in-memory retry loop
+
+    def _send_with_retries(self, message: str, destiny: str, max_retries: int, linked_file: Optional[List[str]] = None) -> bool:
+
         for attempt in range(max_retries):
             try:
                 logger.info(f"Intentando envío via Twilio (intento {attempt + 1}/{max_retries})...")
@@ -158,13 +342,39 @@ class WhatsAppSender:
         logger.error("Todos los intentos de envío via Twilio han fallado.")
         return False
 
+    # send through the durable outbound queue: enqueue (idempotent) and drain until this message is final
+    # `report_id` (outbound_queue.report_identity) keys the parts; without it the content is the key
+    # raises TwilioDailyLimitExceeded (the message stays queued for the next run)
+
+    def send_via_queue(self, message: str, destiny: str, linked_file: Optional[List[str]] = None,
+                       report_id: Optional[str] = None) -> bool:
+
+        from utils.outbound_queue import OutboundQueue, QueueWorker, SENT, report_fingerprint
+
+        from utils.message_templates import split_message
+
+        queue = OutboundQueue()
+        keys = queue.enqueue_report(destiny, split_message(message), report_id or report_fingerprint(message, linked_file),
+                                    media_urls=linked_file, max_attempts=self.config['max_retries'])
+        # also resumes messages left pending by a previous (interrupted) run
+        QueueWorker(self, queue).drain()
+        ok = True
+        for key in keys:
+            item = queue.get(key)
+            if item['status'] == SENT:
+                logger.info(f"Mensaje entregado a Twilio desde la cola. SID: {item['sid']}")
+            else:
+                logger.error(f"El mensaje en cola quedó en estado '{item['status']}': {item['last_error']}")
+                ok = False
+        return ok
+
     # send summary
 
     def send_summary(self, results: Dict[str, Any], destiny: str= None) -> bool:
 
         try: 
 
-            message = self._format_summary(results)
+            message = self.format_summary(results)
             return self.send_message(message, destiny)
         
         except Exception as e:
@@ -190,49 +400,13 @@ Puede encontrarlos en la carpeta 'outputs/graphs' del proyecto.
             return False
         
     # format summary message (multi-line, readable)
-    def _format_summary(self, results: Dict[str, Any]) -> str:
+    def format_summary(self, results: Dict[str, Any]) -> str:
 
         try:
-            metrics = results['summary_metrics']
-            top_models = results['top_models'].index[0]
-            top_headquarter = results['sales_by_headquarter'].index[0]
-            top_channel = results['sales_by_channel'].index[0]
-
-            # multi-line structure for better readability
-            lines: List[str] = []
-            lines.append("📊 Reporte de análisis de ventas")
-            lines.append(f"👥 Clientes únicos: {metrics['unique_clients']:,}")
-            lines.append(f"🧾 Total de ventas: {metrics['total_sales']:,}")
-            lines.append(f"💵 Ventas sin IGV: ${metrics['total_sales_without_igv']:,.2f}")
-            lines.append(f"💰 Ventas con IGV: ${metrics['total_sales_with_igv']:,.2f}")
-            lines.append(f"🧮 IGV recaudado: ${metrics['total_igv_collected']:,.2f}")
-            lines.append(f"📈 Venta promedio: ${metrics['average_sales_without_igv']:,.2f}")
-
-            lines.append("")
-            lines.append(f"🏆 Modelo más vendido: {top_models}")
-            lines.append(f"📍 Sede con más ventas: {top_headquarter}")
-            lines.append(f"📣 Canal con más ventas: {top_channel}")
-
-            # sales by headquarter (one per line)
-            lines.append("")
-            lines.append("📍 Ventas por sede:")
-            for hq, sales in results['sales_by_headquarter'].items():
-                lines.append(f"• 🏢 {hq}: ${sales:,.2f}")
-
-            # top 5 models
-            lines.append("")
-            lines.append("🔝 Top 5 modelos:")
-            for i, (model, sales) in enumerate(results['top_models'].items(), 1):
-                num_emoji = {1:"1️⃣",2:"2️⃣",3:"3️⃣",4:"4️⃣",5:"5️⃣"}.get(i, f"{i}.")
-                lines.append(f"{num_emoji} {model}: ${sales:,.2f}")
-                if i >= 5:
-                    break
-
-            lines.append("")
-            lines.append(f"🗓️ Generado: {self._get_today_date()}")
-
-            return "\n".join(lines)
-        
+            from utils.message_templates import ReportTemplate
+
+            return ReportTemplate(results, self._get_today_date()).render()
+
         except Exception as e:
             logger.error(f"Error formateando resumen: {e}")
             return "Error formateando resumen."
@@ -242,9 +416,107 @@ Puede encontrarlos en la carpeta 'outputs/graphs' del proyecto.
         
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
+    # build the full report message: summary + hosted graph links (+ PDF media)
+    # returns (message, media_urls, graph_urls aligned with graphs_in_order)
+
+    def build_report_message(self, results: Dict[str, Any], graphs_dir: Optional[str] = None, include_graphs: bool = True,
+                             pdf_path: Optional[str] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None,
+                             template=None) -> Tuple[str, Optional[List[str]], Optional[List[Optional[str]]]]:
+
+        # build a multi-line message combining summary and graph note
+        extra, media_urls, uploaded = self._publish_report_media(graphs_dir, include_graphs, pdf_path, graph_urls)
+        summary = template.render() if template is not None else self.format_summary(results)
+        return summary + extra, media_urls, uploaded
+
+    # compiled report template (static text rendered once) for per-recipient rendering
+    # returns (template, media_urls, graph_urls); `template` reuses a summary compiled earlier
+
+    def build_report_template(self, results: Dict[str, Any], graphs_dir: Optional[str] = None, include_graphs: bool = True,
+                              pdf_path: Optional[str] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None,
+                              template=None):
+
+        extra, media_urls, uploaded = self._publish_report_media(graphs_dir, include_graphs, pdf_path, graph_urls)
+        if template is None:
+            template = self.compile_summary(results)
+        return template.with_extra(extra), media_urls, uploaded
+
+    # summary text compiled without graph links (can be prepared while the graphs render)
+    # `scope` names the partition of a per-tenant report in the title
+
+    def compile_summary(self, results: Dict[str, Any], scope: Optional[str] = None):
+
+        from utils.message_templates import ReportTemplate
+
+        return ReportTemplate(results, self._get_today_date(), scope=scope)
+
+    # publish graphs / PDF and return the text to append to the summary: (extra_text, media_urls, graph_urls)
+    # graph_urls maps absolute paths to URLs already published (e.g. uploaded while the graphs rendered)
+
+    def _publish_report_media(self, graphs_dir: Optional[str] = None, include_graphs: bool = True,
+                              pdf_path: Optional[str] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None
+                              ) -> Tuple[str, Optional[List[str]], Optional[List[Optional[str]]]]:
+
+        message = ""
+
+        # optionally publish graphs through the configured hosting backend (imgbb, s3, local)
+        # and include ALL links in the message text only
+        media_urls: Optional[List[str]] = None
+        uploaded: Optional[List[Optional[str]]] = None
+        if not graphs_dir:
+            graphs_dir = os.path.join('outputs', 'graphs')
+        backend = None
+        try:
+            from utils.image_hosting import get_image_backend
+
+            backend = get_image_backend()
+            # graphs not generated in this run are neither uploaded nor mentioned
+            if include_graphs and backend and os.path.isdir(graphs_dir):
+                # Get graph files in a fixed semantic order
+                graph_title_and_paths = self.graphs_in_order(graphs_dir)
+                ordered_paths = [p for (_t, p) in graph_title_and_paths]
+                # one entry per path (None on failure) so titles stay aligned with URLs
+                known = graph_urls or {}
+                uploaded = [known.get(os.path.abspath(p)) for p in ordered_paths]
+                missing = [i for i, url in enumerate(uploaded) if not url]
+                if missing:
+                    with step('upload_graphs'):
+                        urls = backend.upload([ordered_paths[i] for i in missing], name_prefix='carbiz-report')
+                    for i, url in zip(missing, urls):
+                        uploaded[i] = url
+                linked = [(title, url) for (title, _path), url in zip(graph_title_and_paths, uploaded) if url]
+                if linked:
+                    # Compose a formatted, numbered list of links
+                    message += "\n\n🖼️ Gráficos en línea:\n"
+                    for idx, (title, url) in enumerate(linked, start=1):
+                        message += f"{idx}. {title}: {url}\n"
+            elif include_graphs:
+                message += f"\n\n🖼️ Los gráficos del análisis se guardaron en la carpeta {graphs_dir}."
+        except Exception as e:
+            logging.warning(f"No se pudieron publicar los gráficos: {e}")
+            message += f"\n\n🖼️ Los gráficos del análisis se guardaron en la carpeta {graphs_dir}."
+
+        # the PDF report goes as the single media attachment when the backend can host documents
+        if pdf_path and os.path.isfile(pdf_path):
+            try:
+                if backend and backend.supports_documents:
+                    with step('upload_pdf'):
+                        pdf_url = backend.upload([pdf_path], name_prefix='carbiz-report')[0]
+                    if pdf_url:
+                        media_urls = [pdf_url]
+                        message += f"\n📄 Reporte PDF: {pdf_url}"
+                else:
+                    message += f"\n📄 Reporte PDF guardado en {pdf_path}."
+            except Exception as e:
+                logging.warning(f"No se pudo publicar el reporte PDF: {e}")
+
+        return message, media_urls, uploaded
+
     # send full report
 
-    def send_full_report(self, results: Dict[str, Any], destiny: str = None, simulate: Optional[bool] = None) -> bool:
+    def send_full_report(self, results: Dict[str, Any], destiny: str = None, simulate: Optional[bool] = None,
+                         graphs_dir: Optional[str] = None, include_graphs: bool = True,
+                         pdf_path: Optional[str] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None,
+                         template=None, input_key: Optional[str] = None) -> bool:
 
         try:
             if not destiny:
@@ -256,94 +528,131 @@ Puede encontrarlos en la carpeta 'outputs/graphs' del proyecto.
 
             logger.info(f"Enviando reporte completo a {destiny}...")
 
-            # build a multi-line message combining summary and graph note
-            message = self._format_summary(results)
-
             # honor simulate flag (parameter overrides env/config)
             if simulate is None:
                 simulate = bool(self.config.get('simulate'))
 
-            # optionally upload graphs to imgbb and include ALL links in the message text only
-            media_urls: Optional[List[str]] = None
-            try:
-                imgbb_key = os.getenv('IMGBB_API_KEY', '').strip()
-                graphs_dir = os.path.join('outputs', 'graphs')
-                if imgbb_key and os.path.isdir(graphs_dir):
-                    from utils.image_uploader import upload_images_to_imgbb
-                    # Get graph files in a fixed semantic order
-                    graph_title_and_paths = self._get_graphs_in_order(graphs_dir)
-                    ordered_paths = [p for (_t, p) in graph_title_and_paths]
-                    uploaded = upload_images_to_imgbb(ordered_paths, imgbb_key, name_prefix='carbiz-report', max_count=len(ordered_paths))
-                    if uploaded:
-                        # Compose a formatted, numbered list of links
-                        message += "\n\n🖼️ Gráficos en línea:\n"
-                        for idx, ((title, _path), url) in enumerate(zip(graph_title_and_paths, uploaded), start=1):
-                            message += f"{idx}. {title}: {url}\n"
-                else:
-                    message += "\n\n🖼️ Los gráficos del análisis se guardaron en la carpeta outputs/graphs."
-            except Exception as e:
-                logging.warning(f"No se pudieron subir los gráficos a imgbb: {e}")
-                message += "\n\n🖼️ Los gráficos del análisis se guardaron en la carpeta outputs/graphs."
+            message, media_urls, uploaded = self.build_report_message(results, graphs_dir, include_graphs, pdf_path,
+                                                                      graph_urls=graph_urls, template=template)
 
             # if simulate, skip Twilio and write simulation output
             if simulate:
                 logger.info("Modo simulación activo: no se enviará mensaje por Twilio.")
-                return self.simulate_send_with_graph_urls(message)
+                return self.simulate_send_with_graph_urls(message, graphs_dir, include_graphs=include_graphs, graph_urls=uploaded,
+                                                          destiny=destiny, media_urls=media_urls)
 
             try:
-                # send only text with links; do not attach media
-                success = self.send_message(message, destiny, linked_file=None)
+                # send text with links; only the PDF (if hosted) is attached as media
+                if self.config['outbound_queue']:
+                    from utils.analyzer import results_fingerprint
+                    from utils.outbound_queue import report_identity
+
+                    # the body carries the generation time: a rerun of the same report must reuse the queued rows
+                    report_id = report_identity(results_fingerprint(results), input_key)
+                    return self.send_via_queue(message, destiny, linked_file=media_urls, report_id=report_id)
+                success = self.send_message(message, destiny, linked_file=media_urls)
                 return success
             except TwilioDailyLimitExceeded:
                 # fallback to simulation including ALL graph URLs
                 logger.warning("Límite diario de Twilio alcanzado: simulando envío e incluyendo URLs de todos los gráficos.")
-                return self.simulate_send_with_graph_urls(message)
+                return self.simulate_send_with_graph_urls(message, graphs_dir, include_graphs=include_graphs, graph_urls=uploaded,
+                                                          destiny=destiny, media_urls=media_urls, reason='daily_limit')
         
         except Exception as e:
             logger.error(f"Error enviando reporte completo: {e}")
             return False
-        
+
+    # send the full report to many recipients (concurrent, rate limited, per-recipient retries)
+
+    def broadcast_full_report(self, results: Dict[str, Any], recipients: List[Union[str, Dict[str, Any]]], simulate: Optional[bool] = None,
+                              graphs_dir: Optional[str] = None, include_graphs: bool = True,
+                              pdf_path: Optional[str] = None, rate: Optional[float] = None,
+                              concurrency: Optional[int] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None,
+                              template=None) -> Dict[str, Any]:
+        """Recipients are numbers or {'number', 'headquarter', 'name'} records (personalized body).
+        Returns {'outcomes': [{recipient, ok, status, sid, attempts, error, seconds}, ...], 'summary': {...}}."""
+        from utils.broadcast import Broadcaster
+
+        if simulate is None:
+            simulate = bool(self.config.get('simulate'))
+
+        records = [r if isinstance(r, dict) else {'number': r} for r in recipients]
+        recipients = [r['number'] for r in records]
+
+        # the static text (and hosted graphs) are built once; only the personal fields are rendered per recipient
+        template, media_urls, uploaded = self.build_report_template(results, graphs_dir, include_graphs, pdf_path,
+                                                                    graph_urls=graph_urls, template=template)
+
+        if simulate:
+            logger.info(f"Modo simulación activo: difusión simulada a {len(recipients)} destinatarios.")
+            # one record per recipient with its personalized body
+            ok = self.simulate_send_with_graph_urls(template.render(), graphs_dir, include_graphs=include_graphs, graph_urls=uploaded,
+                                                    media_urls=media_urls,
+                                                    recipient_bodies=[(r['number'], template.render_for(r)) for r in records])
+            status = 'simulated' if ok else 'failed'
+            outcomes = [{'recipient': r, 'ok': ok, 'status': status, 'sid': None,
+                         'attempts': 0, 'error': None, 'seconds': 0.0} for r in recipients]
+            return {'outcomes': outcomes,
+                    'summary': {'recipients': len(recipients), status: len(recipients), 'attempts': 0, 'seconds': 0.0}}
+
+        bodies = template.render_many(records)
+        return Broadcaster(self, rate=rate, concurrency=concurrency).send(None, recipients, media_urls, bodies=bodies)
+
     # aux method to simulate send with all graph URLs (when Twilio limit exceeded)
 
-    def simulate_send_with_graph_urls(self, base_message: str) -> bool:
-        """Simulate sending by writing a log that includes ALL graph URLs via imgbb if possible."""
+    def simulate_send_with_graph_urls(self, base_message: str, graphs_dir: Optional[str] = None,
+                                      include_graphs: bool = True, graph_urls: Optional[List[Optional[str]]] = None,
+                                      destiny: Optional[str] = None, media_urls: Optional[List[str]] = None,
+                                      reason: str = 'simulate',
+                                      recipient_bodies: Optional[List[Tuple[str, str]]] = None) -> bool:
+        """Simulate sending by recording the message (with ALL graph URLs via the hosting backend if possible)
+        in the JSONL simulation sink. graph_urls (aligned with the graphs order) reuses URLs already uploaded
+        in this run; recipient_bodies [(number, body), ...] records one personalized message per recipient."""
         try:
-            graphs_dir = os.path.join('outputs', 'graphs')
+            if not graphs_dir:
+                graphs_dir = os.path.join('outputs', 'graphs')
             os.makedirs('outputs', exist_ok=True)
 
             # collect images in fixed semantic order
-            graph_title_and_paths = self._get_graphs_in_order(graphs_dir)
+            graph_title_and_paths = self.graphs_in_order(graphs_dir) if include_graphs else []
             graph_files: List[str] = [p for (_t, p) in graph_title_and_paths]
 
-            urls: List[str] = []
-            imgbb_key = os.getenv('IMGBB_API_KEY', '').strip()
-            if imgbb_key and graph_files:
+            urls: List[Optional[str]] = list(graph_urls or [])
+            if graph_urls is None and graph_files:
                 try:
-                    from utils.image_uploader import upload_images_to_imgbb
-                    # upload ALL collected images preserving order
-                    urls = upload_images_to_imgbb(graph_files, imgbb_key, name_prefix='carbiz-report', max_count=len(graph_files))
+                    from utils.image_hosting import get_image_backend
+
+                    backend = get_image_backend()
+                    if backend:
+                        # upload ALL collected images preserving order
+                        urls = backend.upload(graph_files, name_prefix='carbiz-report')
                 except Exception as e:
-                    logging.warning(f"Falló la subida a imgbb en modo simulación: {e}")
-
-            # compose simulated message
-            message = base_message
-            if urls:
-                message += "\n\n🖼️ Gráficos en línea (simulado):\n"
-                for idx, ((title, _path), url) in enumerate(zip(graph_title_and_paths, urls), start=1):
-                    message += f"{idx}. {title}: {url}\n"
+                    logging.warning(f"Falló la publicación de gráficos en modo simulación: {e}")
+
+            # compose the graph section once; it is appended to every simulated body
+            suffix = ""
+            linked = [(title, url) for (title, _path), url in zip(graph_title_and_paths, urls) if url]
+            if linked:
+                suffix += "\n\n🖼️ Gráficos en línea (simulado):\n"
+                for idx, (title, url) in enumerate(linked, start=1):
+                    suffix += f"{idx}. {title}: {url}\n"
             else:
                 if graph_files:
                     # Fallback to local file paths if no URLs
-                    message += "\n\n🗂️ Gráficos locales (simulado):\n" + "\n".join(graph_files)
-                else:
-                    message += "\n\n⚠️ No se encontraron gráficos para adjuntar."
+                    suffix += "\n\n🗂️ Gráficos locales (simulado):\n" + "\n".join(graph_files)
+                elif include_graphs:
+                    suffix += "\n\n⚠️ No se encontraron gráficos para adjuntar."
+            message = base_message + suffix
 
-            # write simulation log and message snapshot
-            ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            with open('outputs/simulation_log.txt', 'a', encoding='utf-8') as f:
-                f.write(f"=== {ts} ===\n")
-                f.write(message + "\n")
-                f.write("="*50 + "\n")
+            # structured records (buffered, rotated) and the latest message snapshot
+            from utils.outbound_queue import report_fingerprint
+            from utils.simulation_sink import get_simulation_sink, make_record
+
+            sink = get_simulation_sink()
+            fingerprint = report_fingerprint(message, media_urls)
+            for recipient, body in (recipient_bodies or [(destiny or self.config.get('destination_whatsapp'), base_message)]):
+                sink.write(make_record(recipient, body + suffix, media_urls, reason=reason, fingerprint=fingerprint))
+            sink.flush()
 
             with open('outputs/simulation_message.txt', 'w', encoding='utf-8') as f:
                 f.write(message)
@@ -354,7 +663,7 @@ Puede encontrarlos en la carpeta 'outputs/graphs' del proyecto.
             logger.error(f"Error en simulación con URLs: {e}")
             return False
 
-    def _get_graphs_in_order(self, graphs_dir: str) -> List[Tuple[str, str]]:
+    def graphs_in_order(self, graphs_dir: str) -> List[Tuple[str, str]]:
         """Return a list of (title, absolute_path) for graph images in a fixed, user-friendly order.
         Only include files that exist.
         Order:
@@ -380,21 +689,73 @@ Puede encontrarlos en la carpeta 'outputs/graphs' del proyecto.
                 result.append((title, path))
         return result
         
+# read the manifest written by the partitioned graph rendering
+def load_graphs_manifest(manifest_path: str = os.path.join('outputs', 'graphs', 'manifest.json')) -> Dict[str, Dict[str, Any]]:
+    """Return {partition: {'dir': ..., 'graphs': [...]}}; empty dict if the manifest is missing."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('partitions', {})
+    except FileNotFoundError:
+        logger.warning(f"Manifiesto de gráficos no encontrado: {manifest_path}")
+        return {}
+
+# process-wide sender: config is read once and the Twilio client stays warm between reports
+_shared_sender: Optional[WhatsAppSender] = None
+_shared_sender_lock = threading.Lock()
+
+def get_whatsapp_sender() -> WhatsAppSender:
+
+    global _shared_sender
+    with _shared_sender_lock:
+        if _shared_sender is None:
+            _shared_sender = WhatsAppSender()
+        return _shared_sender
+
+# forget the shared sender (e.g. after changing environment variables)
+def reset_whatsapp_sender():
+
+    global _shared_sender
+    with _shared_sender_lock:
+        _shared_sender = None
+
 # aux function for direct use
-def send_whatsapp_report(results: Dict[str, Any], destiny: str= None) -> bool:
+def send_whatsapp_report(results: Dict[str, Any], destiny: str= None, include_graphs: bool = True,
+                         pdf_path: Optional[str] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None,
+                         template=None, input_key: Optional[str] = None) -> bool:
 
     try:
-        sender = WhatsAppSender()
-        return sender.send_full_report(results, destiny)
+        sender = get_whatsapp_sender()
+        return sender.send_full_report(results, destiny, include_graphs=include_graphs, pdf_path=pdf_path,
+                                       graph_urls=graph_urls, template=template, input_key=input_key)
     except Exception as e:
         logging.error(f"Error enviando reporte de WhatsApp: {e}")
         return False
 
+# aux function to send the report to every recipient (WHATSAPP_RECIPIENTS / WHATSAPP_RECIPIENTS_FILE)
+def broadcast_whatsapp_report(results: Dict[str, Any], recipients: Optional[List[Union[str, Dict[str, Any]]]] = None,
+                              simulate: Optional[bool] = None, include_graphs: bool = True,
+                              pdf_path: Optional[str] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None,
+                              template=None) -> Dict[str, Any]:
+
+    from utils.broadcast import load_recipient_records
+
+    sender = get_whatsapp_sender()
+    if recipients is None:
+        recipients = load_recipient_records()
+    if not recipients:
+        logger.error("No hay destinatarios para la difusión (WHATSAPP_RECIPIENTS / WHATSAPP_RECIPIENTS_FILE).")
+        return {'outcomes': [], 'summary': {'recipients': 0}}
+    return sender.broadcast_full_report(results, recipients, simulate=simulate, include_graphs=include_graphs, pdf_path=pdf_path,
+                                        graph_urls=graph_urls, template=template)
+
 # aux function to force simulation (no Twilio usage)
-def send_whatsapp_report_simulated(results: Dict[str, Any], destiny: str = None) -> bool:
+def send_whatsapp_report_simulated(results: Dict[str, Any], destiny: str = None, include_graphs: bool = True,
+                                   pdf_path: Optional[str] = None, graph_urls: Optional[Dict[str, Optional[str]]] = None,
+                                   template=None) -> bool:
     try:
-        sender = WhatsAppSender()
-        return sender.send_full_report(results, destiny, simulate=True)
+        sender = get_whatsapp_sender()
+        return sender.send_full_report(results, destiny, simulate=True, include_graphs=include_graphs, pdf_path=pdf_path,
+                                       graph_urls=graph_urls, template=template)
     except Exception as e:
         logging.error(f"Error enviando reporte de WhatsApp en modo simulación: {e}")
         return False
\ No newline at end of file